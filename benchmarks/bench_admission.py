@@ -0,0 +1,163 @@
+import argparse as ap
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import controller  # noqa
+from reservation_interfaces.latency_model import NAIVE, OPTIMIZED, \
+    LatencyModel  # noqa
+from reservation_interfaces.util import Reservation  # noqa
+from suite import benchmark, seconds_per_call  # noqa
+
+PORT = 1
+# Fast enough that even the largest deployments keep every delay guarantee,
+# so that the admission tests never stop early
+LINK_SPEED = 10 ** 10
+# The numbers of streams deployed on the port
+STREAM_COUNTS = (10, 100, 1000)
+# The naive strategy recalculates all worst-case delays and is only
+# measured up to this number of streams
+MAX_NAIVE_STREAMS = 100
+# The priorities of the deployed streams, assigned round robin
+CLASS_MIXES = {
+    'uniform': (4, 5, 6, 7),
+    'high': (7,),
+    'low': (4,),
+}
+# The priority of the stream tested for admission
+CANDIDATE_PRIORITY = 5
+
+
+def sample_stream(n, priority, dst_ip='10.0.1.1'):
+    return Reservation(
+        req_latency=100000, priority=priority, src_ip='10.0.0.1',
+        dst_ip=dst_ip, src_port=1000 + n, dst_port=2000 + n, min_frame=84,
+        max_frame=84, burst_size=84, burst_interval=1000,
+        acc_max_delay=100, acc_min_delay=10
+    )
+
+
+@contextlib.contextmanager
+def deployed_port(streams, priorities, strategy=OPTIMIZED):
+    """ Deploys `streams` streams of the given priorities on `PORT` of the
+    controller, restoring its state afterwards
+
+    Yields
+    ------
+    (advertised_streams, subscribed_streams, wc_delays)
+        The controller's state with the deployed streams
+    """
+    saved = (
+        controller.LATENCY_MODEL, dict(controller.ADVERTISED_STREAMS),
+        {port: set(keys)
+         for (port, keys) in controller.SUBSCRIBED_STREAMS.items()},
+        dict(controller.SUBSCRIPTION_WC_DELAYS)
+    )
+    controller.LATENCY_MODEL = LatencyModel(
+        controller.CLASS_DELAY_MAP, LINK_SPEED, strategy=strategy
+    )
+    try:
+        deployed = [
+            sample_stream(n, priorities[n % len(priorities)])
+            for n in range(streams)
+        ]
+        for stream in deployed:
+            controller.ADVERTISED_STREAMS[stream] = {
+                'advertisement': stream, 'advertisement_update': stream,
+                'in_port': 0, 'subscriptions': set()
+            }
+        controller.SUBSCRIBED_STREAMS[PORT] = {
+            (stream, stream.dst_ip) for stream in deployed
+        }
+        delays = controller.LATENCY_MODEL.worst_case_delays(
+            [((stream, stream.dst_ip), stream) for stream in deployed], PORT
+        )
+        controller.SUBSCRIPTION_WC_DELAYS.update(delays)
+        yield (
+            controller.ADVERTISED_STREAMS, controller.SUBSCRIBED_STREAMS,
+            controller.SUBSCRIPTION_WC_DELAYS
+        )
+    finally:
+        controller.LATENCY_MODEL = saved[0]
+        for (live, before) in zip(
+                (controller.ADVERTISED_STREAMS, controller.SUBSCRIBED_STREAMS,
+                 controller.SUBSCRIPTION_WC_DELAYS), saved[1:]):
+            live.clear()
+            live.update(before)
+
+
+@benchmark
+def admission():
+    """ The cost of the admission tests of a subscription against the
+    streams deployed on its port, for every number of streams and class mix
+    """
+    results = {}
+    for (mix, priorities) in CLASS_MIXES.items():
+        for streams in STREAM_COUNTS:
+            for strategy in (OPTIMIZED, NAIVE):
+                if strategy == NAIVE and streams > MAX_NAIVE_STREAMS:
+                    continue
+                with deployed_port(streams, priorities, strategy):
+                    candidate = sample_stream(
+                        streams, CANDIDATE_PRIORITY, '10.0.2.1'
+                    )
+                    controller.ADVERTISED_STREAMS[candidate] = {
+                        'advertisement': candidate, 'in_port': 0,
+                        'subscriptions': set()
+                    }
+                    assert controller.test_deployability(candidate, PORT)
+                    results[
+                        f'test_deployability[{strategy},{mix},{streams}]'
+                    ] = seconds_per_call(
+                        lambda: controller.test_deployability(candidate, PORT)
+                    )
+                    if strategy == NAIVE:
+                        continue
+
+                    results[f'get_worst_case_delay[{mix},{streams}]'] = \
+                        seconds_per_call(
+                            lambda: controller.get_worst_case_delay(
+                                candidate, PORT
+                            )
+                        )
+
+                    # Deploying and removing the stream leaves the delays
+                    # unchanged between the calls
+                    def update_and_rollback():
+                        controller.update_worst_case_delays(candidate, PORT)
+                        controller.rollback_worst_case_delays(candidate, PORT)
+                    results[
+                        f'update_worst_case_delays[{mix},{streams}]'
+                    ] = seconds_per_call(update_and_rollback) / 2
+    return results
+
+
+@benchmark
+def burst_rate():
+    """ Matching burst rates to the rates the switch can limit flows to """
+    rates = [64000 * 2 ** (n % 12) + n for n in range(1000)]
+
+    def match_all():
+        for rate in rates:
+            controller.get_best_possible_burst_rate(rate)
+    return {
+        'get_best_possible_burst_rate': seconds_per_call(match_all) /
+        len(rates)
+    }
+
+
+def main():
+    for function in (admission, burst_rate):
+        for (metric, seconds) in function().items():
+            print(f'{metric:<55} {seconds * 1e6:>12.3f} µs')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Measure the cost of the controller's admission tests "
+                    "against the number and priorities of the streams "
+                    "deployed on a port.")
+    parser.parse_args()
+    main()
@@ -0,0 +1,168 @@
+import argparse as ap
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from reservation_interfaces.sender import FRAME_LEN, FrameSender  # noqa
+from reservation_interfaces.wire import ADVERTISEMENT, BROADCAST_MAC, \
+    MAX_BUNDLE_RESERVATIONS  # noqa
+from suite import benchmark  # noqa
+
+SRC_MAC = '02:00:00:00:00:01'
+SRC_IP = '10.0.0.1'
+BROADCAST_IP = '10.0.0.255'
+
+
+class NullSocket:
+    """ Discards all frames, used to measure frame construction only """
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def sample_reservation(n):
+    return SimpleNamespace(
+        req_latency=100000, priority=7, src_ip=SRC_IP, dst_ip='0.0.0.0',
+        src_port=1001 + n % 60000, dst_port=2001, min_frame=84,
+        max_frame=1542, burst_size=1542, burst_interval=12336,
+        acc_max_delay=2000, acc_min_delay=0
+    )
+
+
+def bench_template(frames, sock, batch_size, max_bundle=1):
+    """ The rate of reservations queued, `max_bundle` per frame """
+    sender = FrameSender(
+        None, SRC_MAC, SRC_IP, batch_size, sock=sock, max_bundle=max_bundle
+    )
+    reservations = [sample_reservation(n) for n in range(frames)]
+    start = time.perf_counter()
+    for reservation in reservations:
+        sender.queue(BROADCAST_IP, 1000, 1000, ADVERTISEMENT, reservation)
+    sender.flush()
+    return frames / (time.perf_counter() - start)
+
+
+def scapy_frame_builder():
+    """ Returns a function crafting an advertisement frame the way the talker
+    did with scapy
+    """
+    from scapy.layers.inet import IP, UDP
+    from scapy.layers.l2 import Ether
+    from reservation_interfaces.util import Reservation
+
+    def scapy_frame(reservation):
+        return Ether(src=SRC_MAC, dst=BROADCAST_MAC) / \
+            IP(src=SRC_IP, dst=BROADCAST_IP) / \
+            UDP(dport=1000, sport=1000) / \
+            Reservation(**vars(reservation)).to_advertisement_packet()
+    return scapy_frame
+
+
+def bench_scapy(frames, sock):
+    scapy_frame = scapy_frame_builder()
+    reservations = [sample_reservation(n) for n in range(frames)]
+    start = time.perf_counter()
+    for reservation in reservations:
+        sock.send(scapy_frame(reservation))
+    return frames / (time.perf_counter() - start)
+
+
+@benchmark
+def frame_sender(frames=20000, batch_size=64):
+    """ Building advertisement frames with the template based sender, single
+    and bundled, and with scapy, without sending them
+    """
+    # The fastest of several runs, as for `suite.seconds_per_call`
+    results = {'talker frame, template': 1 / max(
+        bench_template(frames, NullSocket(), batch_size) for _ in range(5)
+    )}
+    results['talker frame, bundled'] = 1 / max(
+        bench_template(frames, NullSocket(), batch_size,
+                       MAX_BUNDLE_RESERVATIONS)
+        for _ in range(5)
+    )
+    try:
+        from scapy.compat import raw
+    except ImportError:
+        return results
+    null = NullSocket()
+    scapy_null = SimpleNamespace(send=lambda p: null.send(raw(p)))
+    results['talker frame, scapy'] = 1 / max(
+        bench_scapy(frames // 10, scapy_null) for _ in range(3)
+    )
+    return results
+
+
+def main(frames=None, iface=None, batch_size=None):
+    try:
+        from scapy.compat import raw
+        from scapy.config import conf
+    except ImportError:
+        raw = None
+
+    results = {}
+    results['template, build only'] = bench_template(
+        frames, NullSocket(), batch_size
+    )
+    results['template bundled, build only'] = bench_template(
+        frames, NullSocket(), batch_size, MAX_BUNDLE_RESERVATIONS
+    )
+    if raw is not None:
+        sender = FrameSender(None, SRC_MAC, SRC_IP, 1, sock=NullSocket())
+        sender.queue(
+            BROADCAST_IP, 1000, 1000, ADVERTISEMENT, sample_reservation(0)
+        )
+        assert bytes(sender._buffer[:FRAME_LEN]) == \
+            raw(scapy_frame_builder()(sample_reservation(0))), \
+            'Template frames differ from scapy frames'
+
+        null = NullSocket()
+        scapy_null = SimpleNamespace(send=lambda p: null.send(raw(p)))
+        results['scapy, build only'] = bench_scapy(frames, scapy_null)
+
+    if iface is not None:
+        sender = FrameSender(iface, SRC_MAC, SRC_IP, batch_size)
+        results[f'template, sent on {iface}'] = bench_template(
+            frames, sender.socket, batch_size
+        )
+        sender.close()
+        if raw is not None:
+            results[f'scapy, sent on {iface}'] = bench_scapy(
+                frames, conf.L2socket(iface=iface)
+            )
+    elif raw is None:
+        print('scapy is not installed, only the template path is measured')
+
+    for (path, rate) in results.items():
+        print(f'{path:<40} {rate:>12,.0f} reservations/s')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Compare the advertisement frame rate of the template "
+                    "based sender with the scapy path.")
+
+    parser.add_argument(
+        '--frames',
+        type=int,
+        help="The number of frames to build or send per path",
+        default=100000)
+
+    parser.add_argument(
+        '--iface',
+        help="Send the frames on this interface (requires root), otherwise "
+             "they are only built")
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        help="The number of frames flushed at once by the template sender",
+        default=64)
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
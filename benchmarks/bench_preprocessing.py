@@ -0,0 +1,75 @@
+import argparse as ap
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(__file__), '..', 'evaluation', 'preprocessing'
+))
+
+import numpy as np  # noqa
+from experiment import to_delays  # noqa
+from suite import benchmark, seconds_per_call  # noqa
+
+# The number of sent packets, of which `LOSS` are not received
+PACKETS = 1000000
+LOSS = 0.01
+BYTES_ON_WIRE = 1542
+SEND_RATE = 10 ** 9
+
+
+def write_packets(directory, packets=PACKETS, loss=LOSS, seed=0):
+    """ Writes the .npz files of a synthetic measurement, with the received
+    packets shuffled slightly as by a capture on several ports
+
+    Returns
+    -------
+    (str, str)
+        The paths of the sent and the received packets
+    """
+    generator = np.random.default_rng(seed)
+    ids = np.arange(packets, dtype=np.int64)
+    out_times = 1.6e9 + ids * 1e-5
+    received = np.sort(generator.choice(
+        packets, int(packets * (1 - loss)), replace=False
+    ))
+    in_times = out_times[received] + generator.uniform(2e-5, 1e-4,
+                                                       len(received))
+    order = np.argsort(in_times, kind='stable')
+    paths = (os.path.join(directory, 'out.npz'),
+             os.path.join(directory, 'in.npz'))
+    np.savez(paths[0], id=ids, time=out_times)
+    np.savez(paths[1], id=received[order], time=in_times[order])
+    return paths
+
+
+@benchmark
+def delays(packets=PACKETS):
+    """ Matching sent and received packets into their delays """
+    with tempfile.TemporaryDirectory() as directory:
+        (out_file, in_file) = write_packets(directory, packets)
+        seconds = seconds_per_call(
+            lambda: to_delays(out_file, in_file, BYTES_ON_WIRE, SEND_RATE),
+            repeats=3
+        )
+    return {'to_delays per packet': seconds / packets}
+
+
+def main(packets=None):
+    for (metric, seconds) in delays(packets).items():
+        print(f'{metric:<40} {seconds * 1e9:>12.3f} ns')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Measure the throughput of matching sent and received "
+                    "packets into their delays.")
+
+    parser.add_argument(
+        '--packets',
+        type=int,
+        help="The number of sent packets",
+        default=PACKETS)
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
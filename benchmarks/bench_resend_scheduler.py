@@ -0,0 +1,150 @@
+import argparse as ap
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from reservation_interfaces.reservation_tracker import RESEND_TICK  # noqa
+from reservation_interfaces.timer_wheel import TimerWheel  # noqa
+from suite import benchmark  # noqa
+
+
+def jittered(interval, jitter):
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def bench_wheel(streams, timeout, rounds, jitter):
+    """ Drives `rounds` resends of every stream through one timer wheel on a
+    simulated clock, as the talker's resend thread does
+
+    Returns
+    -------
+    (schedule_us, tick_us, max_tick_us, cancel_us)
+        The mean time to schedule a stream, the mean and maximum time of
+        a tick with all streams outstanding and the mean time to cancel a
+        stream
+    """
+    now = 0.0
+    wheel = TimerWheel(tick=RESEND_TICK, slots=1024, clock=lambda: now)
+
+    start = time.perf_counter()
+    for stream in range(streams):
+        wheel.schedule(stream, jittered(timeout, jitter), now)
+    schedule_us = (time.perf_counter() - start) * 1e6 / streams
+
+    tick_times = []
+    resends = 0
+    while resends < streams * rounds:
+        now += RESEND_TICK
+        start = time.perf_counter()
+        for stream in wheel.advance(now):
+            wheel.schedule(stream, jittered(timeout, jitter), now)
+            resends += 1
+        tick_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for stream in range(streams):
+        wheel.cancel(stream)
+    cancel_us = (time.perf_counter() - start) * 1e6 / streams
+
+    return (
+        schedule_us,
+        sum(tick_times) * 1e6 / len(tick_times),
+        max(tick_times) * 1e6,
+        cancel_us
+    )
+
+
+def bench_coroutines(streams, timeout, rounds, jitter):
+    """ Resends every stream `rounds` times from its own coroutine, as the
+    talker did before the timer wheel
+
+    Returns
+    -------
+    float
+        The CPU time in seconds spent per second of resending
+    """
+    async def resend_loop():
+        for _ in range(rounds):
+            await asyncio.sleep(jittered(timeout, jitter))
+
+    async def run():
+        await asyncio.gather(*(resend_loop() for _ in range(streams)))
+
+    loop = asyncio.new_event_loop()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    loop.run_until_complete(run())
+    elapsed = time.perf_counter() - start
+    loop.close()
+    return (time.process_time() - cpu_start) / elapsed
+
+
+@benchmark
+def resend_scheduler(streams=10000, timeout=1.0, rounds=3, jitter=0.1):
+    """ Scheduling, resending and cancelling outstanding advertisements with
+    the timer wheel
+    """
+    random.seed(0)
+    runs = [bench_wheel(streams, timeout, rounds, jitter) for _ in range(3)]
+    (schedule_us, tick_us, _, cancel_us) = (
+        min(values) for values in zip(*runs)
+    )
+    return {
+        'TimerWheel.schedule': schedule_us * 1e-6,
+        f'TimerWheel.advance[{streams}]': tick_us * 1e-6,
+        'TimerWheel.cancel': cancel_us * 1e-6,
+    }
+
+
+def main(streams=None, timeout=None, rounds=None, jitter=None):
+    (schedule_us, tick_us, max_tick_us, cancel_us) = bench_wheel(
+        streams, timeout, rounds, jitter
+    )
+    # The wheel is advanced once per tick, its CPU share follows directly
+    wheel_load = tick_us / (RESEND_TICK * 1e6)
+    coroutine_load = bench_coroutines(streams, timeout, rounds, jitter)
+
+    print(f'{streams} outstanding streams, resent every {timeout} s '
+          f'(+-{jitter:.0%} jitter)')
+    print(f'timer wheel   schedule {schedule_us:8.2f} µs/stream')
+    print(f'timer wheel   cancel   {cancel_us:8.2f} µs/stream')
+    print(f'timer wheel   tick     {tick_us:8.2f} µs mean, '
+          f'{max_tick_us:.2f} µs max')
+    print(f'timer wheel   CPU load {wheel_load:8.2%}')
+    print(f'coroutines    CPU load {coroutine_load:8.2%}')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Measure the overhead of the talker's resend scheduler "
+                    "with many outstanding advertisements.")
+
+    parser.add_argument(
+        '--streams',
+        type=int,
+        help="The number of outstanding advertisements",
+        default=10000)
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        help="The time in seconds until an advertisement is resent",
+        default=1.0)
+
+    parser.add_argument(
+        '--rounds',
+        type=int,
+        help="The number of times every advertisement is resent",
+        default=3)
+
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        help="The fraction by which resend intervals are randomized",
+        default=0.1)
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
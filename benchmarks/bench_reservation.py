@@ -0,0 +1,74 @@
+import argparse as ap
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from scapy.compat import raw  # noqa
+from reservation_interfaces.util import Reservation, \
+    ReservationPacket  # noqa
+from reservation_interfaces.wire import ADVERTISEMENT, pack_reservation, \
+    unpack_reservation  # noqa
+from suite import benchmark, seconds_per_call  # noqa
+
+FIELDS = dict(
+    req_latency=100000, priority=7, src_ip='10.0.0.1', dst_ip='0.0.0.0',
+    src_port=1001, dst_port=2001, min_frame=84, max_frame=1542,
+    burst_size=1542, burst_interval=12336, acc_max_delay=2000,
+    acc_min_delay=0
+)
+
+
+@benchmark
+def reservation():
+    """ The operations on every reservation the controller handles """
+    stream = Reservation(**FIELDS)
+    return {
+        'Reservation()': seconds_per_call(lambda: Reservation(**FIELDS)),
+        'Reservation.__hash__': seconds_per_call(lambda: hash(stream)),
+        'Reservation.copy': seconds_per_call(stream.copy),
+    }
+
+
+@benchmark
+def reservation_packet():
+    """ Encoding and decoding reservation packets with scapy and with the
+    precompiled struct of the wire format
+    """
+    stream = Reservation(**FIELDS)
+    data = raw(stream.to_advertisement_packet())
+    assert pack_reservation(ADVERTISEMENT, stream) == data, \
+        'The wire format differs from ReservationPacket'
+
+    def decode():
+        packet = ReservationPacket(data)
+        return Reservation(**{
+            field: getattr(packet, field) for field in FIELDS
+        })
+
+    def unpack():
+        return Reservation(**unpack_reservation(data)[1])
+    return {
+        'ReservationPacket encode': seconds_per_call(
+            lambda: raw(stream.to_advertisement_packet())
+        ),
+        'ReservationPacket decode': seconds_per_call(decode),
+        'pack_reservation': seconds_per_call(
+            lambda: pack_reservation(ADVERTISEMENT, stream)
+        ),
+        'unpack_reservation': seconds_per_call(unpack),
+    }
+
+
+def main():
+    for function in (reservation, reservation_packet):
+        for (metric, seconds) in function().items():
+            print(f'{metric:<40} {seconds * 1e6:>12.3f} µs')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Measure the cost of constructing, hashing, copying, "
+                    "encoding and decoding reservations.")
+    parser.parse_args()
+    main()
@@ -0,0 +1,167 @@
+import argparse as ap
+import fnmatch
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import suite  # noqa
+
+
+def _threshold(value):
+    try:
+        (pattern, threshold) = value.rsplit('=', 1)
+        return (pattern, float(threshold))
+    except ValueError:
+        raise ap.ArgumentTypeError(f'{value} is not NAME=VALUE')
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    for (unit, scale) in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3f} {unit}'
+    return f'{seconds / 1e-9:.3f} ns'
+
+
+def print_comparison(rows):
+    width = max([len(row[0]) for row in rows] + [6])
+    print(f"{'metric':<{width}} {'baseline':>12} {'current':>12} "
+          f"{'change':>8}  status")
+    for (metric, before, current, change, status) in rows:
+        shown_change = '-' if change is None else f'{change:+.1%}'
+        print(f'{metric:<{width}} {_format_seconds(before):>12} '
+              f'{_format_seconds(current):>12} {shown_change:>8}  {status}')
+
+
+def main(names=None, list_benchmarks=None, save_baseline=None,
+         baselines_dir=None, max_regression=None, thresholds=None,
+         output=None, require_baseline=None, repeats=None):
+    if repeats is not None:
+        suite.REPEATS = repeats
+    (registry, errors) = suite.load_benchmarks()
+    for (module, error) in errors.items():
+        print(f'Skipping {module}: {error}', file=sys.stderr)
+    selected = [
+        bench for bench in registry.values()
+        if not names or any(fnmatch.fnmatch(bench.name, name)
+                            for name in names)
+    ]
+    if list_benchmarks:
+        for bench in selected:
+            print(f'{bench.name:<25} '
+                  f'{os.path.basename(bench.module_file)}')
+        return 0
+    if not selected:
+        print('No benchmarks selected', file=sys.stderr)
+        return 1
+
+    results = {}
+    for bench in selected:
+        print(f'Running {bench.name}', file=sys.stderr)
+        results.update(bench.function())
+
+    machine = suite.machine()
+    baseline = suite.load_baseline(machine['tag'], baselines_dir)
+    rows = suite.compare(
+        results, baseline, max_regression, dict(thresholds or [])
+    )
+    print(f"Machine {machine['tag']} ({machine['cpu']}), baseline " + (
+        f"of commit {baseline.get('commit')} from {baseline.get('created')}"
+        if baseline else 'missing'
+    ))
+    print_comparison(rows)
+
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump({
+                'machine': machine,
+                'skipped': {module: str(error)
+                            for (module, error) in errors.items()},
+                'metrics': results,
+                'comparison': [
+                    dict(zip(('metric', 'baseline', 'current', 'change',
+                              'status'), row))
+                    for row in rows
+                ],
+            }, output_file, indent=2)
+    if save_baseline:
+        path = suite.save_baseline(results, machine, baselines_dir)
+        print(f'Saved the baseline to {path}')
+        return 0
+
+    regressed = [row[0] for row in rows if row[4] == 'regressed']
+    if regressed:
+        print(f'{len(regressed)} metrics regressed: ' + ', '.join(regressed))
+        return 1
+    if baseline is None and require_baseline:
+        print(f"There is no baseline for {machine['tag']}, run with "
+              f"--save-baseline first")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Run the benchmarks and compare their results with the "
+                    "baseline stored for this machine, exits with 1 if any "
+                    "metric regressed.")
+
+    parser.add_argument(
+        'names',
+        nargs='*',
+        help="The benchmarks to run, shell-style patterns, defaults to all")
+
+    parser.add_argument(
+        '--list',
+        dest='list_benchmarks',
+        action='store_true',
+        help="List the benchmarks instead of running them")
+
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help="Store the results as the baseline of this machine instead of "
+             "comparing with it")
+
+    parser.add_argument(
+        '--baselines-dir',
+        help="The directory of the baselines",
+        default=suite.BASELINES_DIR)
+
+    parser.add_argument(
+        '--max-regression',
+        type=float,
+        help="The relative slowdown of a metric against the baseline that "
+             "fails the run",
+        default=suite.MAX_REGRESSION)
+
+    parser.add_argument(
+        '--threshold',
+        dest='thresholds',
+        type=_threshold,
+        action='append',
+        help="The maximum regression of a metric as NAME=VALUE, overriding "
+             "--max-regression; a NAME ending in * matches all metrics "
+             "starting with it (repeatable)")
+
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        help="The number of repetitions of every measurement, of which the "
+             "fastest is kept; more repetitions reduce noise",
+        default=suite.REPEATS)
+
+    parser.add_argument(
+        '--output',
+        help="A JSON file to write the results and comparison to")
+
+    parser.add_argument(
+        '--require-baseline',
+        action='store_true',
+        help="Fail if there is no baseline for this machine")
+
+    kwargs = vars(parser.parse_args())
+    raise SystemExit(main(**kwargs))
@@ -0,0 +1,251 @@
+from collections import OrderedDict
+import gc
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+# The modules defining benchmarks, relative to this directory
+BENCHMARK_MODULES = (
+    'bench_admission.py',
+    'bench_frame_sender.py',
+    'bench_preprocessing.py',
+    'bench_reservation.py',
+    'bench_resend_scheduler.py',
+)
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, 'baselines')
+
+# Every measurement is repeated and the fastest repetition is kept, as
+# noise only ever makes code slower. A repetition runs for at least
+# `MIN_REPEAT_TIME` seconds
+REPEATS = 5
+MIN_REPEAT_TIME = 0.05
+# The relative slowdown against the baseline that fails the suite
+MAX_REGRESSION = 0.25
+
+# The registered benchmarks by name
+REGISTRY = OrderedDict()
+
+
+class Benchmark:
+    """
+    A function measuring one or more metrics, see `benchmark`
+
+    Attributes
+    ----------
+    name
+        The name of the benchmark, the name of the function
+    function
+        The function, returning a dict of the seconds per operation of
+        every metric by name
+    module_file
+        The absolute path of the module defining the function
+    """
+    def __init__(self, function, module_file):
+        self.name = function.__name__
+        self.function = function
+        self.module_file = module_file
+
+
+def benchmark(function):
+    """ Registers a function returning the seconds per operation of its
+    metrics by name, e.g. measured with `seconds_per_call`
+    """
+    module_file = os.path.abspath(sys.modules[function.__module__].__file__)
+    known = REGISTRY.get(function.__name__)
+    if known is not None and known.module_file != module_file:
+        raise ValueError(f'Benchmark {function.__name__} is defined in '
+                         f'{known.module_file} and {module_file}')
+    REGISTRY[function.__name__] = Benchmark(function, module_file)
+    return function
+
+
+def load_benchmarks():
+    """ Imports all `BENCHMARK_MODULES`
+
+    Returns
+    -------
+    (OrderedDict, dict)
+        The `Benchmark` of every registered function by name, and the error
+        of every module that could not be imported, e.g. for lack of Ryu
+    """
+    errors = {}
+    for module in BENCHMARK_MODULES:
+        name = os.path.splitext(module)[0]
+        if name in sys.modules:
+            continue
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(BENCHMARKS_DIR, module)
+        )
+        sys.modules[name] = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(sys.modules[name])
+        except ImportError as error:
+            del sys.modules[name]
+            errors[module] = error
+    return (REGISTRY, errors)
+
+
+def seconds_per_call(function, repeats=None, min_repeat_time=None):
+    """ The time of one call of `function`, the fastest of `repeats`
+    repetitions of as many calls as take `min_repeat_time` seconds, which
+    default to `REPEATS` and `MIN_REPEAT_TIME`
+
+    Garbage collection is disabled while measuring, as in `timeit`.
+    """
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _fastest(
+            function, REPEATS if repeats is None else repeats,
+            MIN_REPEAT_TIME if min_repeat_time is None else min_repeat_time
+        )
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _fastest(function, repeats, min_repeat_time):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_repeat_time:
+            break
+        number *= 2 if elapsed <= 0 else \
+            max(2, min(10, int(min_repeat_time / elapsed) + 1))
+    fastest = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest / number
+
+
+def _cpu_model():
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine():
+    """ The properties of this machine and interpreter that results are only
+    comparable within, and the tag identifying them
+    """
+    properties = {
+        'node': platform.node(),
+        'cpu': _cpu_model(),
+        'cpus': os.cpu_count(),
+        'system': f'{platform.system()} {platform.machine()}',
+        'python': platform.python_version(),
+    }
+    digest = hashlib.sha1(
+        json.dumps(properties, sort_keys=True).encode()
+    ).hexdigest()[:8]
+    properties['tag'] = f"{properties['node']}-{digest}"
+    return properties
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def baseline_path(tag, baselines_dir=BASELINES_DIR):
+    return os.path.join(baselines_dir, f'{tag}.json')
+
+
+def save_baseline(results, machine_properties, baselines_dir=BASELINES_DIR):
+    """ Stores results as the baseline of a machine, keeping the baselines
+    of metrics that were not measured
+
+    Returns
+    -------
+    str
+        The path of the baseline
+    """
+    path = baseline_path(machine_properties['tag'], baselines_dir)
+    baseline = load_baseline(machine_properties['tag'], baselines_dir) or {}
+    metrics = baseline.get('metrics', {})
+    metrics.update(results)
+    os.makedirs(baselines_dir, exist_ok=True)
+    with open(path, 'w') as output:
+        json.dump({
+            'machine': machine_properties,
+            'commit': _commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'metrics': dict(sorted(metrics.items())),
+        }, output, indent=2)
+        output.write('\n')
+    return path
+
+
+def load_baseline(tag, baselines_dir=BASELINES_DIR):
+    """ The baseline of a machine, None if there is none """
+    try:
+        with open(baseline_path(tag, baselines_dir)) as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return None
+
+
+def compare(results, baseline, max_regression=MAX_REGRESSION,
+            thresholds=None):
+    """ Compares the seconds per operation of every metric with the baseline
+
+    Parameters
+    ----------
+    thresholds, optional
+        The maximum regression of metrics by name, overriding
+        `max_regression`; a name ending in `*` applies to all metrics
+        starting with it
+
+    Returns
+    -------
+    list
+        `(metric, baseline, current, change, status)` of every metric,
+        where `change` is the relative change of the time and `status` one
+        of `regressed`, `improved`, `ok` or `new`
+    """
+    thresholds = thresholds or {}
+    known = baseline.get('metrics', {}) if baseline else {}
+    rows = []
+    for (metric, current) in results.items():
+        allowed = max_regression
+        for (pattern, threshold) in thresholds.items():
+            if metric == pattern or (
+                    pattern.endswith('*') and
+                    metric.startswith(pattern[:-1])):
+                allowed = threshold
+        before = known.get(metric)
+        if before is None:
+            rows.append((metric, None, current, None, 'new'))
+            continue
+        change = current / before - 1
+        if change > allowed:
+            status = 'regressed'
+        elif change < -allowed:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((metric, before, current, change, status))
+    return rows
@@ -7,19 +7,8 @@ send_rate=$4
 bytes_on_wire=$5
 
 #
-# Convert the raw data to filtered json
-#
-
-echo "Converting raw files to json..."
-sh convert_to_json.sh $in_file
-sh convert_to_json.sh $out_file
-
-in_filtered=${in_file}_json_filtered
-out_filtered=${out_file}_json_filtered
-
-#
-# Evaluate delay measurements
+# Evaluate delay measurements, reading the captures directly
 #
 
 echo "Performing delay caluclation..."
-python experiment.py eval-processing-delay --input-file-in $in_filtered --input-file-out $out_filtered --csv-file $csv_file --send-rate $send_rate --bytes-on-wire $bytes_on_wire
\ No newline at end of file
+python experiment.py eval-processing-delay --input-file-in $in_file --input-file-out $out_file --csv-file $csv_file --send-rate $send_rate --bytes-on-wire $bytes_on_wire
\ No newline at end of file
@@ -0,0 +1,305 @@
+import argparse as ap
+import math
+import os
+import numpy as np
+import pandas as pd
+
+# The default range and precision of a histogram: delays from 100ns to
+# 100s, positive or negative, are recorded with a relative error of at
+# most 10^-3
+LOWEST = 1e-7
+HIGHEST = 100
+SIGNIFICANT_DIGITS = 3
+# The histogram file written next to delays.csv by `evaluate_delays.py`
+HISTOGRAM_FILE = 'delays_histogram.npz'
+DELAYS_FILE = 'delays.csv'
+# The columns of delays.csv recorded in histograms
+HISTOGRAM_COLUMNS = ('delay', 'processing_delay')
+# The quantiles of a quantile table
+TABLE_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class DelayHistogram:
+    """
+    A histogram of delays with logarithmic buckets, in the manner of
+    HdrHistogram: the buckets grow by a factor of `1 + 10^-digits`, so that
+    every recorded value is known within that relative error, while the
+    memory stays constant however many values are recorded.
+
+    Negative values, e.g. processing delays of packets sent faster than
+    their transmission delay, are recorded with the same precision in
+    buckets mirrored at 0. Values closer to 0 than `lowest` are counted in
+    a zero bucket and values of at least `highest` from 0 in an overflow
+    bucket of their sign. The minimum, maximum and mean are kept exactly.
+
+    Attributes
+    ----------
+    counts
+        The number of values per bucket in the order of their values: the
+        negative overflow bucket, the mirrored buckets of negative values,
+        the zero bucket, the buckets of positive values and the overflow
+        bucket
+    count
+        The number of values recorded
+    minimum
+        The smallest value, None without any value
+    maximum
+        The largest value, None without any value
+    """
+    def __init__(self, lowest=LOWEST, highest=HIGHEST,
+                 significant_digits=SIGNIFICANT_DIGITS):
+        assert 0 < lowest < highest
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_digits = significant_digits
+        self._log_growth = math.log1p(10 ** -significant_digits)
+        buckets = math.ceil(math.log(highest / lowest) / self._log_growth)
+        # The index of the zero bucket, with `buckets` logarithmic buckets
+        # and an overflow bucket on either side
+        self._zero = buckets + 1
+        self.counts = np.zeros(2 * buckets + 3, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    @property
+    def layout(self):
+        return (self.lowest, self.highest, self.significant_digits)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def upper_edges(self):
+        """ The upper bound of every bucket, `inf` for the overflow bucket """
+        edges = self.lowest * np.exp(
+            np.arange(self._zero) * self._log_growth
+        )
+        edges[-1] = min(edges[-1], self.highest)
+        # A bucket of negative values is bounded by the lower edge of its
+        # mirrored bucket
+        return np.concatenate((
+            [-self.highest], -edges[-2::-1], edges, [np.inf]
+        ))
+
+    def record(self, values):
+        """ Adds an array of values, ignoring NaN """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        magnitudes = np.abs(values)
+        # The number of buckets from the zero bucket, towards the value's sign
+        steps = np.zeros(len(values), dtype=np.int64)
+        above = magnitudes >= self.lowest
+        steps[above] = np.minimum(
+            np.floor(
+                np.log(magnitudes[above] / self.lowest) / self._log_growth
+            ).astype(np.int64) + 1,
+            self._zero
+        )
+        steps[magnitudes >= self.highest] = self._zero
+        buckets = self._zero + np.where(values < 0, -steps, steps)
+        self.counts += np.bincount(buckets, minlength=len(self.counts))
+        self._add_summary(
+            len(values), float(values.sum()), float(values.min()),
+            float(values.max())
+        )
+
+    def _add_summary(self, count, total, minimum, maximum):
+        self.count += count
+        self.total += total
+        if minimum is not None and (
+                self.minimum is None or minimum < self.minimum):
+            self.minimum = minimum
+        if maximum is not None and (
+                self.maximum is None or maximum > self.maximum):
+            self.maximum = maximum
+
+    def merge(self, other):
+        """ Adds the values of a histogram with the same layout, e.g. of
+        another run
+
+        Returns
+        -------
+        DelayHistogram
+            This histogram
+        """
+        if other.layout != self.layout:
+            raise ValueError('Histograms of different layouts can not be '
+                             'merged')
+        self.counts += other.counts
+        self._add_summary(other.count, other.total, other.minimum,
+                          other.maximum)
+        return self
+
+    @classmethod
+    def merged(cls, histograms):
+        """ A new histogram of the values of all given histograms """
+        histograms = list(histograms)
+        result = cls(*histograms[0].layout) if histograms else cls()
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    def _values(self, buckets):
+        # Every bucket is represented by its upper edge, within the exact
+        # range of the values
+        return np.clip(
+            self.upper_edges()[buckets], self.minimum, self.maximum
+        )
+
+    def quantile(self, q):
+        """ The value below or at which a fraction `q` of the values lie,
+        within the histogram's precision; None without any value
+        """
+        if not self.count:
+            return None
+        rank = max(math.ceil(q * self.count), 1)
+        bucket = np.searchsorted(np.cumsum(self.counts), rank)
+        return float(self._values(bucket))
+
+    def cdf(self, normalized=True):
+        """ The cumulative distribution at the upper edge of every non-empty
+        bucket
+
+        Parameters
+        ----------
+        normalized, optional
+            Whether to return fractions of all values or numbers of values
+
+        Returns
+        -------
+        (values, cumulative)
+            The values and the fraction or number of values below or at them
+        """
+        buckets = np.flatnonzero(self.counts)
+        cumulative = np.cumsum(self.counts)[buckets]
+        if normalized and self.count:
+            cumulative = cumulative / self.count
+        return (self._values(buckets) if len(buckets) else
+                np.empty(0), cumulative)
+
+    def summary(self, quantiles=TABLE_QUANTILES):
+        """ The statistics as a dict of `count`, `min`, `mean`, `max` and
+        every quantile, e.g. `p99`
+        """
+        summary = {
+            'count': self.count,
+            'min': self.minimum,
+            'mean': self.mean,
+        }
+        for q in quantiles:
+            summary[f'p{q * 100:g}'] = self.quantile(q)
+        summary['max'] = self.maximum
+        return summary
+
+    def to_arrays(self, name):
+        """ The histogram as arrays named after it, see `save_histograms` """
+        return {
+            f'{name}.layout': np.array(self.layout, dtype=np.float64),
+            f'{name}.summary': np.array([
+                self.count, self.total,
+                np.nan if self.minimum is None else self.minimum,
+                np.nan if self.maximum is None else self.maximum
+            ], dtype=np.float64),
+            f'{name}.counts': self.counts,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, name):
+        (lowest, highest, digits) = arrays[f'{name}.layout']
+        histogram = cls(float(lowest), float(highest), int(digits))
+        counts = np.array(arrays[f'{name}.counts'], dtype=np.int64)
+        if len(counts) == histogram._zero + 1:
+            # Written before negative values were recorded, with all of them
+            # in the underflow bucket, which becomes the zero bucket
+            histogram.counts[histogram._zero:] = counts
+        else:
+            histogram.counts = counts
+        (count, total, minimum, maximum) = arrays[f'{name}.summary']
+        histogram.count = int(count)
+        histogram.total = float(total)
+        if histogram.count:
+            histogram.minimum = float(minimum)
+            histogram.maximum = float(maximum)
+        return histogram
+
+
+def save_histograms(path, histograms):
+    """ Writes histograms by name to a compressed .npz file """
+    arrays = {}
+    for (name, histogram) in histograms.items():
+        arrays.update(histogram.to_arrays(name))
+    np.savez_compressed(path, **arrays)
+
+
+def load_histograms(path):
+    """ Reads the histograms by name written by `save_histograms` """
+    with np.load(path) as arrays:
+        names = sorted({key.rsplit('.', 1)[0] for key in arrays.files})
+        return {
+            name: DelayHistogram.from_arrays(arrays, name) for name in names
+        }
+
+
+def delay_histograms(directory):
+    """ The histograms of the `HISTOGRAM_COLUMNS` of a measurement
+    directory, read from its `HISTOGRAM_FILE` if that is up to date and
+    recorded from its delays.csv otherwise
+    """
+    histogram_file = os.path.join(directory, HISTOGRAM_FILE)
+    csv_file = os.path.join(directory, DELAYS_FILE)
+    if os.path.isfile(histogram_file) and (
+            not os.path.isfile(csv_file) or
+            os.path.getmtime(histogram_file) >= os.path.getmtime(csv_file)):
+        return load_histograms(histogram_file)
+
+    from measurement_cache import load_columns
+    columns = load_columns(csv_file)
+    histograms = {}
+    for name in HISTOGRAM_COLUMNS:
+        histograms[name] = DelayHistogram()
+        histograms[name].record(columns[name])
+    return histograms
+
+
+def quantile_table(histograms, quantiles=TABLE_QUANTILES):
+    """ The summary of every histogram by name as DataFrame, see
+    `DelayHistogram.summary`
+    """
+    return pd.DataFrame({
+        name: histogram.summary(quantiles)
+        for (name, histogram) in histograms.items()
+    }).T
+
+
+def main(directories=None, column=None):
+    histograms = {
+        directory: delay_histograms(directory)[column]
+        for directory in directories
+    }
+    if len(histograms) > 1:
+        histograms['merged'] = DelayHistogram.merged(histograms.values())
+    print(quantile_table(histograms).to_string())
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description="Prints the quantiles of the delays of measurement directories from their histograms.")
+
+    parser.add_argument(
+        'directories',
+        nargs='+',
+        help="Directories containing a delays_histogram.npz or delays.csv."
+    )
+
+    parser.add_argument(
+        '--column',
+        help="The delay to summarize.",
+        choices=HISTOGRAM_COLUMNS,
+        default='delay'
+    )
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
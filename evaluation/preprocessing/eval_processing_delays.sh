@@ -6,24 +6,10 @@ echo "Copying Files..."
 mkdir -p $local_data_dir
 scp -r "$remote_data_dir/*" $local_data_dir
 
-for file in $local_data_dir/*
-do
-    #
-    # Create directory and filenames
-    #
-    
-    bytes_on_wire=$(eval "basename $file")
+#
+# Run the processing delay analysis of all packet sizes in parallel,
+# skipping those already evaluated
+#
 
-    dir=$local_data_dir/$bytes_on_wire
-    in_file=$dir/in
-    out_file=$dir/out
-    csv_file=$dir/delays.csv
-    results_file=$dir/results.txt
-    
-    #
-    # Run processing delay analysis and delete raw data after success
-    #
-
-    echo "Calculate processing delay for ${bytes_on_wire} Byte..."
-    sh calc_processing_delay.sh $in_file $out_file $csv_file $send_rate $bytes_on_wire # && rm $dir/*in* && rm $dir/*out*
-done
\ No newline at end of file
+echo "Calculate processing delays..."
+python evaluate_delays.py $local_data_dir --send-rate $send_rate
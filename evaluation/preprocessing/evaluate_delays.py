@@ -0,0 +1,298 @@
+import argparse as ap
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import re
+import traceback
+import pandas as pd
+from delay_histogram import HISTOGRAM_COLUMNS, HISTOGRAM_FILE, \
+    DelayHistogram, save_histograms
+from experiment import iter_delays
+from measurement_cache import CACHE_DIR, TABLE, ColumnWriter
+
+# The names of the outbound and inbound captures in a packet-size directory,
+# as left by `convert_to_json.sh` and as written by `measure_stream.sh`
+CAPTURE_NAMES = (('out', 'in'), ('out_raw', 'in_raw'))
+DELAYS_FILE = 'delays.csv'
+# The record of the inputs and statistics of the last evaluation of a
+# directory, next to its delays
+MANIFEST_FILE = '.delays.json'
+SUMMARY_FILE = 'summary.csv'
+# A send rate in the name of a scenario directory, e.g. `procd_test_10MBit`
+RATE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*([kMG]?)Bit', re.IGNORECASE)
+RATE_UNITS = {'': 1, 'k': 10 ** 3, 'm': 10 ** 6, 'g': 10 ** 9}
+# The statistics of the delay columns in the summary
+SUMMARY_QUANTILES = (0.5, 0.99)
+HASH_BLOCK = 1 << 20
+
+
+def send_rate_of(scenario):
+    """ The send rate in Bit/second given in the name of a scenario
+    directory, None if the name has none
+    """
+    match = RATE_PATTERN.search(scenario)
+    if match is None:
+        return None
+    return round(float(match.group(1)) * RATE_UNITS[match.group(2).lower()])
+
+
+def _captures(directory):
+    for names in CAPTURE_NAMES:
+        paths = tuple(os.path.join(directory, name) for name in names)
+        if all(os.path.isfile(path) for path in paths):
+            return paths
+    return None
+
+
+def find_runs(root_dirs):
+    """ Finds the packet-size directories holding an outbound and an
+    inbound capture below the given directories
+
+    Returns
+    -------
+    list
+        `(scenario, bytes_on_wire, directory, out_file, in_file)` of every
+        run, sorted by scenario and packet size; the scenario is the name of
+        the directory containing the packet-size directories
+    """
+    runs = []
+    for root_dir in root_dirs:
+        for (directory, subdirs, _) in os.walk(root_dir):
+            subdirs.sort()
+            name = os.path.basename(os.path.normpath(directory))
+            if not name.isdigit():
+                continue
+            captures = _captures(directory)
+            if captures is None:
+                continue
+            scenario = os.path.basename(
+                os.path.dirname(os.path.abspath(directory))
+            )
+            runs.append((scenario, int(name), directory) + captures)
+    return sorted(runs, key=lambda run: run[:2])
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(path, content_hash=False):
+    """ Identifies the version of an input file by its size and either its
+    modification time or, as copies may change the time, its SHA-256 hash
+    """
+    status = os.stat(path)
+    if content_hash:
+        return {'size': status.st_size, 'sha256': _file_hash(path)}
+    return {'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+
+def _summarize(histograms):
+    summary = {}
+    for (column, histogram) in histograms.items():
+        if not histogram.count:
+            continue
+        for (statistic, value) in histogram.summary(
+                SUMMARY_QUANTILES).items():
+            if statistic != 'count':
+                summary[f'{column}_{statistic}'] = value
+    return summary
+
+
+def evaluate_run(run, send_rate, force=False, content_hash=False,
+                 cache_dir=None):
+    """ Writes the delays of a run to `DELAYS_FILE` in its directory unless
+    they are up to date with the captures and the send rate, together
+    with the histograms of the delays in `HISTOGRAM_FILE`. Their columns
+    are stored in the cache at `cache_dir` if given. The memory used does
+    not grow with the number of packets either way.
+
+    Returns
+    -------
+    dict
+        The `scenario`, `bytes_on_wire`, `status` (`done`, `skipped` or
+        `failed`), the number of `packets` and the delay statistics of the
+        run, or the `error` it failed with
+    """
+    (scenario, bytes_on_wire, directory, out_file, in_file) = run
+    result = {
+        'scenario': scenario, 'bytes_on_wire': bytes_on_wire,
+        'directory': directory
+    }
+    csv_file = os.path.join(directory, DELAYS_FILE)
+    try:
+        inputs = {
+            'out': fingerprint(out_file, content_hash),
+            'in': fingerprint(in_file, content_hash),
+            'send_rate': send_rate,
+            'bytes_on_wire': bytes_on_wire,
+        }
+        manifest = _read_manifest(directory)
+        if not force and manifest is not None and \
+                manifest['inputs'] == inputs and \
+                os.path.isfile(csv_file) and \
+                os.path.isfile(os.path.join(directory, HISTOGRAM_FILE)):
+            return dict(result, status='skipped', **manifest['statistics'])
+
+        # Written to a temporary file first, so that a failed run never
+        # leaves a partial `DELAYS_FILE`
+        partial_file = csv_file + '.partial'
+        histograms = {
+            column: DelayHistogram() for column in HISTOGRAM_COLUMNS
+        }
+        # The typed columns are cached for the visualizations right away,
+        # written chunk by chunk like the CSV
+        columns = None if cache_dir is None else ColumnWriter(cache_dir)
+        packets = 0
+        try:
+            for (i, df) in enumerate(iter_delays(
+                    out_file, in_file, bytes_on_wire, send_rate)):
+                df.to_csv(partial_file, mode='w' if i == 0 else 'a',
+                          header=i == 0)
+                packets += len(df)
+                for (column, histogram) in histograms.items():
+                    histogram.record(df[column].to_numpy())
+                if columns is not None:
+                    columns.append({
+                        column: values.to_numpy()
+                        for (column, values) in df.items()
+                    })
+            os.replace(partial_file, csv_file)
+            save_histograms(
+                os.path.join(directory, HISTOGRAM_FILE), histograms
+            )
+            if columns is not None:
+                columns.store(csv_file, TABLE)
+        finally:
+            if columns is not None:
+                columns.discard()
+        statistics = dict(packets=packets, **_summarize(histograms))
+        with open(os.path.join(directory, MANIFEST_FILE), 'w') as manifest:
+            json.dump({'inputs': inputs, 'statistics': statistics},
+                      manifest, indent=2)
+        return dict(result, status='done', **statistics)
+    except Exception:
+        return dict(result, status='failed', error=traceback.format_exc())
+
+
+def main(root_dirs=None, send_rate=None, jobs=None, force=False,
+         content_hash=False, summary_file=None, cache_dir=None,
+         no_cache=False):
+    runs = find_runs(root_dirs)
+    if not runs:
+        print('No measurement directories found')
+        return 1
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for run in runs:
+            rate = send_rate or send_rate_of(run[0])
+            if rate is None:
+                results.append({
+                    'scenario': run[0], 'bytes_on_wire': run[1],
+                    'directory': run[2], 'status': 'failed',
+                    'error': 'No send rate given for the scenario'
+                })
+                continue
+            future = executor.submit(
+                evaluate_run, run, rate, force, content_hash,
+                None if no_cache else cache_dir
+            )
+            futures[future] = run
+        for future in as_completed(futures):
+            run = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                # The worker process itself died
+                result = {
+                    'scenario': run[0], 'bytes_on_wire': run[1],
+                    'directory': run[2], 'status': 'failed',
+                    'error': repr(error)
+                }
+            print(f"{result['status']:>7} {run[0]} {run[1]} Byte")
+            results.append(result)
+
+    summary = pd.DataFrame(results).sort_values(['scenario', 'bytes_on_wire'])
+    failed = summary[summary.status == 'failed']
+    for result in failed.itertuples():
+        print(f'\n{result.directory} failed:\n{result.error}')
+    summary = summary.drop(columns=['directory', 'error'], errors='ignore')
+    if 'packets' in summary:
+        summary['packets'] = summary['packets'].astype('Int64')
+    if summary_file is None:
+        summary_file = os.path.join(root_dirs[0], SUMMARY_FILE)
+    summary.to_csv(summary_file, index=False)
+    print()
+    print(summary.to_string(index=False))
+    return 1 if len(failed) else 0
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description="Evaluates the end-to-end delays of all measurements below the given directories in parallel.")
+
+    parser.add_argument(
+        'root_dirs',
+        nargs='+',
+        help="Directories containing scenario directories, or scenario directories themselves, holding one directory per packet size (bytes on wire) with the captures `out` and `in` (or `out_raw` and `in_raw`)."
+    )
+
+    parser.add_argument(
+        '--send-rate',
+        type=int,
+        help="The bandwidth at which packets were sent in Bit/second (default is the rate in the scenario's name, e.g. `10MBit`).",
+        default=None
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help="The number of directories evaluated in parallel (default is the number of CPUs).",
+        default=None
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help="Evaluate directories even if their delays are up to date."
+    )
+
+    parser.add_argument(
+        '--content-hash',
+        action='store_true',
+        help="Compare the captures by their SHA-256 hash instead of their modification time, e.g. after copying them."
+    )
+
+    parser.add_argument(
+        '--summary-file',
+        help="The CSV to write the delay statistics of every directory to (default is summary.csv in the first directory).",
+        default=None
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help="The directory of the columnar cache read by the visualizations, see measurement_cache.py.",
+        default=CACHE_DIR
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Do not store the delays in the columnar cache."
+    )
+
+    kwargs = vars(parser.parse_args())
+    raise SystemExit(main(**kwargs))
@@ -1,7 +1,11 @@
 import argparse as ap
 import json
 import os
+import re
+import tempfile
+import numpy as np
 import pandas as pd
+from pcap_reader import is_capture, iter_capture
 
 PROTOCOL_OVERHEAD = {
     'ETHERNET_HEADER': 8,
@@ -16,70 +20,345 @@ DL_OVERHEAD = {
 }
 
 
+# The number of packets read, and of rows written, at once
+CHUNK_PACKETS = 1 << 22
+# The number of characters of a JSON file decoded at once
+JSON_BLOCK = 1 << 20
+# The separators between the elements of a JSON list
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+# The sorted runs of sent (side 0) and received (side 1) packets spilled to
+# disk by `iter_delays`, one entry per ID and chunk, and of matched packets
+PACKET_RECORD = np.dtype([
+    ('id', np.int64), ('side', np.int8), ('first', np.int64),
+    ('time', np.float64),
+])
+MATCH_RECORD = np.dtype([
+    ('first', np.int64), ('id', np.int64), ('out', np.float64),
+    ('in', np.float64),
+])
+
+# The value of every hexadecimal digit by ASCII code
+HEX_DIGITS = np.full(256, -1, dtype=np.int64)
+for (digits, first) in ((b'0123456789', 0), (b'abcdef', 10), (b'ABCDEF', 10)):
+    HEX_DIGITS[np.frombuffer(digits, dtype=np.uint8)] = \
+        np.arange(first, first + len(digits))
+
+
 def parse_id(s):
     s_1 = s.split(':')
     s_1.reverse()
     return int(''.join(s_1), 16)
 
 
-def to_delays(input_file_out=None, input_file_in=None, bytes_on_wire=None, send_rate=None, **kwargs):
+def parse_ids(strings):
+    """ Parses hexadecimal packet IDs like `parse_id`, vectorized for IDs of
+    equal width without colons """
+    raw = np.array(strings, dtype=np.bytes_)
+    width = raw.dtype.itemsize
+    if not len(raw) or width > 15 or \
+            (np.char.str_len(raw) != width).any() or \
+            (np.char.find(raw, b':') >= 0).any():
+        return np.array([parse_id(s) for s in strings], dtype=np.int64)
+    digits = HEX_DIGITS[raw.view(np.uint8).reshape(-1, width)]
+    if (digits < 0).any():
+        raise ValueError('Packet IDs must be hexadecimal')
+    ids = np.zeros(len(raw), dtype=np.int64)
+    for column in range(width):
+        ids = (ids << 4) | digits[:, column]
+    return ids
+
+
+def iter_json(input_file, block=JSON_BLOCK):
+    """ Decodes the elements of a JSON list one after another, so that a
+    file written by `convert_to_json.sh` is never loaded as a whole
+
+    Yields
+    ------
+    object
+        The next decoded element
+    """
+    decoder = json.JSONDecoder()
+    with open(input_file, 'r') as source:
+        buffer = source.read(block).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{input_file} does not contain a JSON list')
+        (buffer, position, exhausted) = (buffer[1:], 0, False)
+        while True:
+            position = JSON_SEPARATORS.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                (element, end) = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # The element continues in the next block
+                if exhausted:
+                    raise
+                end = None
+            if end is None or (end == len(buffer) and not exhausted):
+                data = source.read(block)
+                exhausted = not data
+                (buffer, position) = (buffer[position:] + data, 0)
+                continue
+            yield element
+            position = end
+
+
+def iter_packets(input_file, chunk_packets=CHUNK_PACKETS):
+    """ Reads the ID and capture time of every packet in chunks from either
+    a pcap or pcapng capture, a .npz file written by `pcap_reader.py` or a
+    JSON file written by `convert_to_json.sh`
+
+    Captures and JSON files are read with constant memory, .npz files are
+    loaded as a whole.
+
+    Yields
+    ------
+    (ids, times)
+        The packet IDs (int64) and capture times in seconds since the epoch
+        (float64) of the next chunk of packets
+    """
+    if is_capture(input_file):
+        for (times, ids) in iter_capture(input_file, chunk_packets):
+            yield (ids, times)
+        return
+    if not input_file.endswith('.npz'):
+        packets = []
+        for data in iter_json(input_file):
+            assert data is not None
+            try:
+                assert data['id'] is not None
+                assert data['time'] is not None
+            except AssertionError as a:
+                print(data)
+                raise a
+            packets.append(data)
+            if len(packets) == chunk_packets:
+                yield _json_chunk(packets)
+                packets = []
+        if packets:
+            yield _json_chunk(packets)
+        return
+    with np.load(input_file) as packets:
+        (ids, times) = (packets['id'], packets['time'])
+    for start in range(0, len(ids), chunk_packets):
+        yield (
+            ids[start:start + chunk_packets].astype(np.int64),
+            times[start:start + chunk_packets].astype(np.float64)
+        )
+
+
+def _json_chunk(packets):
+    return (
+        parse_ids([data['id'] for data in packets]),
+        np.array([data['time'] for data in packets], dtype=np.float64)
+    )
+
+
+def load_packets(input_file):
+    """ Reads the ID and capture time of every packet, see `iter_packets`
+
+    Returns
+    -------
+    (ids, times)
+        The packet IDs and capture times in seconds since the epoch
+    """
+    chunks = list(iter_packets(input_file))
+    if not chunks:
+        return (np.empty(0, np.int64), np.empty(0, np.float64))
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def _groups(sorted_ids):
+    """ The indices of the first and last entry of every run of equal IDs """
+    if not len(sorted_ids):
+        return (np.empty(0, np.int64), np.empty(0, np.int64))
+    starts = np.flatnonzero(
+        np.r_[True, sorted_ids[1:] != sorted_ids[:-1]]
+    )
+    return (starts, np.r_[starts[1:], len(sorted_ids)] - 1)
+
+
+def _last_of_each_id(ids):
+    """ Groups packets by ID
+
+    Returns
+    -------
+    (unique, first, last)
+        The sorted unique IDs and the indices of their first and last packet
+    """
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    (starts, ends) = _groups(sorted_ids)
+    return (sorted_ids[starts], order[starts], order[ends])
+
+
+def _spill(records, directory, name, runs):
+    """ Writes a sorted run to `directory` and appends its path to `runs`,
+    the runs named after `name` and their index
+    """
+    if len(records):
+        path = os.path.join(directory, f'{name}-{len(runs)}.npy')
+        np.save(path, records)
+        runs.append(path)
+
+
+def _merge_runs(runs, key, block):
+    """ Merges the runs spilled by `_spill`, each sorted by `key`
+
+    Every run is memory-mapped and read `block` records at a time. Records
+    of equal key keep the order of their runs and are never split across
+    chunks.
+
+    Yields
+    ------
+    numpy.ndarray
+        The next records in the order of `key`
+    """
+    runs = [np.load(path, mmap_mode='r') for path in runs]
+    positions = [0] * len(runs)
+    size = block
+    while runs:
+        blocks = [
+            run[position:position + size]
+            for (run, position) in zip(runs, positions)
+        ]
+        # Records up to the smallest last key of any partially read run may
+        # continue in that run's next block
+        bounds = [
+            records[key][-1]
+            for (run, position, records) in zip(runs, positions, blocks)
+            if position + len(records) < len(run)
+        ]
+        taken = []
+        for (i, records) in enumerate(blocks):
+            count = len(records) if not bounds else \
+                np.searchsorted(records[key], min(bounds), 'left')
+            taken.append(records[:count])
+            positions[i] += count
+        merged = np.concatenate(taken)
+        if not len(merged):
+            # A run's block holds nothing but the bounding key
+            size *= 2
+            continue
+        size = block
+        remaining = [
+            i for (i, run) in enumerate(runs) if positions[i] < len(run)
+        ]
+        runs = [runs[i] for i in remaining]
+        positions = [positions[i] for i in remaining]
+        yield merged[np.argsort(merged[key], kind='stable')]
+
+
+def _match(records):
+    """ Matches the merged records of sent and received packets of complete
+    IDs, see `iter_delays`
+
+    Returns
+    -------
+    numpy.ndarray
+        A `MATCH_RECORD` of every ID both sent and received, sorted by the
+        index of its first sent packet
+    """
+    (sent, received) = (
+        records[records['side'] == 0], records[records['side'] == 1]
+    )
+    (sent_starts, sent_ends) = _groups(sent['id'])
+    received_ends = _groups(received['id'])[1]
+    (_, sent_rows, received_rows) = np.intersect1d(
+        sent['id'][sent_starts], received['id'][received_ends],
+        assume_unique=True, return_indices=True
+    )
+    matched = np.empty(len(sent_rows), dtype=MATCH_RECORD)
+    matched['first'] = sent['first'][sent_starts[sent_rows]]
+    matched['id'] = sent['id'][sent_starts[sent_rows]]
+    matched['out'] = sent['time'][sent_ends[sent_rows]]
+    matched['in'] = received['time'][received_ends[received_rows]]
+    return matched[np.argsort(matched['first'], kind='stable')]
+
+
+def iter_delays(input_file_out=None, input_file_in=None, bytes_on_wire=None,
+                send_rate=None, chunk_packets=CHUNK_PACKETS, spill_dir=None,
+                **kwargs):
+    """ Matches the sent and received packets by ID and computes their
+    delays, see `to_delays`
+
+    Both captures are read chunk by chunk, reduced to one entry per ID and
+    chunk and spilled to disk as runs sorted by ID. The merged runs are
+    matched ID by ID and spilled again as runs sorted by the position of the
+    first sent packet, whose merge yields the rows. This way, memory stays
+    bounded by `chunk_packets` for any capture size, while disk space in
+    `spill_dir` grows with it. As before, the last capture of an ID wins and
+    the packets keep the order in which their IDs were first sent.
+
+    Yields
+    ------
+    pandas.DataFrame
+        The next chunk of matched packets, indexed by their row
+    """
     assert os.path.isfile(os.path.abspath(input_file_in))
     assert os.path.isfile(os.path.abspath(input_file_out))
-    import numpy
-    out_data = json.load(open(input_file_out, 'r'))
-    in_data = json.load(open(input_file_in, 'r'))
-    packets = {}
-    for data in out_data:
-        assert data is not None
-        try:
-            assert data['id'] is not None
-            assert data['time'] is not None
-        except AssertionError as a:
-            print(data)
-            raise a
-        packet_id = parse_id(data['id'])
-        leave_time = float(data['time'])
-        packets[packet_id] = {
-            'id': packet_id,
-            'out': leave_time
-        }
-
-    for data in in_data:
-        assert data is not None
-        assert data['id'] is not None
-        assert data['time'] is not None
-        packet_id = parse_id(data['id'])
-        arrival_time = float(data['time'])
-        if packet_id in packets:
-            packets[packet_id]['in'] = arrival_time
-
-    result = []
 
     transmission_delay = (bytes_on_wire / (send_rate / 8)) * 2
     frame_bytes = bytes_on_wire - sum(DL_OVERHEAD.values())
     udp_bytes = frame_bytes - sum(PROTOCOL_OVERHEAD.values())
 
-    for packet in packets.values():
-        if 'in' not in packet:
-            continue
-        packet['delay'] = packet['in'] - packet['out']
-        assert packet['delay'] >= 0
-        packet['transmission_delay'] = transmission_delay
-        packet['processing_delay'] = packet['delay'] - packet['transmission_delay']
-        packet['bytes_on_wire'] = bytes_on_wire
-        packet['frame_bytes'] = frame_bytes
-        packet['udp_bytes'] = udp_bytes
-        result.append(packet)
+    def to_frame(matched, start):
+        delay = matched['in'] - matched['out']
+        assert (delay >= 0).all()
+        return pd.DataFrame({
+            'id': matched['id'],
+            'out': matched['out'],
+            'in': matched['in'],
+            'delay': delay,
+            'transmission_delay': transmission_delay,
+            'processing_delay': delay - transmission_delay,
+            'bytes_on_wire': bytes_on_wire,
+            'frame_bytes': frame_bytes,
+            'udp_bytes': udp_bytes,
+        }, index=pd.RangeIndex(start, start + len(matched)))
+
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        packet_runs = []
+        for (side, input_file) in enumerate((input_file_out, input_file_in)):
+            offset = 0
+            for (ids, times) in iter_packets(input_file, chunk_packets):
+                (unique, first, last) = _last_of_each_id(ids)
+                records = np.empty(len(unique), dtype=PACKET_RECORD)
+                records['id'] = unique
+                records['side'] = side
+                records['first'] = offset + first
+                records['time'] = times[last]
+                _spill(records, directory, 'packets', packet_runs)
+                offset += len(ids)
+
+        match_runs = []
+        block = max(chunk_packets // max(len(packet_runs), 1), 1)
+        for records in _merge_runs(packet_runs, 'id', block):
+            _spill(_match(records), directory, 'matched', match_runs)
 
-    return pd.DataFrame(result)
+        start = 0
+        block = max(chunk_packets // max(len(match_runs), 1), 1)
+        for matched in _merge_runs(match_runs, 'first', block):
+            yield to_frame(matched, start)
+            start += len(matched)
+        if not start:
+            yield to_frame(np.empty(0, dtype=MATCH_RECORD), 0)
+
+
+def to_delays(input_file_out=None, input_file_in=None, bytes_on_wire=None, send_rate=None, **kwargs):
+    return pd.concat(list(iter_delays(
+        input_file_out, input_file_in, bytes_on_wire, send_rate, **kwargs
+    )))
 
 
 def main(action=None, csv_file=None, **kwargs):
     assert os.path.isdir(os.path.dirname(os.path.abspath(csv_file)))
     if action == 'eval-processing-delay':
-        df = to_delays(**kwargs)
         print('\n')
-        df.to_csv(csv_file)
+        # Written chunk by chunk to keep the memory bounded
+        for (i, df) in enumerate(iter_delays(**kwargs)):
+            df.to_csv(csv_file, mode='w' if i == 0 else 'a', header=i == 0)
 
 
 if __name__ == '__main__':
@@ -93,12 +372,12 @@ if __name__ == '__main__':
 
     parser.add_argument(
         '--input-file-in',
-        help="The json containing the id and capture time for all received packets.",
+        help="The capture, .npz or json containing the id and capture time for all received packets.",
     )
 
     parser.add_argument(
         '--input-file-out',
-        help="The json containing the id and capture time for all sent packets.",
+        help="The capture, .npz or json containing the id and capture time for all sent packets.",
     )
 
     parser.add_argument(
@@ -125,6 +404,11 @@ if __name__ == '__main__':
         help='The bandwidth at which packets are sent in Bit/second',
         type=int,
     )
+
+    parser.add_argument(
+        '--spill-dir',
+        help="The directory the sorted runs of packets are spilled to while matching them, by default the system's temporary directory.",
+    )
     try:
         kwargs = vars(parser.parse_args())
     except Exception:
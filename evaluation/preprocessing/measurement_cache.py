@@ -0,0 +1,297 @@
+import argparse as ap
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from experiment import parse_ids
+
+# CSV and JSON files are parsed once into a directory of .npy files per
+# column, stored under the SHA-256 hash of the source file's content.
+# Changing how sources are converted invalidates all cached entries
+FORMAT_VERSION = 1
+CACHE_DIR = os.environ.get(
+    'EVALUATION_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache')
+)
+HASH_BLOCK = 1 << 20
+# The kinds of source files, see `READERS`
+TABLE = 'table'
+TIMESTAMPS = 'timestamps'
+COLUMNS_FILE = 'columns.json'
+# The column written by `DataFrame.to_csv` for the index
+UNNAMED_INDEX = 'Unnamed: 0'
+
+
+def read_table(path):
+    """ Reads the columns of a CSV file, integer columns as int64, other
+    numeric columns as float64, dropping an unnamed index
+    """
+    # Parsed exactly, like the columns stored while writing a file
+    df = pd.read_csv(path, float_precision='round_trip')
+    df = df.drop(columns=[UNNAMED_INDEX], errors='ignore')
+    columns = {}
+    for (name, column) in df.items():
+        if pd.api.types.is_integer_dtype(column):
+            columns[name] = column.to_numpy(np.int64)
+        elif pd.api.types.is_numeric_dtype(column):
+            columns[name] = column.to_numpy(np.float64)
+        else:
+            columns[name] = column.to_numpy(str)
+    return columns
+
+
+def read_timestamps(path):
+    """ Reads a JSON list of packets with a hexadecimal `id` and a `time`,
+    as written by `convert_to_json.sh`, into int64 and float64 columns
+    """
+    with open(path, 'r') as source:
+        packets = json.load(source)
+    return {
+        'id': parse_ids([packet['id'] for packet in packets]),
+        'time': np.array(
+            [packet['time'] for packet in packets], dtype=np.float64
+        ),
+    }
+
+
+READERS = {
+    TABLE: read_table,
+    TIMESTAMPS: read_timestamps,
+}
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _replace(data, path):
+    # Written to a temporary file first, as parallel processes may store the
+    # same file
+    (handle, partial) = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(handle, 'w') as partial_file:
+        json.dump(data, partial_file)
+    os.replace(partial, path)
+
+
+def source_hash(path, cache_dir=CACHE_DIR):
+    """ The SHA-256 hash of a file's content, only computed again if the
+    file's size or modification time changed
+    """
+    real_path = os.path.realpath(path)
+    status = os.stat(real_path)
+    stamp = {'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+    hashes_dir = os.path.join(cache_dir, 'hashes')
+    os.makedirs(hashes_dir, exist_ok=True)
+    stamp_file = os.path.join(
+        hashes_dir, hashlib.sha1(real_path.encode()).hexdigest() + '.json'
+    )
+    try:
+        with open(stamp_file) as stamp_source:
+            known = json.load(stamp_source)
+        if all(known.get(key) == value for (key, value) in stamp.items()):
+            return known['sha256']
+    except (OSError, ValueError, KeyError):
+        pass
+    stamp['sha256'] = _hash_file(real_path)
+    stamp['path'] = real_path
+    _replace(stamp, stamp_file)
+    return stamp['sha256']
+
+
+def _entry_dir(path, kind, cache_dir):
+    return os.path.join(
+        cache_dir, f'{kind}-v{FORMAT_VERSION}-{source_hash(path, cache_dir)}'
+    )
+
+
+def _load_entry(entry):
+    with open(os.path.join(entry, COLUMNS_FILE)) as names:
+        return {
+            name: np.load(os.path.join(entry, f'{i}.npy'), mmap_mode='r')
+            for (i, name) in enumerate(json.load(names))
+        }
+
+
+def store_columns(path, kind, columns, cache_dir=CACHE_DIR):
+    """ Stores the columns read from a source file, e.g. while writing it,
+    so that it is never parsed again
+
+    Returns
+    -------
+    str
+        The directory of the cached columns
+    """
+    entry = _entry_dir(path, kind, cache_dir)
+    if os.path.isdir(entry):
+        return entry
+    partial = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        for (i, column) in enumerate(columns.values()):
+            np.save(os.path.join(partial, f'{i}.npy'), np.asarray(column))
+        with open(os.path.join(partial, COLUMNS_FILE), 'w') as names:
+            json.dump(list(columns), names)
+        os.rename(partial, entry)
+    except OSError:
+        # Another process stored the same entry first
+        shutil.rmtree(partial, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+    return entry
+
+
+class ColumnWriter:
+    """
+    Stores the columns of a source file chunk by chunk while it is written,
+    see `store_columns`, so that they are never held in memory as a whole.
+
+    Every column is appended to a raw file in a temporary directory of the
+    cache and turned into a .npy file by `store`. All chunks must have the
+    columns of the first one, with numeric values.
+
+    Attributes
+    ----------
+    cache_dir
+        The directory of the cache
+    partial
+        The temporary directory the columns are written to
+    names
+        The names of the columns, None before the first chunk
+    dtypes
+        The types of the columns, taken from the first chunk
+    rows
+        The number of rows appended
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.partial = tempfile.mkdtemp(dir=cache_dir)
+        self.names = None
+        self.dtypes = []
+        self.rows = 0
+        self._files = []
+
+    def append(self, columns):
+        """ Appends a chunk of rows, given as columns by name """
+        if self.names is None:
+            self.names = list(columns)
+            for (i, column) in enumerate(columns.values()):
+                self.dtypes.append(np.asarray(column).dtype)
+                self._files.append(
+                    open(os.path.join(self.partial, f'{i}.raw'), 'wb')
+                )
+        if list(columns) != self.names:
+            raise ValueError('Every chunk must have the same columns')
+        for (column, dtype, raw) in zip(
+                columns.values(), self.dtypes, self._files):
+            np.ascontiguousarray(column, dtype=dtype).tofile(raw)
+        self.rows += len(next(iter(columns.values()), []))
+
+    def store(self, path, kind=TABLE):
+        """ Stores the appended columns as the entry of a source file
+
+        Returns
+        -------
+        str
+            The directory of the cached columns
+        """
+        for raw in self._files:
+            raw.close()
+        entry = _entry_dir(path, kind, self.cache_dir)
+        if os.path.isdir(entry):
+            self.discard()
+            return entry
+        try:
+            for (i, dtype) in enumerate(self.dtypes):
+                raw_file = os.path.join(self.partial, f'{i}.raw')
+                with open(os.path.join(self.partial, f'{i}.npy'), 'wb') \
+                        as column, open(raw_file, 'rb') as raw:
+                    np.lib.format.write_array_header_1_0(column, {
+                        'descr': np.lib.format.dtype_to_descr(dtype),
+                        'fortran_order': False,
+                        'shape': (self.rows,),
+                    })
+                    shutil.copyfileobj(raw, column, HASH_BLOCK)
+                os.remove(raw_file)
+            with open(os.path.join(self.partial, COLUMNS_FILE), 'w') as names:
+                json.dump(self.names or [], names)
+            os.rename(self.partial, entry)
+        except OSError:
+            # Another process stored the same entry first
+            self.discard()
+            if not os.path.isdir(entry):
+                raise
+        return entry
+
+    def discard(self):
+        """ Removes the appended columns unless they were stored """
+        for raw in self._files:
+            raw.close()
+        shutil.rmtree(self.partial, ignore_errors=True)
+
+
+def load_columns(path, kind=TABLE, cache_dir=CACHE_DIR):
+    """ The columns of a source file of a kind in `READERS`, memory-mapped
+    from the cache, which is filled on the first load
+
+    Returns
+    -------
+    dict
+        The read-only columns as NumPy arrays by name
+    """
+    entry = _entry_dir(path, kind, cache_dir)
+    if not os.path.isdir(entry):
+        entry = store_columns(path, kind, READERS[kind](path), cache_dir)
+    return _load_entry(entry)
+
+
+def load_table(path, cache_dir=CACHE_DIR):
+    """ A CSV file as DataFrame, see `read_table` and `load_columns` """
+    return pd.DataFrame(load_columns(path, TABLE, cache_dir), copy=False)
+
+
+def load_timestamps(path, cache_dir=CACHE_DIR):
+    """ The packet IDs and capture times of a JSON file as DataFrame, see
+    `read_timestamps` and `load_columns`
+    """
+    return pd.DataFrame(load_columns(path, TIMESTAMPS, cache_dir), copy=False)
+
+
+def main(files=None, kind=None, cache_dir=None):
+    for path in files:
+        columns = load_columns(path, kind, cache_dir)
+        print(f'{path}: {len(next(iter(columns.values()), []))} rows, '
+              f'columns {", ".join(columns)}')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description="Converts measurement files into the columnar cache read by the visualizations.")
+
+    parser.add_argument(
+        'files',
+        nargs='+',
+        help="The CSV or JSON files to convert."
+    )
+
+    parser.add_argument(
+        '--kind',
+        help="The kind of the files, `table` for CSV files like delays.csv and `timestamps` for JSON files written by convert_to_json.sh.",
+        choices=list(READERS),
+        default=TABLE
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help="The directory of the cache, shared by all measurements.",
+        default=CACHE_DIR
+    )
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
@@ -0,0 +1,531 @@
+import argparse as ap
+import mmap
+import struct
+
+import numpy as np
+
+# Magic numbers of classic pcap files, as read in little-endian byte order
+PCAP_MAGIC_MICROSECONDS = 0xa1b2c3d4
+PCAP_MAGIC_NANOSECONDS = 0xa1b23c4d
+PCAP_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+
+# pcapng block types and the byte-order magic of the section header
+PCAPNG_SECTION_HEADER = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_ENHANCED_PACKET = 6
+PCAPNG_INTERFACE_DESCRIPTION_LEN = 16
+PCAPNG_ENHANCED_PACKET_HEADER_LEN = 28
+# Interface option holding the timestamp resolution
+PCAPNG_IF_TSRESOL = 9
+
+# The packet ID of the measurement streams: the bytes `frame_raw[86:92]` of
+# tshark's hex dump, i.e. the 3 Byte following the first byte of the UDP
+# payload, read in network byte order
+ID_OFFSET = 43
+ID_LENGTH = 3
+
+# The number of consecutive records of equal length whose headers are first
+# checked at once, growing up to `MAX_STRIDE_CHUNK` while the records keep
+# their length
+MIN_STRIDE_CHUNK = 16
+MAX_STRIDE_CHUNK = 1 << 20
+# The number of packets decoded at once by `iter_capture`
+DEFAULT_CHUNK_PACKETS = 1 << 22
+
+
+class CaptureFormatError(ValueError):
+    pass
+
+
+def _strided(data, start, stride, count, dtype):
+    """ A view of the `count` values of `dtype` at `start`, `start + stride`,
+    ... of a uint8 array, without copying them
+    """
+    return np.ndarray(
+        (count,), dtype, buffer=data, offset=start, strides=(stride,)
+    )
+
+
+def _gathered(data, positions, dtype):
+    """ A copy of the values of `dtype` at arbitrary `positions` of a uint8
+    array
+    """
+    dtype = np.dtype(dtype)
+    raw = data[positions[:, None] + np.arange(dtype.itemsize)]
+    return raw.view(dtype).ravel()
+
+
+def _walk_records(data, offset, record, same_record, stride_matches):
+    """ Finds all packet records of a capture.
+
+    Records are walked one at a time with `record`, except when records of
+    the same length follow each other, as in a capture of a stream of
+    equally sized packets. Then the headers of a chunk of consecutive
+    records are validated at once with `stride_matches`, so that the cost
+    per record is a few vectorized operations on strided views.
+
+    Parameters
+    ----------
+    data
+        The capture as uint8 array
+    offset
+        The offset of the first record
+    record
+        Called with the offset of a record, returns its total length and
+        whether it is a packet record, or None if the record is truncated
+    same_record
+        Called with the offset of a record and a length, returns whether it
+        is a packet record of that length
+    stride_matches
+        Called with the offset, length and number of consecutive records,
+        returns whether each of them is a packet record of that length
+
+    Yields
+    ------
+    tuple or numpy.ndarray
+        The packet records in file order, as `(offset, length, count)` runs
+        of consecutive records of equal length and as arrays of the offsets
+        of records of varying length
+    """
+    end = len(data)
+    singles = []
+    chunk = MIN_STRIDE_CHUNK
+    while offset < end:
+        info = record(offset)
+        if info is None:
+            break
+        (length, is_packet) = info
+        if not is_packet:
+            offset += length
+            continue
+        if offset + 2 * length > end or \
+                not same_record(offset + length, length):
+            singles.append(offset)
+            offset += length
+            if len(singles) == MAX_STRIDE_CHUNK:
+                yield np.array(singles, dtype=np.int64)
+                singles = []
+            continue
+
+        if singles:
+            yield np.array(singles, dtype=np.int64)
+            singles = []
+        count = min(chunk, (end - offset) // length)
+        matching = stride_matches(offset, length, count)
+        if matching.all():
+            run = count
+            chunk = min(chunk * 4, MAX_STRIDE_CHUNK)
+        else:
+            # The first two records were validated already
+            run = max(int(np.argmin(matching)), 2)
+            chunk = MIN_STRIDE_CHUNK
+        yield (offset, length, run)
+        offset += run * length
+    if singles:
+        yield np.array(singles, dtype=np.int64)
+
+
+def _segment_length(segment):
+    return segment[2] if isinstance(segment, tuple) else len(segment)
+
+
+def _batches(segments, size):
+    """ Groups segments into lists of `size` packets, splitting segments
+    where needed. `size` None puts all segments into one list
+    """
+    if size is None:
+        yield list(segments)
+        return
+    batch = []
+    count = 0
+    for segment in segments:
+        length = _segment_length(segment)
+        while count + length > size:
+            take = size - count
+            if isinstance(segment, tuple):
+                (offset, stride, _) = segment
+                batch.append((offset, stride, take))
+                segment = (offset + take * stride, stride, length - take)
+            else:
+                batch.append(segment[:take])
+                segment = segment[take:]
+            yield batch
+            batch = []
+            count = 0
+            length -= take
+        if length:
+            batch.append(segment)
+            count += length
+    if batch:
+        yield batch
+
+
+def _column(data, segments, field_offset, dtype):
+    """ The values of a header field of all records of `segments` """
+    if not segments:
+        return np.empty(0, dtype)
+    return np.concatenate([
+        _strided(data, segment[0] + field_offset, segment[1], segment[2],
+                 dtype)
+        if isinstance(segment, tuple)
+        else _gathered(data, segment + field_offset, dtype)
+        for segment in segments
+    ])
+
+
+def _offsets(segments):
+    """ The offsets of all records of `segments` """
+    if not segments:
+        return np.empty(0, np.int64)
+    return np.concatenate([
+        segment[0] + np.arange(segment[2], dtype=np.int64) * segment[1]
+        if isinstance(segment, tuple) else segment
+        for segment in segments
+    ])
+
+
+def _packet_ids(data, segments, data_offset, captured, id_offset, id_length):
+    """ Reads the packet IDs of all packets long enough to carry one
+
+    Parameters
+    ----------
+    data_offset
+        The offset of the packet data in a record
+    captured
+        The captured length of every packet of `segments`
+
+    Returns
+    -------
+    (mask, ids)
+        Which of the packets carry an ID and their IDs as int64
+    """
+    mask = captured >= id_offset + id_length
+    start = data_offset + id_offset
+    ids = np.zeros(len(captured), dtype=np.int64)
+    position = 0
+    for segment in segments:
+        if isinstance(segment, tuple):
+            (offset, length, count) = segment
+            segment_ids = ids[position:position + count]
+            # All records of a run have the same length, runs of records
+            # too short for an ID are masked anyway
+            if length >= start + id_length:
+                for i in range(id_length):
+                    segment_ids <<= 8
+                    segment_ids |= _strided(
+                        data, offset + start + i, length, count, np.uint8
+                    )
+        else:
+            count = len(segment)
+            segment_ids = ids[position:position + count]
+            # Keep the positions of records too short for an ID, which are
+            # masked, within the capture
+            positions = np.minimum(segment + start, len(data) - id_length)
+            raw = data[positions[:, None] + np.arange(id_length)]
+            for i in range(id_length):
+                segment_ids <<= 8
+                segment_ids |= raw[:, i]
+        position += count
+    return (mask, ids[mask])
+
+
+def _read_pcap(mm, data, id_offset, id_length):
+    """ Returns the packet records of a pcap file, see `_walk_records`,
+    and the functions decoding a list of them into packet IDs or frames
+    """
+    (magic,) = struct.unpack_from('<I', mm, 0)
+    if magic in (PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS):
+        byteorder = '<'
+    else:
+        byteorder = '>'
+        (magic,) = struct.unpack_from('>I', mm, 0)
+    resolution = 1e-9 if magic == PCAP_MAGIC_NANOSECONDS else 1e-6
+    u32 = np.dtype(np.uint32).newbyteorder(byteorder)
+    captured_length = struct.Struct(byteorder + 'I')
+    end = len(data)
+
+    def record(offset):
+        if offset + PCAP_RECORD_HEADER_LEN > end:
+            return None
+        length = PCAP_RECORD_HEADER_LEN + \
+            captured_length.unpack_from(mm, offset + 8)[0]
+        if offset + length > end:
+            return None
+        return (length, True)
+
+    def same_record(offset, length):
+        return captured_length.unpack_from(mm, offset + 8)[0] == \
+            length - PCAP_RECORD_HEADER_LEN
+
+    def stride_matches(offset, length, count):
+        return _strided(data, offset + 8, length, count, u32) == \
+            length - PCAP_RECORD_HEADER_LEN
+
+    def times(segments, mask):
+        seconds = _column(data, segments, 0, u32)[mask]
+        fractions = _column(data, segments, 4, u32)[mask]
+        return seconds.astype(np.float64) + \
+            fractions.astype(np.float64) * resolution
+
+    def decode(segments):
+        captured = _column(data, segments, 8, u32)
+        (mask, ids) = _packet_ids(
+            data, segments, PCAP_RECORD_HEADER_LEN, captured, id_offset,
+            id_length
+        )
+        return (times(segments, mask), ids)
+
+    def decode_frames(segments):
+        return (
+            times(segments, slice(None)),
+            _offsets(segments) + PCAP_RECORD_HEADER_LEN,
+            _column(data, segments, 8, u32)
+        )
+
+    return (
+        _walk_records(
+            data, PCAP_HEADER_LEN, record, same_record, stride_matches
+        ),
+        decode,
+        decode_frames
+    )
+
+
+def _interface_resolution(mm, offset, length, byteorder):
+    """ The timestamp resolution in seconds set by an interface description
+    block's `if_tsresol` option, 1 µs by default
+    """
+    position = offset + PCAPNG_INTERFACE_DESCRIPTION_LEN
+    end = offset + length - 4
+    while position + 4 <= end:
+        (code, option_length) = struct.unpack_from(
+            byteorder + 'HH', mm, position
+        )
+        if code == 0:
+            break
+        if code == PCAPNG_IF_TSRESOL:
+            value = mm[position + 4]
+            # The most significant bit selects a power of two
+            if value & 0x80:
+                return 2.0 ** -(value & 0x7f)
+            return 10.0 ** -value
+        position += 4 + (option_length + 3) // 4 * 4
+    return 1e-6
+
+
+def _read_pcapng(mm, data, id_offset, id_length):
+    """ Returns the packet records of a pcapng file, see `_walk_records`,
+    and the functions decoding a list of them into packet IDs or frames
+    """
+    if struct.unpack_from('<I', mm, 8)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+        byteorder = '<'
+    else:
+        byteorder = '>'
+    u32 = np.dtype(np.uint32).newbyteorder(byteorder)
+    block_header = struct.Struct(byteorder + 'II')
+    end = len(data)
+    resolutions = []
+    sections = [0]
+
+    def record(offset):
+        if offset + 12 > end:
+            return None
+        (block_type, length) = block_header.unpack_from(mm, offset)
+        if length < 12 or offset + length > end:
+            return None
+        if block_type == PCAPNG_SECTION_HEADER:
+            sections[0] += 1
+            if sections[0] > 1:
+                raise CaptureFormatError(
+                    'Captures with several sections are not supported!'
+                )
+        elif block_type == PCAPNG_INTERFACE_DESCRIPTION:
+            resolutions.append(
+                _interface_resolution(mm, offset, length, byteorder)
+            )
+        return (length, block_type == PCAPNG_ENHANCED_PACKET)
+
+    def same_record(offset, length):
+        return block_header.unpack_from(mm, offset) == \
+            (PCAPNG_ENHANCED_PACKET, length)
+
+    def stride_matches(offset, length, count):
+        return (_strided(data, offset, length, count, u32) ==
+                PCAPNG_ENHANCED_PACKET) & \
+            (_strided(data, offset + 4, length, count, u32) == length)
+
+    def times(segments, mask):
+        interfaces = _column(data, segments, 8, u32)[mask]
+        ticks = (_column(data, segments, 12, u32)[mask].astype(np.uint64)
+                 << np.uint64(32)) | \
+            _column(data, segments, 16, u32)[mask].astype(np.uint64)
+
+        # Split the ticks into whole seconds and the remainder to keep the
+        # resolution of the fractional part
+        known = np.array(resolutions or [1e-6])
+        if len(known) == 1 or not len(interfaces):
+            resolution = known[0]
+        else:
+            resolution = known[interfaces]
+        ticks_per_second = np.round(1 / resolution).astype(np.uint64)
+        return (ticks // ticks_per_second).astype(np.float64) + \
+            (ticks % ticks_per_second).astype(np.float64) * resolution
+
+    def decode(segments):
+        captured = _column(data, segments, 20, u32)
+        (mask, ids) = _packet_ids(
+            data, segments, PCAPNG_ENHANCED_PACKET_HEADER_LEN, captured,
+            id_offset, id_length
+        )
+        return (times(segments, mask), ids)
+
+    def decode_frames(segments):
+        return (
+            times(segments, slice(None)),
+            _offsets(segments) + PCAPNG_ENHANCED_PACKET_HEADER_LEN,
+            _column(data, segments, 20, u32)
+        )
+
+    return (
+        _walk_records(data, 0, record, same_record, stride_matches),
+        decode,
+        decode_frames
+    )
+
+
+def _iter_mapped(mm, path, chunk_packets, id_offset, id_length,
+                 frames=False):
+    data = np.frombuffer(mm, dtype=np.uint8)
+    if len(data) < PCAP_HEADER_LEN:
+        raise CaptureFormatError(f'{path} is no capture file!')
+    (magic,) = struct.unpack_from('<I', mm, 0)
+    if magic == PCAPNG_SECTION_HEADER:
+        reader = _read_pcapng
+    elif magic in (PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS) or \
+            struct.unpack_from('>I', mm, 0)[0] in (
+                PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS):
+        reader = _read_pcap
+    else:
+        raise CaptureFormatError(f'{path} is no capture file!')
+    (segments, decode, decode_frames) = reader(
+        mm, data, id_offset, id_length
+    )
+    for batch in _batches(segments, chunk_packets):
+        if frames:
+            yield (data, *decode_frames(batch))
+        else:
+            yield decode(batch)
+
+
+def iter_capture(path, chunk_packets=DEFAULT_CHUNK_PACKETS,
+                 id_offset=ID_OFFSET, id_length=ID_LENGTH):
+    """ Reads the capture time and packet ID of every packet of a pcap or
+    pcapng file in chunks, see `read_capture`
+
+    Parameters
+    ----------
+    chunk_packets, optional
+        The maximum number of packets per chunk, None for a single chunk
+
+    Yields
+    ------
+    (times, ids)
+        The capture times and packet IDs of the next chunk of packets
+    """
+    with open(path, 'rb') as capture:
+        with mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # All views on the mapping are local to the generator, so that
+            # it is released before the mapping is closed
+            yield from _iter_mapped(
+                mm, path, chunk_packets, id_offset, id_length
+            )
+
+
+def iter_frames(path, chunk_packets=DEFAULT_CHUNK_PACKETS):
+    """ Reads the capture time and position of every frame of a pcap or
+    pcapng file in chunks, for decoding the frames' headers with NumPy
+
+    Parameters
+    ----------
+    chunk_packets, optional
+        The maximum number of frames per chunk, None for a single chunk
+
+    Yields
+    ------
+    (data, times, offsets, captured)
+        The whole capture as memory-mapped uint8 array, and the capture
+        times, offsets in `data` and captured lengths of the next chunk of
+        frames
+    """
+    with open(path, 'rb') as capture:
+        # The mapping is not closed explicitly, as the caller holds views on
+        # it, but released with the last of them
+        mm = mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+    yield from _iter_mapped(mm, path, chunk_packets, None, None, frames=True)
+
+
+def read_capture(path, id_offset=ID_OFFSET, id_length=ID_LENGTH):
+    """ Reads the capture time and packet ID of every packet of a pcap or
+    pcapng file, as previously extracted with `convert_to_json.sh`
+
+    The file is memory-mapped and its record headers are read directly into
+    NumPy arrays, packets too short to carry an ID are skipped.
+
+    Parameters
+    ----------
+    path
+        The path of the capture file
+    id_offset, optional
+        The offset of the packet ID in the frame
+    id_length, optional
+        The number of Byte of the packet ID
+
+    Returns
+    -------
+    (times, ids)
+        The capture times as seconds since the epoch (float64) and the
+        packet IDs (int64)
+    """
+    for chunk in iter_capture(path, None, id_offset, id_length):
+        return chunk
+    return (np.empty(0, np.float64), np.empty(0, np.int64))
+
+
+def is_capture(path):
+    """ Whether a file starts with the magic number of a pcap or pcapng file
+    """
+    with open(path, 'rb') as capture:
+        head = capture.read(4)
+    if len(head) < 4:
+        return False
+    return struct.unpack('<I', head)[0] in (
+        PCAPNG_SECTION_HEADER, PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS
+    ) or struct.unpack('>I', head)[0] in (
+        PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS
+    )
+
+
+def main(capture_file=None, output=None):
+    (times, ids) = read_capture(capture_file)
+    np.savez(output, time=times, id=ids)
+    print(f'{len(ids)} packets written to {output}')
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Extract the capture time and ID of every packet of a "
+                    "pcap or pcapng file.")
+
+    parser.add_argument(
+        'capture_file',
+        help="The pcap or pcapng file to read")
+
+    parser.add_argument(
+        '--output',
+        help="The .npz file to write the `time` and `id` arrays to",
+        required=True)
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
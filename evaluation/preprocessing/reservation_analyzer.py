@@ -0,0 +1,592 @@
+import argparse as ap
+import struct
+import numpy as np
+import pandas as pd
+from pcap_reader import DEFAULT_CHUNK_PACKETS, iter_frames
+
+# The reservation protocol, as defined in src/reservation_interfaces/wire.py:
+# advertisements and subscriptions are sent to UDP port 1000,
+# acknowledgements to 999
+RESERVATION_PORT = 1000
+ACKNOWLEDGEMENT_PORT = 999
+ADVERTISEMENT = 0
+SUBSCRIPTION = 1
+ACKNOWLEDGEMENT = 2
+# The fixed layout of a `ReservationPacket`, `RESERVATION_STRUCT` of wire.py
+RESERVATION_DTYPE = np.dtype([
+    ('status', 'u1'),
+    ('req_latency', '>u4'),
+    ('priority', '>u4'),
+    ('src_ip', '>u4'),
+    ('dst_ip', '>u4'),
+    ('src_port', '>u2'),
+    ('dst_port', '>u2'),
+    ('min_frame', '>u4'),
+    ('max_frame', '>u4'),
+    ('burst_size', '>u4'),
+    ('burst_interval', '>u4'),
+    ('acc_max_delay', '>u4'),
+    ('acc_min_delay', '>u4'),
+])
+# A bundle of reservations, `BUNDLE_HEADER` of wire.py followed by the
+# reservations
+BUNDLE = 0x80
+BUNDLE_VERSION = 1
+BUNDLE_HEADER_LEN = 4
+
+ETHER_HEADER_LEN = 14
+VLAN_TAG_LEN = 4
+ETHER_TYPE_IPV4 = 0x0800
+ETHER_TYPE_VLAN = 0x8100
+IP_PROTOCOL_TCP = 6
+IP_PROTOCOL_UDP = 17
+UDP_HEADER_LEN = 8
+TCP_FLAG_SYN = 0x02
+
+# The ports of the controller's OpenFlow connections and the messages
+# carrying frames, of OpenFlow 1.0 and 1.3
+OPENFLOW_PORTS = (6633, 6653)
+OFP_HEADER = struct.Struct('!BBH')
+OFP_VERSION_1_0 = 1
+OFP_VERSION_1_3 = 4
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+SEQUENCE_SPACE = 1 << 32
+
+# Where a reservation was observed: as frame on a link, or within an
+# OpenFlow message between a switch and the controller
+FRAME = 'frame'
+PACKET_IN = 'packet_in'
+PACKET_OUT = 'packet_out'
+# The identity of a stream, see `Reservation.__hash__`, and of a listener's
+# subscription to it
+STREAM = ['src_ip', 'src_port', 'dst_port']
+SUBSCRIBER = STREAM + ['listener']
+STAGES = {ADVERTISEMENT: 'advertisement', SUBSCRIPTION: 'subscription'}
+
+
+def _u8(data, positions):
+    # Positions beyond the capture are masked by the callers
+    return data[np.minimum(positions, len(data) - 1)].astype(np.int64)
+
+
+def _u16(data, positions):
+    return (_u8(data, positions) << 8) | _u8(data, positions + 1)
+
+
+def _transport_headers(data, offsets, captured):
+    """ Locates the transport headers of the IPv4 packets among Ethernet
+    frames
+
+    Returns
+    -------
+    (protocol, transport, ends)
+        The IP protocol of every frame, -1 for frames without a complete
+        IPv4 and transport header, the offsets of the transport headers and
+        the ends of the IP packets, without the padding of short frames
+    """
+    ether_type = _u16(data, offsets + 12)
+    tagged = ether_type == ETHER_TYPE_VLAN
+    ether_type = np.where(tagged, _u16(data, offsets + 16), ether_type)
+    network = offsets + ETHER_HEADER_LEN + tagged * VLAN_TAG_LEN
+    version = _u8(data, network)
+    transport = network + (version & 0x0f) * 4
+    ends = np.minimum(offsets + captured, network + _u16(data, network + 2))
+    # Only the first fragment of a packet carries its transport header
+    valid = (ether_type == ETHER_TYPE_IPV4) & (version >> 4 == 4) & \
+        (_u16(data, network + 6) & 0x1fff == 0) & \
+        (transport + UDP_HEADER_LEN <= ends)
+    protocol = np.where(valid, _u8(data, network + 9), -1)
+    return (protocol, transport, ends)
+
+
+def decode_reservations(data, offsets, captured):
+    """ Decodes the reservation packets among Ethernet frames, every
+    reservation of a bundle on its own
+
+    Parameters
+    ----------
+    data
+        The frames as uint8 array
+    offsets
+        The offset of every frame in `data`
+    captured
+        The captured length of every frame
+
+    Returns
+    -------
+    (indices, reservations)
+        The index of the frame carrying every reservation packet, repeated
+        for the reservations of a bundle, and the packets as structured
+        array of `RESERVATION_DTYPE`
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if not len(offsets) or not len(data):
+        return (np.empty(0, np.int64), np.empty(0, RESERVATION_DTYPE))
+    captured = np.asarray(captured, dtype=np.int64)
+    (protocol, transport, ends) = _transport_headers(data, offsets, captured)
+    payload = transport + UDP_HEADER_LEN
+    bundled = (_u8(data, payload) == BUNDLE) & \
+        (_u8(data, payload + 1) == BUNDLE_VERSION)
+    counts = np.where(bundled, _u8(data, payload + 3), 1)
+    starts = np.where(bundled, payload + BUNDLE_HEADER_LEN, payload)
+    frames = np.flatnonzero(
+        (protocol == IP_PROTOCOL_UDP) &
+        np.isin(_u16(data, transport + 2),
+                (RESERVATION_PORT, ACKNOWLEDGEMENT_PORT)) &
+        (payload + RESERVATION_DTYPE.itemsize <= ends) &
+        (starts + counts * RESERVATION_DTYPE.itemsize <= ends)
+    )
+    # One position per reservation, numbered within its frame
+    counts = counts[frames]
+    indices = np.repeat(frames, counts)
+    numbers = np.arange(len(indices)) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    positions = starts[indices] + numbers * RESERVATION_DTYPE.itemsize
+    raw = data[positions[:, None] + np.arange(RESERVATION_DTYPE.itemsize)]
+    reservations = raw.view(RESERVATION_DTYPE).ravel()
+    known = reservations['status'] <= ACKNOWLEDGEMENT
+    return (indices[known], reservations[known])
+
+
+def _message_frame(version, message_type, message):
+    """ The frame carried by a packet-in or packet-out message, None for
+    other messages and messages referring to a frame buffered by the switch
+    """
+    if message_type == OFPT_PACKET_IN:
+        kind = PACKET_IN
+        if version == OFP_VERSION_1_0:
+            start = 18
+        else:
+            # The match is padded to a multiple of 8 Byte, followed by 2
+            # Byte of padding
+            (match_length,) = struct.unpack_from('!H', message, 26)
+            start = 24 + (match_length + 7) // 8 * 8 + 2
+    elif message_type == OFPT_PACKET_OUT:
+        kind = PACKET_OUT
+        if version == OFP_VERSION_1_0:
+            start = 16 + struct.unpack_from('!H', message, 14)[0]
+        else:
+            start = 24 + struct.unpack_from('!H', message, 16)[0]
+    else:
+        return None
+    if start >= len(message):
+        return None
+    return (kind, message[start:])
+
+
+class OpenFlowReassembler:
+    """
+    Reassembles the TCP streams of the OpenFlow connections between the
+    switches and the controller into messages, and extracts the frames of
+    their packet-in and packet-out messages.
+
+    Retransmitted segments are dropped. After segments missing from the
+    capture, the messages are read again from the next segment, assuming it
+    starts a message, and dropped until a valid header is found.
+
+    Attributes
+    ----------
+    ports
+        The TCP ports of the controller
+    """
+    def __init__(self, ports=OPENFLOW_PORTS):
+        self.ports = ports
+        # The next sequence number and the unread data of every direction
+        # of every connection
+        self._flows = {}
+
+    def add(self, time, source, destination, sequence, flags, payload):
+        """ Adds a TCP segment
+
+        Parameters
+        ----------
+        source, destination
+            The `(ip, port)` of the sender and the receiver
+        sequence
+            The segment's sequence number
+        flags
+            The segment's TCP flags
+
+        Returns
+        -------
+        list
+            `(time, switch, kind, frame)` of every packet-in or packet-out
+            completed by the segment, where the switch is identified by the
+            `ip:port` of its connection
+        """
+        key = (source, destination)
+        if flags & TCP_FLAG_SYN:
+            self._flows[key] = [(sequence + 1) % SEQUENCE_SPACE, bytearray()]
+            return []
+        flow = self._flows.setdefault(key, [sequence, bytearray()])
+        (expected, buffer) = flow
+        if sequence != expected:
+            if (sequence - expected) % SEQUENCE_SPACE < SEQUENCE_SPACE // 2:
+                buffer.clear()
+            else:
+                overlap = (expected - sequence) % SEQUENCE_SPACE
+                if overlap >= len(payload):
+                    return []
+                payload = payload[overlap:]
+                sequence = expected
+        flow[0] = (sequence + len(payload)) % SEQUENCE_SPACE
+        buffer.extend(payload)
+
+        switch = destination if source[1] in self.ports else source
+        switch = f'{switch[0]}:{switch[1]}'
+        frames = []
+        while len(buffer) >= OFP_HEADER.size:
+            (version, message_type, length) = OFP_HEADER.unpack_from(buffer)
+            if version not in (OFP_VERSION_1_0, OFP_VERSION_1_3) or \
+                    length < OFP_HEADER.size:
+                buffer.clear()
+                break
+            if len(buffer) < length:
+                break
+            message = bytes(buffer[:length])
+            del buffer[:length]
+            try:
+                carried = _message_frame(version, message_type, message)
+            except struct.error:
+                carried = None
+            if carried is not None:
+                frames.append((time, switch, *carried))
+        return frames
+
+
+def _dotted(raw):
+    return '.'.join(str(part) for part in raw)
+
+
+def _ip(values):
+    return np.array([
+        _dotted(int(value).to_bytes(4, 'big')) for value in values
+    ], dtype=object)
+
+
+def _observations(times, kinds, switches, reservations):
+    observations = pd.DataFrame({
+        name: reservations[name].astype(np.int64)
+        for name in RESERVATION_DTYPE.names
+    })
+    observations.insert(0, 'switch', switches)
+    observations.insert(0, 'kind', kinds)
+    observations.insert(0, 'time', times)
+    return observations
+
+
+def _openflow_segments(data, times, offsets, captured, ports):
+    """ The TCP segments to or from the `ports` among Ethernet frames, see
+    `OpenFlowReassembler.add`
+    """
+    (protocol, transport, ends) = _transport_headers(data, offsets, captured)
+    candidates = np.flatnonzero(
+        (protocol == IP_PROTOCOL_TCP) &
+        (np.isin(_u16(data, transport), ports) |
+         np.isin(_u16(data, transport + 2), ports))
+    )
+    for i in candidates:
+        (network, tcp, end) = (
+            int(offsets[i]) + ETHER_HEADER_LEN, int(transport[i]),
+            int(ends[i])
+        )
+        if data[int(offsets[i]) + 12] == ETHER_TYPE_VLAN >> 8:
+            network += VLAN_TAG_LEN
+        (source_port, destination_port, sequence, header, flags) = \
+            struct.unpack('!HHI4xBB', data[tcp:tcp + 14].tobytes())
+        yield (
+            float(times[i]),
+            (_dotted(data[network + 12:network + 16]), source_port),
+            (_dotted(data[network + 16:network + 20]), destination_port),
+            sequence, flags, data[tcp + (header >> 4) * 4:end].tobytes()
+        )
+
+
+def read_observations(capture_files, chunk_packets=DEFAULT_CHUNK_PACKETS,
+                      openflow_ports=OPENFLOW_PORTS):
+    """ Reads every reservation packet of pcap or pcapng files of Ethernet
+    frames, sent as frame or within an OpenFlow packet-in or packet-out
+
+    The reservations sent as frames are decoded in chunks with NumPy, only
+    the OpenFlow connections are reassembled packet by packet.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `time`, `kind` (`FRAME`, `PACKET_IN` or `PACKET_OUT`) and
+        `switch` of every observation and the fields of the reservation,
+        sorted by time
+    """
+    parts = []
+    for capture_file in capture_files:
+        reassembler = OpenFlowReassembler(openflow_ports)
+        messages = []
+        for (data, times, offsets, captured) in \
+                iter_frames(capture_file, chunk_packets):
+            (indices, reservations) = decode_reservations(
+                data, offsets, captured
+            )
+            parts.append(_observations(
+                times[indices], FRAME, '', reservations
+            ))
+            for segment in _openflow_segments(
+                    data, times, offsets, captured, openflow_ports):
+                messages.extend(reassembler.add(*segment))
+        if messages:
+            (message_times, switches, kinds, frames) = zip(*messages)
+            lengths = np.array([len(frame) for frame in frames])
+            (indices, reservations) = decode_reservations(
+                np.frombuffer(b''.join(frames), dtype=np.uint8),
+                np.r_[0, np.cumsum(lengths)[:-1]], lengths
+            )
+            parts.append(_observations(
+                np.array(message_times)[indices],
+                np.array(kinds, dtype=object)[indices],
+                np.array(switches, dtype=object)[indices], reservations
+            ))
+    if not parts:
+        return _observations(
+            np.empty(0), FRAME, '', np.empty(0, RESERVATION_DTYPE)
+        )
+    return pd.concat(parts, ignore_index=True).sort_values(
+        'time', kind='stable', ignore_index=True
+    )
+
+
+def _hops(observations, status, keys):
+    """ The first packet-in and packet-out of reservations of a status at
+    every switch, numbered in the order the switches were reached
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `keys`, `switch`, `hop` (from 1), `packet_in` and `packet_out`
+    """
+    messages = observations[
+        (observations.status == status) & (observations.kind != FRAME)
+    ]
+    hops = messages.groupby(keys + ['switch', 'kind']).time.min() \
+        .unstack('kind').reindex(columns=[PACKET_IN, PACKET_OUT]) \
+        .reset_index()
+    hops.columns.name = None
+    return _numbered(hops, keys)
+
+
+def _numbered(hops, keys):
+    reached = hops[PACKET_IN].fillna(hops[PACKET_OUT])
+    hops = hops.iloc[np.lexsort([reached] + [hops[key] for key in keys[::-1]])]
+    return hops.assign(hop=hops.groupby(keys).cumcount() + 1)
+
+
+def _hop_columns(hops, keys, stage):
+    """ The packet-in and packet-out times of the hops with one column per
+    hop, e.g. `subscription_hop1_in`
+    """
+    wide = hops.pivot(index=keys, columns='hop',
+                      values=[PACKET_IN, PACKET_OUT])
+    wide = wide.sort_index(axis=1, level=['hop', None])
+    wide.columns = [
+        f'{stage}_hop{hop}_{"in" if kind == PACKET_IN else "out"}'
+        for (kind, hop) in wide.columns
+    ]
+    return wide
+
+
+def _controller_delay(hops, keys):
+    # The time the controller took at all switches that forwarded the packet
+    return (hops[PACKET_OUT] - hops[PACKET_IN]).groupby(
+        [hops[key] for key in keys]
+    ).sum(min_count=1)
+
+
+def _unanswered(hops, keys):
+    # Packet-ins the controller did not answer with a packet-out
+    return (hops[PACKET_IN].notna() & hops[PACKET_OUT].isna()).groupby(
+        [hops[key] for key in keys]
+    ).any()
+
+
+def correlate(observations):
+    """ Correlates the advertisement, subscriptions and acknowledgements of
+    every stream, see `read_observations`
+
+    Every stage is represented by its first observation, so that refreshed
+    advertisements and repeated subscriptions are ignored. The advertisement
+    hops of a listener are the switches its subscription passed, or all
+    switches reached without a subscription.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A row per stream and listener, or per stream without any listener,
+        with the times of the advertisement, subscription and
+        acknowledgement and of every hop's packet-in and packet-out, the
+        accumulated delays in µs received by the listener, the outcome
+        `acknowledged`, `rejected` (by a switch's controller), `subscribed`
+        (without acknowledgement), `dropped` (advertisement exceeding its
+        latency at a switch) or `advertised`, and the delays of the stages
+        in seconds
+    """
+    observations = observations.assign(listener=np.where(
+        observations.status == ADVERTISEMENT, 0, observations.dst_ip
+    ))
+    advertisements = observations[observations.status == ADVERTISEMENT]
+    responses = observations[observations.status != ADVERTISEMENT]
+
+    firsts = responses.groupby(SUBSCRIBER + ['status']).time.min() \
+        .unstack('status').reindex(columns=[SUBSCRIPTION, ACKNOWLEDGEMENT])
+    firsts.columns = ['subscribed', 'acknowledged']
+    streams = advertisements.groupby(STREAM).time.min().rename('advertised')
+    rows = firsts.reset_index().merge(
+        streams.reset_index(), on=STREAM, how='outer'
+    )
+    rows['listener'] = rows['listener'].fillna(0).astype(np.int64)
+    rows = rows.set_index(SUBSCRIBER).sort_index()
+
+    # The delays accumulated up to the listener, as carried by its
+    # subscription, and up to the farthest switch otherwise
+    delays = ['req_latency', 'acc_max_delay', 'acc_min_delay']
+    subscriptions = responses[responses.status == SUBSCRIPTION]
+    received = subscriptions.loc[
+        subscriptions.groupby(SUBSCRIBER).time.idxmin(), SUBSCRIBER + delays
+    ].set_index(SUBSCRIBER)
+    farthest = advertisements.groupby(STREAM)[delays].max()
+    accumulated = rows[[]].join(received)
+    accumulated = accumulated.fillna(
+        rows[[]].join(farthest, on=STREAM)
+    ).astype('Int64')
+
+    subscription_hops = _hops(observations, SUBSCRIPTION, SUBSCRIBER)
+    flooded = _hops(observations, ADVERTISEMENT, STREAM)
+    on_path = flooded.drop(columns='hop').merge(
+        subscription_hops[SUBSCRIBER + ['switch']], on=STREAM + ['switch']
+    )
+    without_path = rows.index.to_frame(index=False).merge(
+        subscription_hops[SUBSCRIBER].drop_duplicates(), how='left',
+        indicator=True
+    )
+    without_path = without_path[without_path['_merge'] == 'left_only'] \
+        .drop(columns='_merge')
+    advertisement_hops = _numbered(pd.concat([
+        on_path, without_path.merge(flooded.drop(columns='hop'), on=STREAM)
+    ], ignore_index=True), SUBSCRIBER)
+    hops = {
+        ADVERTISEMENT: advertisement_hops,
+        SUBSCRIPTION: subscription_hops,
+    }
+
+    columns = [rows[['advertised']]]
+    for (status, stage) in STAGES.items():
+        if status == SUBSCRIPTION:
+            columns.append(rows[['subscribed']])
+        columns.append(rows[[]].join(
+            _hop_columns(hops[status], SUBSCRIBER, stage)
+        ))
+    columns.append(rows[['acknowledged']])
+    columns.append(accumulated)
+    streams = pd.concat(columns, axis=1)
+
+    rejected = rows[[]].join(
+        _unanswered(subscription_hops, SUBSCRIBER).rename('rejected')
+    )['rejected'].fillna(False).astype(bool)
+    dropped = rows[[]].join(
+        _unanswered(advertisement_hops, SUBSCRIBER).rename('dropped')
+    )['dropped'].fillna(False).astype(bool)
+    streams.insert(0, 'outcome', np.select(
+        [streams.acknowledged.notna(), rejected, streams.subscribed.notna(),
+         dropped],
+        ['acknowledged', 'rejected', 'subscribed', 'dropped'],
+        'advertised'
+    ))
+
+    streams['subscription_delay'] = streams.subscribed - streams.advertised
+    streams['acknowledgement_delay'] = \
+        streams.acknowledged - streams.subscribed
+    streams['setup_delay'] = streams.acknowledged - streams.advertised
+    for (status, stage) in STAGES.items():
+        streams[f'{stage}_controller_delay'] = rows[[]].join(
+            _controller_delay(hops[status], SUBSCRIBER).rename('delay')
+        )['delay']
+
+    streams = streams.reset_index()
+    streams['src_ip'] = _ip(streams.src_ip)
+    streams['listener'] = np.where(
+        streams.listener == 0, '', _ip(streams.listener)
+    )
+    return streams
+
+
+def analyze(capture_files, chunk_packets=DEFAULT_CHUNK_PACKETS,
+            openflow_ports=OPENFLOW_PORTS):
+    """ The reservations of every stream in pcap or pcapng files, see
+    `read_observations` and `correlate`
+    """
+    return correlate(
+        read_observations(capture_files, chunk_packets, openflow_ports)
+    )
+
+
+def main(capture_files=None, output=None, observations_output=None,
+         chunk_packets=None, openflow_ports=None):
+    observations = read_observations(
+        capture_files, chunk_packets, tuple(openflow_ports)
+    )
+    if observations_output is not None:
+        observations.assign(
+            src_ip=_ip(observations.src_ip), dst_ip=_ip(observations.dst_ip)
+        ).to_csv(observations_output, index=False)
+    streams = correlate(observations)
+    streams.to_csv(output, index=False)
+
+    print(f'{len(observations)} reservation packets, '
+          f'{len(streams)} streams and listeners written to {output}')
+    print(streams.outcome.value_counts().to_string())
+    packet_ins = observations.time[observations.kind == PACKET_IN]
+    duration = packet_ins.max() - packet_ins.min()
+    if duration > 0:
+        print(f'{len(packet_ins) / duration:.1f} packet-ins per second')
+    delays = [column for column in streams if column.endswith('_delay') and
+              not column.startswith('acc_')]
+    print(streams[delays].quantile([0.5, 0.99]).T.to_string())
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description="Correlates the advertisements, subscriptions and acknowledgements of every stream in captures of the reservation protocol, including the OpenFlow packet-ins and packet-outs of the controller.")
+
+    parser.add_argument(
+        'capture_files',
+        nargs='+',
+        help="The pcap or pcapng files of Ethernet frames to read, e.g. captured at the talker and on the controller's interface."
+    )
+
+    parser.add_argument(
+        '--output',
+        help="The CSV file to write a row per stream and listener to.",
+        required=True
+    )
+
+    parser.add_argument(
+        '--observations-output',
+        help="An optional CSV file to write every observed reservation packet to.",
+        default=None
+    )
+
+    parser.add_argument(
+        '--chunk-packets',
+        type=int,
+        help="The number of frames decoded at once.",
+        default=DEFAULT_CHUNK_PACKETS
+    )
+
+    parser.add_argument(
+        '--openflow-ports',
+        type=int,
+        nargs='+',
+        help="The TCP ports of the controller.",
+        default=list(OPENFLOW_PORTS)
+    )
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# The factor of the standard error giving a 95% confidence interval,
+# assuming normally distributed means
+CONFIDENCE_Z = 1.96
+
+
+def packet_delays(ids, times):
+    """ Pairs the first and the last capture of every packet ID, e.g. the
+    advertisement and the subscription of a stream in a single capture
+
+    Packets captured only once are dropped.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The `out` and `in` times relative to the first capture, the `id`
+        and the `delay` of every packet, sorted by `in`
+    """
+    ids = np.asarray(ids)
+    times = np.asarray(times, dtype=np.float64)
+    if not len(ids):
+        return pd.DataFrame(columns=['out', 'id', 'in', 'delay'])
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    ends = np.r_[starts[1:], len(ids)]
+    (first, last) = (order[starts], order[ends - 1])
+
+    # The packets in the order they were first captured, as only those
+    # captured again have a delay
+    by_first = np.argsort(first, kind='stable')
+    (first, last) = (first[by_first], last[by_first])
+    lowest = times[first].min()
+    answered = ends[by_first] - starts[by_first] > 1
+    (first, last) = (first[answered], last[answered])
+
+    out_times = times[first]
+    in_times = times[last]
+    by_in = np.argsort(in_times, kind='stable')
+    return pd.DataFrame({
+        'out': (out_times - lowest)[by_in],
+        'id': ids[first][by_in],
+        'in': (in_times - lowest)[by_in],
+        'delay': (in_times - out_times)[by_in],
+    })
+
+
+def trailing_rate(times, interval):
+    """ The rate of events over the trailing `interval` events, for every
+    event after the first `interval` ones
+
+    Parameters
+    ----------
+    times
+        The sorted times of the events in seconds
+
+    Returns
+    -------
+    numpy.ndarray
+        The events per second
+    """
+    times = np.asarray(times, dtype=np.float64)
+    return interval / (times[interval:] - times[:-interval])
+
+
+def align_runs(series):
+    """ Stacks the series of several runs, truncated to the shortest one
+
+    Returns
+    -------
+    numpy.ndarray
+        The values with one row per run
+    """
+    series = [np.asarray(values) for values in series]
+    length = min((len(values) for values in series), default=0)
+    return np.stack([values[:length] for values in series]) if series else \
+        np.empty((0, 0))
+
+
+def mean_of_runs(series):
+    """ The element-wise mean of the series of several runs, see
+    `align_runs`
+    """
+    return align_runs(series).mean(axis=0)
+
+
+def long_form(series, x, y, start=0, **labels):
+    """ A DataFrame of the series of several runs with one row per value
+
+    Parameters
+    ----------
+    series
+        The values of every run
+    x
+        The column of the position of a value in its series
+    y
+        The column of the values
+    start, optional
+        The first position to include
+    labels, optional
+        Columns of the same value for all rows, e.g. the method measured
+
+    Returns
+    -------
+    pandas.DataFrame
+        The columns `x`, `y`, `run` and the labels
+    """
+    frames = [
+        pd.DataFrame({
+            x: np.arange(start, len(values)),
+            y: np.asarray(values)[start:],
+            'run': run,
+        })
+        for (run, values) in enumerate(series)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=[x, y, 'run', *labels])
+    return pd.concat(frames, ignore_index=True).assign(**labels)
+
+
+def aggregate(data, x, y, hue=None, z=CONFIDENCE_Z):
+    """ The mean of `y` over all rows of the same `x`, and its confidence
+    interval, for every group of `hue`
+
+    Returns
+    -------
+    pandas.DataFrame
+        The columns `hue`, `x`, `mean`, `lower`, `upper` and `count`; the
+        interval is empty for a single value
+    """
+    keys = [x] if hue is None else [hue, x]
+    statistics = data.groupby(keys, sort=True)[y].agg(['mean', 'std', 'count'])
+    margin = (z * statistics['std'] / np.sqrt(statistics['count'])).fillna(0)
+    statistics['lower'] = statistics['mean'] - margin
+    statistics['upper'] = statistics['mean'] + margin
+    return statistics.drop(columns='std').reset_index()
+
+
+def plot_aggregate(ax, aggregated, x, hue=None, alpha=0.2, **kwargs):
+    """ Draws the means of `aggregate` as lines with their confidence
+    intervals as bands, one per group of `hue`
+    """
+    groups = aggregated.groupby(hue, sort=False) if hue is not None else \
+        [(kwargs.pop('label', None), aggregated)]
+    for (label, group) in groups:
+        (line,) = ax.plot(group[x], group['mean'], label=label, **kwargs)
+        ax.fill_between(group[x], group['lower'], group['upper'],
+                        color=line.get_color(), alpha=alpha, linewidth=0)
@@ -1,10 +1,16 @@
-import pandas as pd
+import os
+import sys
 from matplotlib import pyplot as plt
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'preprocessing'))
+from figure_registry import figure
+from measurement_cache import load_table
 
 
+@figure('data/load_optimized.csv', 'data/load_naive.csv')
 def graph_cpu_usage():
-    load_opt = pd.read_csv("./data/load_optimized.csv")
-    load_naive = pd.read_csv("./data/load_naive.csv")
+    load_opt = load_table("./data/load_optimized.csv")
+    load_naive = load_table("./data/load_naive.csv")
 
 
     fig, ax = plt.subplots(figsize=(15, 5))
@@ -23,11 +29,12 @@ def graph_cpu_usage():
     ax.grid()
     ax.legend()
 
-    fig.show()
+    return fig
 
 
+@figure('data/load_limited.csv')
 def graph_cpu_usage_limited_rate():
-    load_limited = pd.read_csv("./data/load_limited.csv")
+    load_limited = load_table("./data/load_limited.csv")
 
     fig, ax = plt.subplots(figsize=(15, 5))
     ax.plot(load_limited.cpu)
@@ -42,4 +49,4 @@ def graph_cpu_usage_limited_rate():
 
     ax.grid()
 
-    fig.show()
+    return fig
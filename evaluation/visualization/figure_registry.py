@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import importlib.util
+import os
+import sys
+
+VISUALIZATION_DIR = os.path.dirname(os.path.abspath(__file__))
+# The modules defining figures, relative to this directory
+FIGURE_MODULES = (
+    'cpu_load/graph_cpu_load.py',
+    'processing_delay/graph_processing_delays.py',
+    'stream_delay/graph_stream_delays.py',
+    'subscription_delay/graph_subscription_delay.py',
+)
+
+# The registered figures by name
+REGISTRY = OrderedDict()
+
+
+class Figure:
+    """
+    A function drawing a figure, see `figure`
+
+    Attributes
+    ----------
+    name
+        The name of the figure, the name of the function
+    function
+        The function, returning the `matplotlib.figure.Figure` drawn
+    module_file
+        The absolute path of the module defining the function, relative to
+        whose directory the data is read
+    inputs
+        Glob patterns of the files and directories read by the function,
+        relative to the module's directory
+    """
+    def __init__(self, function, module_file, inputs):
+        self.name = function.__name__
+        self.function = function
+        self.module_file = module_file
+        self.inputs = inputs
+
+    @property
+    def directory(self):
+        return os.path.dirname(self.module_file)
+
+
+def figure(*inputs):
+    """ Registers a function drawing a figure from the data matching the
+    glob patterns `inputs`, which the function must load lazily
+    """
+    def register(function):
+        module_file = os.path.abspath(sys.modules[function.__module__].__file__)
+        known = REGISTRY.get(function.__name__)
+        if known is not None and known.module_file != module_file:
+            raise ValueError(f'Figure {function.__name__} is defined in '
+                             f'{known.module_file} and {module_file}')
+        REGISTRY[function.__name__] = Figure(function, module_file, inputs)
+        return function
+    return register
+
+
+def load_figures():
+    """ Imports all `FIGURE_MODULES`, which does not load any data
+
+    Returns
+    -------
+    OrderedDict
+        The `Figure` of every registered function by name
+    """
+    for module in FIGURE_MODULES:
+        name = os.path.splitext(os.path.basename(module))[0]
+        if name in sys.modules:
+            continue
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(VISUALIZATION_DIR, module)
+        )
+        sys.modules[name] = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(sys.modules[name])
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return REGISTRY
@@ -1,45 +1,76 @@
 from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 import os
+import sys
 import seaborn as sns
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'preprocessing'))
+from figure_registry import figure
+from delay_histogram import DelayHistogram, delay_histograms, quantile_table
 
-def concat_all_data(root_dir):
-    result_df = None
-    for run in os.listdir(root_dir):
-        file_path = os.path.join(root_dir, run, 'delays.csv')
-        if result_df is None:
-            result_df = pd.read_csv(file_path)
-        else:
-            result_df = result_df.append(pd.read_csv(file_path))
-    return result_df[['out', 'in', 'delay', 'transmission_delay','processing_delay', 'bytes_on_wire', 'frame_bytes', 'udp_bytes']]
+def histograms_by_size(root_dir):
+    """ The delay histograms of every run of a scenario by its frame size (bytes on wire) """
+    return {
+        int(run): delay_histograms(os.path.join(root_dir, run))
+        for run in sorted(os.listdir(root_dir), key=lambda run: (len(run), run))
+        if run.isdigit()
+    }
 
-data_10 = concat_all_data('./data/procd_test_10MBit')
-data_100 = concat_all_data('./data/procd_test_100MBit')
+def max_delays(histograms):
+    """ The maximum delays and their components by frame size; the transmission delay is constant per frame size """
+    maxima = pd.DataFrame({
+        'delay': [h['delay'].maximum for h in histograms.values()],
+        'processing_delay': [h['processing_delay'].maximum for h in histograms.values()],
+    }, index=pd.Index(list(histograms), name='bytes_on_wire'))
+    maxima['transmission_delay'] = maxima.delay - maxima.processing_delay
+    return maxima
 
+@lru_cache
+def link_speed_histograms(speed):
+    """ The delay histograms by frame size of the scenario of a link speed in MBit/s, loaded once """
+    return histograms_by_size(f'./data/procd_test_{speed}MBit')
+
+def processing_delay_quantiles():
+    """ Prints and returns the quantiles of the processing delays of all frame sizes per link speed """
+    data_10 = link_speed_histograms(10)
+    data_100 = link_speed_histograms(100)
+    table = quantile_table({
+        f'{speed} Mbps': DelayHistogram.merged(h['processing_delay'] for h in data.values())
+        for (speed, data) in ((10, data_10), (100, data_100))
+    })
+    print(table.to_string())
+    return table
+
+@figure('data/procd_test_10MBit', 'data/procd_test_100MBit')
 def graph_processing_delays():
+    data_10 = link_speed_histograms(10)
+    data_100 = link_speed_histograms(100)
     fig, axs = plt.subplots(1,2,figsize=(15,5))
 
     ax1, ax2 = axs
+    max_10 = max_delays(data_10)
+    max_100 = max_delays(data_100)
 
     ax1.stackplot(
-        data_10.groupby(['bytes_on_wire']).max().index,
-        data_10.groupby(['bytes_on_wire']).max().processing_delay,
-        data_10.groupby(['bytes_on_wire']).max().transmission_delay,
+        max_10.index,
+        max_10.processing_delay,
+        max_10.transmission_delay,
         labels=["Processing-delay component", "Transmission-delay component"]
     )
-    ax1.plot(data_10.groupby(['bytes_on_wire']).max().delay, label="Total delay", color="Black")
+    ax1.plot(max_10.delay, label="Total delay", color="Black")
     ax1.set_ylabel("Delay in milliseconds")
     ax1.set_title("Maximum processing delays\n10MBps link speed")
 
     ax2.stackplot(
-        data_100.groupby(['bytes_on_wire']).max().index,
-        data_100.groupby(['bytes_on_wire']).max().processing_delay,
-        data_100.groupby(['bytes_on_wire']).max().transmission_delay,
+        max_100.index,
+        max_100.processing_delay,
+        max_100.transmission_delay,
         labels=["Processing-delay component", "Transmission-delay component"]
     )
     ax2.set_title("Maximum processing delays\n100MBps link speed")
-    ax2.plot(data_100.groupby(['bytes_on_wire']).max().delay, label="Total delay", color="Black")
+    ax2.plot(max_100.delay, label="Total delay", color="Black")
 
     for ax in axs:
         yticks=np.arange(0,0.1, 0.0005)
@@ -55,29 +86,21 @@ def graph_processing_delays():
         ax.grid()
         ax.legend()
 
-    fig.show()
+    return fig
 
+@figure('data/procd_test_10MBit', 'data/procd_test_100MBit')
 def graph_cum_processing_delay():
+    data_10 = link_speed_histograms(10)
+    data_100 = link_speed_histograms(100)
     fig, axs = plt.subplots(1,1,figsize=(10,5))
 
     ax1 = axs
 
-    ax1.hist(
-        data_10.processing_delay,
-        cumulative=-1,
-        histtype='step',
-        bins=np.linspace(0, 0.00151, 10000),
-        linewidth=2,
-        label="Link-speed 10 Mbps"
-    )
-    ax1.hist(
-        data_100.processing_delay,
-        cumulative=-1,
-        histtype='step',
-        bins=np.linspace(0, 0.0008, 10000),
-        linewidth=2,
-        label="Link-speed 100 Mbps"
-    )
+    for (data, label) in ((data_10, "Link-speed 10 Mbps"), (data_100, "Link-speed 100 Mbps")):
+        histogram = DelayHistogram.merged(h['processing_delay'] for h in data.values())
+        (values, below) = histogram.cdf(normalized=False)
+        # The number of measurements above every value
+        ax1.step(values, histogram.count - below, where='post', linewidth=2, label=label)
 
     xticks=np.arange(0,0.0016, 0.0001)
 
@@ -93,4 +116,4 @@ def graph_cum_processing_delay():
     ax1.legend()
     ax1.set_yticklabels(["", "", "1", "10", "100", "1000", "10000", "100000", "1000000"])
 
-    fig.show()
+    return fig
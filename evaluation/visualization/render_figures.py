@@ -0,0 +1,238 @@
+import argparse as ap
+import ast
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import hashlib
+import json
+import os
+import time
+import traceback
+import matplotlib
+# Figures are only written to files
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+from figure_registry import VISUALIZATION_DIR, load_figures
+
+# The record of the inputs of every figure last rendered, in the output
+# directory
+STAMPS_FILE = '.figures.json'
+# The directories local modules are imported from besides the importing
+# module's own, as added to `sys.path` by the figure modules
+MODULE_DIRS = (
+    VISUALIZATION_DIR,
+    os.path.normpath(os.path.join(VISUALIZATION_DIR, '..', 'preprocessing')),
+)
+
+
+def _hash_file(path):
+    with open(path, 'rb') as source:
+        return hashlib.sha256(source.read()).hexdigest()
+
+
+def local_modules(module_file):
+    """ The files of a module and of every local module it imports,
+    directly or indirectly, found in the importing module's directory or
+    `MODULE_DIRS`
+
+    Returns
+    -------
+    list
+        The sorted absolute paths of the modules
+    """
+    modules = set()
+    pending = [os.path.abspath(module_file)]
+    while pending:
+        path = pending.pop()
+        if path in modules:
+            continue
+        modules.add(path)
+        with open(path) as source:
+            tree = ast.parse(source.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                for directory in (os.path.dirname(path),) + MODULE_DIRS:
+                    candidate = os.path.join(
+                        directory, name.split('.')[0] + '.py'
+                    )
+                    if os.path.isfile(candidate):
+                        pending.append(os.path.abspath(candidate))
+                        break
+    return sorted(modules)
+
+
+def input_stamp(figure):
+    """ Identifies the version of a figure's code and input data by the
+    hashes of its module and the local modules it imports, see
+    `local_modules`, and the size and modification time of every input
+    file
+    """
+    files = []
+    for pattern in figure.inputs:
+        for match in sorted(glob.glob(os.path.join(figure.directory, pattern))):
+            if os.path.isdir(match):
+                for (directory, subdirs, names) in os.walk(match):
+                    subdirs.sort()
+                    files.extend(os.path.join(directory, name)
+                                 for name in sorted(names))
+            else:
+                files.append(match)
+    listing = [
+        (os.path.relpath(path, VISUALIZATION_DIR), _hash_file(path))
+        for path in local_modules(figure.module_file)
+    ]
+    for path in files:
+        status = os.stat(path)
+        listing.append((os.path.relpath(path, figure.directory),
+                        status.st_size, status.st_mtime_ns))
+    return hashlib.sha256(json.dumps(listing).encode()).hexdigest()
+
+
+def render(names, output_dir, file_format, dpi):
+    """ Renders figures of the same module, so that they share its lazily
+    loaded data
+
+    Returns
+    -------
+    list
+        `(name, seconds, error)` of every figure, `error` None on success
+    """
+    registry = load_figures()
+    results = []
+    for name in names:
+        figure = registry[name]
+        start = time.perf_counter()
+        try:
+            # The modules read their data relative to their directory
+            os.chdir(figure.directory)
+            fig = figure.function()
+            fig.savefig(os.path.join(output_dir, f'{name}.{file_format}'),
+                        dpi=dpi, bbox_inches='tight')
+            results.append((name, time.perf_counter() - start, None))
+        except Exception:
+            results.append((name, time.perf_counter() - start,
+                            traceback.format_exc()))
+        finally:
+            plt.close('all')
+    return results
+
+
+def _read_stamps(path):
+    try:
+        with open(path) as stamps:
+            return json.load(stamps)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(figures=None, output_dir=None, file_format=None, dpi=None,
+         jobs=None, incremental=False, list_figures=False):
+    registry = load_figures()
+    if list_figures:
+        for figure in registry.values():
+            print(f'{figure.name}: '
+                  f'{os.path.relpath(figure.module_file)} '
+                  f'({", ".join(figure.inputs)})')
+        return 0
+    unknown = set(figures or ()) - set(registry)
+    if unknown:
+        print(f'Unknown figures: {", ".join(sorted(unknown))}')
+        return 1
+
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    stamps_file = os.path.join(output_dir, STAMPS_FILE)
+    stamps = _read_stamps(stamps_file)
+    current = {}
+    groups = {}
+    for name in figures or registry:
+        figure = registry[name]
+        try:
+            current[name] = input_stamp(figure)
+        except OSError:
+            current[name] = None
+        output = os.path.join(output_dir, f'{name}.{file_format}')
+        if incremental and current[name] is not None and \
+                stamps.get(name) == [current[name], file_format, dpi] and \
+                os.path.isfile(output):
+            print(f'up to date {name}')
+            continue
+        groups.setdefault(figure.module_file, []).append(name)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(render, names, output_dir, file_format, dpi)
+            for names in groups.values()
+        ]
+        for future in as_completed(futures):
+            for (name, seconds, error) in future.result():
+                if error is None:
+                    print(f'rendered {name} in {seconds:.1f}s')
+                    stamps[name] = [current[name], file_format, dpi]
+                else:
+                    failed += 1
+                    print(f'failed {name}:\n{error}')
+                    stamps.pop(name, None)
+
+    with open(stamps_file, 'w') as stamps_output:
+        json.dump(stamps, stamps_output, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description="Renders the evaluation figures to files in parallel.")
+
+    parser.add_argument(
+        'figures',
+        nargs='*',
+        help="The names of the figures to render (default is all figures, see --list)."
+    )
+
+    parser.add_argument(
+        '--output-dir',
+        help="The directory to write the figures to.",
+        default='figures'
+    )
+
+    parser.add_argument(
+        '--format',
+        dest='file_format',
+        help="The file format of the figures, e.g. png, pdf or svg.",
+        default='png'
+    )
+
+    parser.add_argument(
+        '--dpi',
+        type=int,
+        help="The resolution of raster formats.",
+        default=150
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help="The number of processes rendering figures (default is the number of CPUs).",
+        default=None
+    )
+
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Only render figures whose data or code changed since they were last rendered to the output directory."
+    )
+
+    parser.add_argument(
+        '--list',
+        dest='list_figures',
+        action='store_true',
+        help="List the figures and the data they read."
+    )
+
+    kwargs = vars(parser.parse_args())
+    raise SystemExit(main(**kwargs))
@@ -1,33 +1,57 @@
-import pandas as pd
-import numpy as np
 from matplotlib import pyplot as plt
+from functools import lru_cache
 import os
-
-data = {
-    'A': {
-        1: dict(),
-        2: dict()
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'preprocessing'))
+from figure_registry import figure
+from delay_histogram import delay_histograms, quantile_table
+
+@lru_cache
+def scenario_delays():
+    """ The delay histograms of all scenarios, loaded once """
+    data = {
+        'A': {
+            1: dict(),
+            2: dict()
+        }
     }
-}
 
-for i in range(1,7):
-    data['A'][1][i] = pd.read_csv(f'./data/scenario_{i}/1526/delays.csv')
-    data['A'][2][i] = pd.read_csv(f'./data/scenario_{i}/1526/delays.csv')
+    for i in range(1,7):
+        # Both series are measured in the same scenario directories, loaded once
+        data['A'][1][i] = data['A'][2][i] = delay_histograms(f'./data/scenario_{i}/1526')['delay']
+    return data
+
+
+def cum_delay(ax, histogram, label):
+    """ Draws the number of frames with a delay below every value """
+    (values, below) = histogram.cdf(normalized=False)
+    ax.step(values, below, where='post', label=label, linewidth=2)
 
 
+def stream_delay_quantiles():
+    """ Prints and returns the quantiles of the delays of every scenario """
+    data = scenario_delays()
+    table = quantile_table({
+        f'Scenario {i}': data['A'][1][i] for i in sorted(data['A'][1])
+    })
+    print(table.to_string())
+    return table
+
+
+@figure('data/scenario_*/1526')
 def graph_cum_delay_10():
+    data = scenario_delays()
     fig, axs = plt.subplots(ncols=2, figsize=(15,5))
 
     (ax1,ax2) = axs
 
-    bins = np.arange(0,1,0.000001)
-
-    ax1.hist(data['A'][1][2].delay, bins=bins, cumulative=True, histtype='step', label='Without stream reservation', linewidth=2)
-    ax1.hist(data['A'][2][2].delay, bins=bins, cumulative=True, histtype='step', label='With stream reservation', linewidth=2)
+    cum_delay(ax1, data['A'][1][2], 'Without stream reservation')
+    cum_delay(ax1, data['A'][2][2], 'With stream reservation')
     ax1.set(title='Cumulative distribution of end-to-end delays\nScenario 1: Total traffic < 10Mbits')
 
-    ax2.hist(data['A'][1][3].delay, bins=bins, cumulative=True, histtype='step', label='Without stream reservation', linewidth=2)
-    ax2.hist(data['A'][2][3].delay, bins=bins, cumulative=True, histtype='step', label='With stream reservation', linewidth=2)
+    cum_delay(ax2, data['A'][1][3], 'Without stream reservation')
+    cum_delay(ax2, data['A'][2][3], 'With stream reservation')
     ax2.set(title='Cumulative distribution of end-to-end delays\nScenario 2: Total traffic > 10Mbits')
 
     xticks = [0.0001, 0.001, 0.01, 0.1]
@@ -53,22 +77,22 @@ def graph_cum_delay_10():
         )
         ax.grid()
         ax.legend(loc='lower left')
-    fig.show()
+    return fig
 
 
+@figure('data/scenario_*/1526')
 def graph_cum_delay_100():
+    data = scenario_delays()
     fig, axs = plt.subplots(ncols=2, figsize=(15,5))
 
     (ax1,ax2) = axs
 
-    bins = np.arange(0,1,0.000001)
-
-    ax1.hist(data['A'][1][5].delay, bins=bins, cumulative=True, histtype='step', label='Without stream reservation', linewidth=2)
-    ax1.hist(data['A'][2][5].delay, bins=bins, cumulative=True, histtype='step', label='With stream reservation', linewidth=2)
+    cum_delay(ax1, data['A'][1][5], 'Without stream reservation')
+    cum_delay(ax1, data['A'][2][5], 'With stream reservation')
     ax1.set(title='Cumulative distribution of end-to-end delays\nTotal traffic < 100Mbits')
 
-    ax2.hist(data['A'][1][6].delay, bins=bins, cumulative=True, histtype='step', label='Without stream reservation', linewidth=2)
-    ax2.hist(data['A'][2][6].delay, bins=bins, cumulative=True, histtype='step', label='With stream reservation', linewidth=2)
+    cum_delay(ax2, data['A'][1][6], 'Without stream reservation')
+    cum_delay(ax2, data['A'][2][6], 'With stream reservation')
     ax2.set(title='Cumulative distribution of end-to-end delays\nTotal traffic > 100Mbits')
 
     xticks = [0.0001, 0.001, 0.01, 0.1]
@@ -78,21 +102,21 @@ def graph_cum_delay_100():
     yticklabels=[str(t) for t in yticks]
     ylim=(1,100000)
     for ax in axs:
-	ax.set(
-	    xlim=(0.0001,0.1),
-	    xlabel='Total delay x',
-	    ylabel='Number of frames with delay < x',
-	    ylim=ylim,
-	    yscale='log',
-	    xscale='log'
-	)
-	ax.set(
-	    yticks=yticks,
-	    yticklabels=yticklabels,
-	    xticks=[0.0001, 0.001, 0.01, 0.1],
-	    xticklabels=['0.1ms', '1ms', '10ms', '100ms']
-	)
-	ax.legend(loc='lower right')
-	ax.grid()
-
-    fig.show()
+        ax.set(
+            xlim=(0.0001,0.1),
+            xlabel='Total delay x',
+            ylabel='Number of frames with delay < x',
+            ylim=ylim,
+            yscale='log',
+            xscale='log'
+        )
+        ax.set(
+            yticks=yticks,
+            yticklabels=yticklabels,
+            xticks=[0.0001, 0.001, 0.01, 0.1],
+            xticklabels=['0.1ms', '1ms', '10ms', '100ms']
+        )
+        ax.legend(loc='lower right')
+        ax.grid()
+
+    return fig
@@ -2,106 +2,94 @@ import pandas as pd
 import seaborn as sns
 import numpy as np
 from matplotlib import pyplot as plt
-import json
+from functools import lru_cache
+import os
+import sys
 from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'preprocessing'))
+from figure_registry import figure
+from analysis import aggregate, long_form, mean_of_runs, packet_delays, plot_aggregate, trailing_rate
+from measurement_cache import load_timestamps
 
 def convert_to_dataframe(timestamps):
-    lowest = None
-    packets = {}
-    for ts in timestamps:
-        t = ts['time']
-        i = ts['id']
-        if i not in packets:
-            packets[i] = {
-                'out': t,
-                'id': int(i,16)
-            }
-            if lowest is None or t < lowest:
-                lowest = t
-        else:
-            packets[i]['in'] = t
-
-    for value in packets.values():
-        value['delay'] = value['in'] - value['out']
-        value['out'] -= lowest
-        value['in'] -= lowest
-
-    return pd.DataFrame(
-        list(
-            sorted(
-                packets.values(),
-                key=lambda v: v['in']
-            )
-        )
-    )
+    return packet_delays(timestamps['id'], timestamps['time'])
 
 
 def get_floating_avg_rate(time_series, interval):
-    return list(
-        map(
-            lambda d: (1 * interval) / (d[1] - d[0]), 
-            zip(
-                time_series[:-interval], 
-                time_series[interval:]
-            )
-        )
-    )
+    return trailing_rate(time_series, interval)
 
 
 def get_avg_speeds(dfs, interval):
-    speedss = [get_floating_avg_rate(df['in'], interval) for df in dfs]
-    return list(map(lambda speeds: sum(speeds) / len(speeds), zip(*speedss)))
-        
-    
+    return mean_of_runs([get_floating_avg_rate(df['in'], interval) for df in dfs])
+
+
 INTERVAL = 10
 
-raw_data_optimized = [
-    json.load(open(f"./data/converted_json_rdopt{i}.pcap","r")) 
-    for i 
-    in range(10)
-]
-
-raw_data_naive = [
-    json.load(open(f"./data/converted_json_rdnaiv{i}.pcap","r"))
-    for i 
-    in range(10)
-]
-
-raw_data_naive_extended = json.load(
-    open(f"./data/converted_json_rdnaiv10.pcap", "r")
-)
-
-frames_optimized     = [convert_to_dataframe(data) for data in raw_data_optimized]
-frames_naive         = [convert_to_dataframe(data) for data in raw_data_naive]
-frame_naive_extended =  convert_to_dataframe(raw_data_naive_extended)
-
-optimized      = get_avg_speeds(frames_optimized, INTERVAL)
-naive          = get_avg_speeds(frames_naive,     INTERVAL)
-naive_extended = get_floating_avg_rate(frame_naive_extended['in'], INTERVAL)
-
-
-opt_data = pd.DataFrame(
-    [
-        {"Deployed streams": pid, "rate": delay, "Algorithm": "Optimized (Average of 10 runs)"} 
-        for dataframe in frames_optimized 
-        for pid, delay in enumerate(get_floating_avg_rate(dataframe["in"], INTERVAL))
-    ] + 
-    [
-        {"Deployed streams": pid, "rate": delay, "Algorithm": "Naive (Average of 10 runs)"} 
-        for dataframe in frames_naive
-        for pid, delay in enumerate(get_floating_avg_rate(dataframe["in"], INTERVAL))
-    ] +
-    [
-        {"Deployed streams": pid, "rate": delay, "Algorithm": "Naive (Single run)"}
-        for pid, delay in enumerate(naive_extended)
-    ][len(get_floating_avg_rate(frames_naive[0]["in"], INTERVAL)):]
-)
+@lru_cache
+def subscription_frames():
+    """ The subscription delays of the 10 runs of the optimized and of the
+    naive algorithm and of the extended naive run, loaded once
+    """
+    frames_optimized = [
+        convert_to_dataframe(load_timestamps(f"./data/converted_json_rdopt{i}.pcap"))
+        for i
+        in range(10)
+    ]
+    frames_naive = [
+        convert_to_dataframe(load_timestamps(f"./data/converted_json_rdnaiv{i}.pcap"))
+        for i
+        in range(10)
+    ]
+    frame_naive_extended = convert_to_dataframe(
+        load_timestamps(f"./data/converted_json_rdnaiv10.pcap")
+    )
+    return (frames_optimized, frames_naive, frame_naive_extended)
 
 
+def average_rates():
+    """ The average subscription rates of the runs of the optimized and of
+    the naive algorithm
+    """
+    (frames_optimized, frames_naive, _) = subscription_frames()
+    return (
+        get_avg_speeds(frames_optimized, INTERVAL),
+        get_avg_speeds(frames_naive, INTERVAL)
+    )
+
+
+@lru_cache
+def subscription_rates():
+    """ The subscription rates of all runs in long form, and their means
+    with 95% confidence intervals by algorithm
+    """
+    (frames_optimized, frames_naive, frame_naive_extended) = subscription_frames()
+    naive_extended = get_floating_avg_rate(frame_naive_extended['in'], INTERVAL)
+    opt_data = pd.concat([
+        long_form(
+            [get_floating_avg_rate(dataframe["in"], INTERVAL) for dataframe in frames_optimized],
+            "Deployed streams", "rate", Algorithm="Optimized (Average of 10 runs)"
+        ),
+        long_form(
+            [get_floating_avg_rate(dataframe["in"], INTERVAL) for dataframe in frames_naive],
+            "Deployed streams", "rate", Algorithm="Naive (Average of 10 runs)"
+        ),
+        long_form(
+            [naive_extended],
+            "Deployed streams", "rate",
+            start=len(get_floating_avg_rate(frames_naive[0]["in"], INTERVAL)),
+            Algorithm="Naive (Single run)"
+        ),
+    ], ignore_index=True).drop(columns="run")
+    return (opt_data, aggregate(opt_data, "Deployed streams", "rate", hue="Algorithm"))
+
+
+@figure('data/converted_json_rd*.pcap')
 def graph_subs_per_second():
+    (_, opt_rates) = subscription_rates()
     fig, ax_mod = plt.subplots(figsize=(15, 5))
     with sns.axes_style("whitegrid"):
-        sns.lineplot(data=opt_data, x="Deployed streams", y="rate", ax=ax_mod, hue="Algorithm")
+        plot_aggregate(ax_mod, opt_rates, "Deployed streams", hue="Algorithm")
 
     ax_mod.set(
         ylim=(-5,100),
@@ -113,31 +101,35 @@ def graph_subs_per_second():
     )
     ax_mod.grid()
     ax_mod.legend()
-    fig.show()
+    return fig
 
 
-def graph_sub_delay_comparison():
+@figure('data/converted_json_rd*.pcap')
+def graph_sub_delay_comparison(df_limited=None):
+    """ Compares the reservation delays of the algorithms, optionally with
+    those of a rate limited run of the optimized algorithm, e.g.
+    `convert_to_dataframe(load_timestamps(...))` of its capture
+    """
+    (frames_optimized, frames_naive, _) = subscription_frames()
     fig, axs = plt.subplots(1, 2, figsize=(15,5))
     (ax1, ax2) = axs
 
-    start = frames_optimized[0]
-    start["Method"] = "Optimized algorithm (avg. of 10 runs)"
-
-    for frame in frames_optimized[1:]:
-        frame["Method"] = "Optimized algorithm (avg. of 10 runs)"
-        start = start.append(frame)
-        
-    for frame in frames_naive:
-        frame["Method"] = "Naive algorithm (avg. of 10 runs)"
-        start = start.append(frame)
-        
-    df_limited["Method"] = "Optimized algorithm\n(rate limited, single run)"
-    start = start.append(df_limited)
-
-    sns.lineplot(data=start, x="id", y="delay", ax=ax1, hue="Method")
-    sns.lineplot(data=frames_optimized[0], x="in", y="id", ax=ax2, label="Optimized algorithm")
-    sns.lineplot(data=frames_naive[0], x="in", y="id", ax=ax2, label="Naive algorithm")
-    sns.lineplot(data=df_limited, x="in", y="id", ax=ax2, label="Optimized algorithm\n(rate limited)")
+    methods = [
+        frame.assign(Method="Optimized algorithm (avg. of 10 runs)")
+        for frame in frames_optimized
+    ] + [
+        frame.assign(Method="Naive algorithm (avg. of 10 runs)")
+        for frame in frames_naive
+    ]
+    if df_limited is not None:
+        methods.append(df_limited.assign(Method="Optimized algorithm\n(rate limited, single run)"))
+    delays = aggregate(pd.concat(methods, ignore_index=True), "id", "delay", hue="Method")
+
+    plot_aggregate(ax1, delays, "id", hue="Method")
+    ax2.plot(frames_optimized[0]["in"], frames_optimized[0]["id"], label="Optimized algorithm")
+    ax2.plot(frames_naive[0]["in"], frames_naive[0]["id"], label="Naive algorithm")
+    if df_limited is not None:
+        ax2.plot(df_limited["in"], df_limited["id"], label="Optimized algorithm\n(rate limited)")
 
     ax1.set(
         ylim=(-0.5,15),
@@ -164,3 +156,5 @@ def graph_sub_delay_comparison():
 
     for ax in axs:
         ax.grid()
+
+    return fig
@@ -1,6 +1,12 @@
+import atexit
+from collections import ChainMap, OrderedDict
+import os
 from telnetlib import Telnet
+from types import MappingProxyType
 
+from ryu.app.wsgi import WSGIApplication
 from ryu.base import app_manager
+from ryu.lib import hub
 from ryu.lib.packet import packet
 from ryu.controller import ofp_event
 from ryu.controller.controller import Datapath
@@ -13,8 +19,14 @@ from ryu.ofproto.ofproto_v1_0_parser import OFPPacketIn, OFPPacketOut, \
     OFPActionOutput, OFPMatch, OFPFlowMod
 from scapy.compat import raw
 
-from reservation_interfaces.util import Reservation, ReservationPacket, \
-    round_up
+from reservation_interfaces.latency_model import OPTIMIZED, LatencyModel, \
+    best_possible_burst_rate
+from reservation_interfaces.packet_in_recording import PacketInRecorder
+from reservation_interfaces.timer_wheel import TimerWheel
+from reservation_query_api import ReservationQueryController
+from reservation_interfaces.util import Reservation, ReservationPacket
+from reservation_interfaces.wire import ADVERTISEMENT, SUBSCRIPTION, \
+    is_bundle, pack_bundle, replace_udp_payload, unpack_reservations
 
 # The network mask applied to the QoS Flow List entries
 # Must be 0.0.0.0 to match exact addresses
@@ -42,6 +54,45 @@ SUBSCRIPTION_WC_DELAYS = {}
 
 # Link Speed in Bit/s
 LINK_SPEED = 100000000
+# Link Speeds in Bit/s of ports that differ from `LINK_SPEED`
+PORT_LINK_SPEEDS = {}
+
+# The strategy for testing the deployability of new streams, either
+# recalculating all worst-case delays ('naive') or updating them ('optimized')
+WORST_CASE_STRATEGY = OPTIMIZED
+
+LATENCY_MODEL = LatencyModel(
+    CLASS_DELAY_MAP, LINK_SPEED, PORT_LINK_SPEEDS, WORST_CASE_STRATEGY
+)
+
+# The interval in seconds in which talkers and listeners are expected to
+# refresh their advertisements and subscriptions by resending them
+REFRESH_INTERVAL = 10
+# The number of consecutive refreshes that may be missed before an
+# advertisement or subscription is considered stale and expires
+REFRESH_MISSES = 3
+# The resolution in seconds at which stale state is expired
+EXPIRY_TICK = 1
+
+# The maximum number of advertisements without any subscription that are kept.
+# If exceeded, the least recently refreshed one is dropped
+MAX_UNSUBSCRIBED_ADVERTISEMENTS = 4096
+# The maximum number of deployed subscriptions, further ones are rejected
+MAX_SUBSCRIPTIONS = 4096
+
+# Advertisements without subscriptions in order of their last refresh
+UNSUBSCRIBED_ADVERTISEMENTS = OrderedDict()
+
+# Refresh deadlines of all advertisements and subscriptions
+STATE_TIMERS = TimerWheel(tick=EXPIRY_TICK)
+
+# The interval in seconds in which changes of the reservation state are
+# published as a new snapshot for the query API
+SNAPSHOT_INTERVAL = 0.1
+
+# A pcapng file to which the frames of all packet-ins are recorded, to be
+# replayed with replay_packet_ins.py. None disables the recording
+PACKET_IN_RECORDING = os.environ.get('PACKET_IN_RECORDING')
 
 
 class SwitchInterface:
@@ -49,9 +100,10 @@ class SwitchInterface:
     READS_PER_COMMAND = 3
 
     def __init__(self):
-        self.tn = Telnet(SWITCH_IP_ADDRESS)
+        self.tn = None
         self.connected = False
         self.sequence_no = 1
+        self.flow_entries = {}
 
     def connect(self):
         """ Sets up the switch so that all ports belonging to VLAN 1 have the
@@ -59,6 +111,9 @@ class SwitchInterface:
         non real-time traffic
         """
         if not self.connected:
+            # Only connected once a switch connects to the controller, so
+            # that the module can be imported without a switch
+            self.tn = Telnet(SWITCH_IP_ADDRESS)
             self.tn.read_until(b'login: ')
             self._write_command(SWITCH_USERNAME)
             self._write_command('enable')
@@ -93,8 +148,25 @@ class SwitchInterface:
             f'action cos {subscription.priority} ' \
             f'max-rate {burst_rate} max-rate-burst 32'
         self._write_command(command)
+        self.flow_entries[(subscription, subscription.dst_ip)] = \
+            self.sequence_no
         self.sequence_no += 1
 
+    def remove_tsn_stream(self, subscription: Reservation, dst_ip):
+        """ Removes the QoS Flow List entry of a given subscription
+
+        Parameters
+        ----------
+        subscription: Reservation
+            The subscription whose entry should be removed
+        dst_ip
+            The IP address of the subscribed listener
+        """
+        sequence_no = self.flow_entries.pop((subscription, dst_ip), None)
+        if sequence_no is None:
+            return
+        self._write_command(f'no {sequence_no}')
+
     def add_default_filter(self):
         """ Add a flow that matches all traffic not matched by any real-time
         flows and sets their traffic class to 0
@@ -127,6 +199,176 @@ class SwitchInterface:
 switch_interface = SwitchInterface()
 
 
+class ReservationSnapshot:
+    """ An immutable view of the reservation state at the time of its
+    publication. Snapshots are read outside of the admission path and must
+    never be modified.
+
+    Attributes
+    ----------
+    version : int
+        The number of snapshots published before this one
+    advertised_streams
+        The advertisements by stream, without their subscriptions
+    subscribed_streams
+        The deployed `(stream, dst_ip)` pairs by output port
+    wc_delays
+        The worst-case delays of the deployed streams by output port
+    used_bandwidth
+        The bandwidth in Bit/s reserved on each output port
+    """
+    __slots__ = ('version', 'advertised_streams', 'subscribed_streams',
+                 'wc_delays', 'used_bandwidth')
+
+    def __init__(self, version, advertised_streams, subscribed_streams,
+                 wc_delays, used_bandwidth):
+        self.version = version
+        self.advertised_streams = MappingProxyType(advertised_streams)
+        self.subscribed_streams = MappingProxyType(subscribed_streams)
+        self.wc_delays = MappingProxyType(wc_delays)
+        self.used_bandwidth = MappingProxyType(used_bandwidth)
+
+    def streams(self):
+        """ Lists every deployed stream with its worst-case delay
+
+        Returns
+        -------
+        list
+            `(port, stream, dst_ip, worst_case_delay, class_delay)` tuples
+        """
+        return [
+            (port, stream, dst_ip, self.wc_delays[port][(stream, dst_ip)],
+             CLASS_DELAY_MAP[stream.priority])
+            for (port, streams) in self.subscribed_streams.items()
+            for (stream, dst_ip) in streams
+        ]
+
+    def headroom(self, port):
+        """ Returns the bandwidth in Bit/s still available on a port """
+        return LATENCY_MODEL.link_speed_of(port) - \
+            self.used_bandwidth.get(port, 0)
+
+    def check_admission(self, candidate: Reservation, port):
+        """ Tests whether a subscription with the given parameters would be
+        admitted on a port, without modifying any state
+
+        Parameters
+        ----------
+        candidate: Reservation
+            The hypothetical subscription, carrying the accumulated delays of
+            its advertisement as received by the listener
+        port
+            The output port the subscription would be deployed on
+
+        Returns
+        -------
+        str
+            The reason for rejecting the subscription or `None`
+        """
+        if candidate.priority not in CLASS_DELAY_MAP:
+            return f'No delay guarantee for priority {candidate.priority}'
+
+        advertised_streams = ChainMap(
+            {candidate: {'advertisement': candidate}}, self.advertised_streams
+        )
+        return check_admission(
+            candidate, port,
+            advertised_streams=advertised_streams,
+            subscribed_streams=self.subscribed_streams,
+            wc_delays=self.wc_delays.get(port, {})
+        )
+
+    def max_admissible_streams(self, template: Reservation, port):
+        """ Calculates how many streams like `template` could additionally be
+        admitted on a port, see `max_admissible_streams`
+        """
+        if template.priority not in CLASS_DELAY_MAP:
+            raise ValueError(
+                f'No delay guarantee for priority {template.priority}'
+            )
+
+        advertised_streams = ChainMap(
+            {template: {'advertisement': template}}, self.advertised_streams
+        )
+        return max_admissible_streams(
+            template, port,
+            advertised_streams=advertised_streams,
+            subscribed_streams=self.subscribed_streams,
+            wc_delays=self.wc_delays.get(port, {})
+        )
+
+
+class SnapshotPublisher:
+    """ Publishes copy-on-write snapshots of the reservation state. Only the
+    ports and advertisements changed since the last publication are copied,
+    everything else is shared with the previous snapshot.
+    """
+    def __init__(self):
+        self.snapshot = ReservationSnapshot(0, {}, {}, {}, {})
+        self._advertised_streams = {}
+        self._subscribed_streams = {}
+        self._wc_delays = {}
+        self._used_bandwidth = {}
+        self._dirty_advertisements = set()
+        self._dirty_ports = set()
+
+    def mark_advertisement(self, advertisement: Reservation):
+        """ Marks an advertisement as changed since the last snapshot """
+        self._dirty_advertisements.add(advertisement)
+
+    def mark_port(self, port):
+        """ Marks the streams deployed on a port as changed since the last
+        snapshot
+        """
+        self._dirty_ports.add(port)
+
+    def publish(self):
+        """ Publishes a new snapshot if the reservation state has changed
+
+        Returns
+        -------
+        ReservationSnapshot
+            The most recent snapshot
+        """
+        if not self._dirty_advertisements and not self._dirty_ports:
+            return self.snapshot
+
+        for advertisement in self._dirty_advertisements:
+            advert = ADVERTISED_STREAMS.get(advertisement)
+            if advert is None:
+                self._advertised_streams.pop(advertisement, None)
+                continue
+            self._advertised_streams[advertisement] = MappingProxyType({
+                'advertisement': advert['advertisement'],
+                'advertisement_update': advert['advertisement_update'],
+                'in_port': advert['in_port']
+            })
+
+        for port in self._dirty_ports:
+            streams = frozenset(SUBSCRIBED_STREAMS.get(port, ()))
+            self._subscribed_streams[port] = streams
+            self._wc_delays[port] = MappingProxyType({
+                key: SUBSCRIPTION_WC_DELAYS[key] for key in streams
+            })
+            self._used_bandwidth[port] = sum(
+                stream.burst_rate for (stream, _) in streams
+            )
+
+        self._dirty_advertisements = set()
+        self._dirty_ports = set()
+        self.snapshot = ReservationSnapshot(
+            self.snapshot.version + 1,
+            dict(self._advertised_streams),
+            dict(self._subscribed_streams),
+            dict(self._wc_delays),
+            dict(self._used_bandwidth)
+        )
+        return self.snapshot
+
+
+snapshot_publisher = SnapshotPublisher()
+
+
 def in_bandwidth_check(new_stream, port):
     used_bandwidth = new_stream.burst_rate
     for streams in SUBSCRIBED_STREAMS.values():
@@ -134,77 +376,67 @@ def in_bandwidth_check(new_stream, port):
             advert = ADVERTISED_STREAMS[stream]
             if advert['in_port'] == port:
                 used_bandwidth += advert['advertisement'].burst_rate
-                if used_bandwidth > LINK_SPEED:
+                if used_bandwidth > LATENCY_MODEL.link_speed_of(port):
                     return False
     return True
 
 
-def out_bandwidth_check(new_stream, port):
-    if port not in SUBSCRIBED_STREAMS:
+def out_bandwidth_check(new_stream, port, subscribed_streams=None):
+    if subscribed_streams is None:
+        subscribed_streams = SUBSCRIBED_STREAMS
+    if port not in subscribed_streams:
         return True
 
+    link_speed = LATENCY_MODEL.link_speed_of(port)
     used_bandwidth = new_stream.burst_rate
-    for (stream, _) in SUBSCRIBED_STREAMS[port]:
+    for (stream, _) in subscribed_streams[port]:
         used_bandwidth += stream.burst_rate
-        if used_bandwidth > LINK_SPEED:
+        if used_bandwidth > link_speed:
             return False
     return True
 
 
 def get_best_possible_burst_rate(burst_rate: int):
-    """ Matches a given burst rate to the closest value technically possible.
-    This is necessary because the used NEC PF5420 switch can only limit
-    bandwidths from 64kBps up to 960kBps in 64kBps steps or from 1MBps on
-    in 0.1MBps steps
+    """ Matches a given burst rate to the closest value the switch can limit
+    a flow to, see `latency_model.best_possible_burst_rate`
+    """
+    return best_possible_burst_rate(burst_rate)
+
+
+def deployed_advertisements(port, advertised_streams=None,
+                            subscribed_streams=None, exclude=None):
+    """ Pairs every stream deployed on a port with its advertisement
 
     Parameters
     ----------
-    burst_rate: int
-        The raw burst rate e.g. as provided by a stream advertisement
+    port
+        The port whose streams to list
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    subscribed_streams: optional
+        The deployed streams to use instead of `SUBSCRIBED_STREAMS`
+    exclude: optional
+        A `(stream, dst_ip)` pair to leave out
 
     Returns
     -------
-    possible_burst_rate: int
-        The closest burst rate equal or higher than the given one, wich is
-        technically possible
-     """
-    if burst_rate <= 960000:
-        factor = round_up(burst_rate / 64000)
-        return int(factor * 64000)
-    elif burst_rate <= 1000000:
-        return int(1000000)
-    else:
-        factor = round_up(burst_rate / 100000)
-        return int(factor * 100000)
-
-
-def calc_y(stream_x, stream_i):
-    advert_i = ADVERTISED_STREAMS[stream_x]['advertisement']
-    advert_x = ADVERTISED_STREAMS[stream_i]['advertisement']
-
-    acc_max_d_x = advert_x.acc_max_delay + CLASS_DELAY_MAP[stream_x.priority]
-    acc_min_d_x = advert_i.acc_min_delay
-
-    delta_p_i = CLASS_DELAY_MAP[stream_i.priority]
-
-    tau_x = stream_x.burst_interval
-
-    return round_up((acc_max_d_x - acc_min_d_x + delta_p_i) / tau_x)
-
-
-def calc_z(stream_x):
-    advert_x = ADVERTISED_STREAMS[stream_x]['advertisement']
-
-    acc_max_d_x = advert_x.acc_max_delay + CLASS_DELAY_MAP[stream_x.priority]
-    acc_min_d_x = advert_x.acc_min_delay
-
-    tau_x = advert_x.burst_interval
+    list
+        `((stream, dst_ip), advertisement)` pairs as used by the latency model
+    """
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    if subscribed_streams is None:
+        subscribed_streams = SUBSCRIBED_STREAMS
+    return [
+        (key, advertised_streams[key[0]]['advertisement'])
+        for key in subscribed_streams.get(port, ())
+        if key != exclude
+    ]
 
-    return round_up((acc_max_d_x - acc_min_d_x) / tau_x)
-    
 
 def calculate_as_higher_prio_delay(stream_x: Reservation,
-                                   stream_i: Reservation):
+                                   stream_i: Reservation,
+                                   advertised_streams=None, port=None):
     """ Calculate the worst-case delay a stream x may cause for an observed
     stream i of a lower-priority traffic class
 
@@ -214,17 +446,27 @@ def calculate_as_higher_prio_delay(stream_x: Reservation,
         The higher-priority stream
     stream_i: Reservation
         The observed lower-priority stream
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    port: optional
+        The port both streams are deployed on
 
     Returns
     -------
     int
         The maximum delay caused by all of the streams
     """
-    y = calc_y(stream_x, stream_i)
-    return round_up((y * stream_x.burst_size * 8) / (LINK_SPEED / 1000000))
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    return LATENCY_MODEL.higher_prio_delay(
+        advertised_streams[stream_x]['advertisement'],
+        advertised_streams[stream_i]['advertisement'],
+        port
+    )
 
 
-def calculate_as_equal_prio_delay(stream_x: Reservation):
+def calculate_as_equal_prio_delay(stream_x: Reservation,
+                                  advertised_streams=None, port=None):
     """ Calculate the worst-case delay a stream x may cause for any other
     other stream of the same priority
 
@@ -232,17 +474,25 @@ def calculate_as_equal_prio_delay(stream_x: Reservation):
     ----------
     stream_x: Reservation
         The higher-priority stream
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    port: optional
+        The port the streams are deployed on
 
     Returns
     -------
     int
         The maximum delay caused by all of the streams
     """
-    z = calc_z(stream_x)
-    return round_up((z * stream_x.burst_size * 8) / (LINK_SPEED / 1000000))
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    return LATENCY_MODEL.equal_prio_delay(
+        advertised_streams[stream_x]['advertisement'], port
+    )
 
 
-def get_worst_case_delay(stream_i: Reservation, port):
+def get_worst_case_delay(stream_i: Reservation, port,
+                         advertised_streams=None, subscribed_streams=None):
     """ Calucalate the worst-case delay for an observed stream i caused by all
     streams deployed on the same output-port
 
@@ -252,6 +502,10 @@ def get_worst_case_delay(stream_i: Reservation, port):
         The observed stream
     port:
         The port on which the stream may be deployed
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    subscribed_streams: optional
+        The deployed streams to use instead of `SUBSCRIBED_STREAMS`
 
     Returns:
     --------
@@ -259,23 +513,17 @@ def get_worst_case_delay(stream_i: Reservation, port):
         The worst case delay a burst of the stream could experience passing
         through the switch
     """
-    worst_case_delay = 0
-
-    # Calculate the delay caused by every stream on port (including i as well)
-    for (stream_x, _) in SUBSCRIBED_STREAMS[port].union({(stream_i, None)}):
-        if stream_x.priority > stream_i.priority:
-            # Add as higher-priority delay
-            worst_case_delay += calculate_as_higher_prio_delay(
-                stream_x, stream_i
-            )
-        elif stream_x.priority == stream_i.priority:
-            # Add as equal-priority delay
-            worst_case_delay += calculate_as_equal_prio_delay(stream_x)
-        else:
-            continue
-    # Add the maximum delay caused by any lower-priority stream
-    worst_case_delay += round_up((1530 * 8) / (LINK_SPEED / 1000000))
-    return worst_case_delay
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    deployed = deployed_advertisements(
+        port, advertised_streams, subscribed_streams,
+        exclude=(stream_i, stream_i.dst_ip)
+    )
+    return LATENCY_MODEL.worst_case_delay(
+        advertised_streams[stream_i]['advertisement'],
+        [advert_x for (_, advert_x) in deployed],
+        port
+    )
 
 
 def update_worst_case_delays(stream_x: Reservation, port):
@@ -289,33 +537,39 @@ def update_worst_case_delays(stream_x: Reservation, port):
     port
         The port on which the stream wold be deployed
     """
-    # If no other streams are deployed on the port return True
-    if port not in SUBSCRIBED_STREAMS:
-        return True
-    
-    # Precalculate the delay caused by x for any equal-priority streams
-    equal_prio_delay = calculate_as_equal_prio_delay(stream_x)
-
-    # Iterate through all traffic classes of streams deployed on the port
-    for (stream_i, dst_ip) in SUBSCRIBED_STREAMS[port]:
-        # Test for each stream of the traffic class if it exceeds the
-        # link-local latency-guarantee
-        if stream_i.priority == stream_x.priority:
-            # Add the equal priority delay to the current worst-case delay of i
-            SUBSCRIPTION_WC_DELAYS[(stream_i, dst_ip)] += equal_prio_delay
-
-        elif stream_i.priority <= stream_x.priority:
-            # Calculate the delay caused by x for the lower-priority stream i
-            higher_prio_delay = calculate_as_higher_prio_delay(
-                stream_x, stream_i)
-            # Add the equal priority delay to the current worst-case delay of i
-            SUBSCRIPTION_WC_DELAYS[(stream_i, dst_ip)] += higher_prio_delay
-
-
-def test_deployability(stream_x: Reservation, port):
+    advert_x = ADVERTISED_STREAMS[stream_x]['advertisement']
+    for (key, advert_i) in deployed_advertisements(port):
+        if advert_i.priority <= advert_x.priority:
+            SUBSCRIPTION_WC_DELAYS[key] += LATENCY_MODEL.interference(
+                advert_x, advert_i, port
+            )
+
+
+def rollback_worst_case_delays(stream_x: Reservation, port):
+    """ Removes from all streams deployed on the given port the respective
+    delay caused by the removed stream x. This is the inverse of
+    `update_worst_case_delays`.
+
+    Parameters
+    ----------
+    stream_x: Reservation
+        The stream that has been removed from the port
+    port
+        The port from which the stream has been removed
+    """
+    advert_x = ADVERTISED_STREAMS[stream_x]['advertisement']
+    for (key, advert_i) in deployed_advertisements(port):
+        if advert_i.priority <= advert_x.priority:
+            SUBSCRIPTION_WC_DELAYS[key] -= LATENCY_MODEL.interference(
+                advert_x, advert_i, port
+            )
+
+
+def test_deployability(stream_x: Reservation, port, advertised_streams=None,
+                       subscribed_streams=None, wc_delays=None):
     """ Test for a stream x whether it can be deployed on a given port without
     causing any previously deployed streams to exceed their local delay
-    guarantees
+    guarantees, using the strategy configured in `WORST_CASE_STRATEGY`
 
     Parameters
     ----------
@@ -323,41 +577,166 @@ def test_deployability(stream_x: Reservation, port):
         The stream to test
     port
         The port on which the stream wold be deployed
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    subscribed_streams: optional
+        The deployed streams to use instead of `SUBSCRIBED_STREAMS`
+    wc_delays: optional
+        The worst-case delays to use instead of `SUBSCRIPTION_WC_DELAYS`
 
     Returns
     -------
     boolean
         Whether the new stream can be deployed safely or not
     """
-    # If no other streams are deployed on the port return True
-    if port not in SUBSCRIBED_STREAMS:
-        return True
-    
-    # Precalculate the delay caused by x for any equal-priority streams
-    equal_prio_delay = calculate_as_equal_prio_delay(stream_x)
-    # Iterate through all streams deployed on the port
-    for (stream_i, dst_ip) in SUBSCRIBED_STREAMS[port]:
-        # Test for each stream i if it exceeds the link-local latency-guarantee
-        if stream_i.priority == stream_x.priority:
-            # Add the equal priority delay to the current worst-case delay of i
-            new_wc_delay = SUBSCRIPTION_WC_DELAYS[(stream_i, dst_ip)] + \
-                equal_prio_delay
-            # Test whether it is still lower than the local delay gurantee 
-            if new_wc_delay > CLASS_DELAY_MAP[stream_i.priority]:
-                return False
-
-        elif stream_i.priority <= stream_x.priority:
-            # Calculate the delay caused by x for the lower-priority stream i
-            higher_prio_delay = calculate_as_higher_prio_delay(
-                stream_x, stream_i)
-            # Add the equal priority delay to the current worst-case delay of i
-            new_wc_delay = SUBSCRIPTION_WC_DELAYS[(stream_i, dst_ip)] + \
-                higher_prio_delay
-            # Test whether it is still lower than the local delay gurantee 
-            if new_wc_delay > CLASS_DELAY_MAP[stream_i.priority]:
-                return False
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    if wc_delays is None:
+        wc_delays = SUBSCRIPTION_WC_DELAYS
+
+    return LATENCY_MODEL.is_deployable(
+        advertised_streams[stream_x]['advertisement'],
+        deployed_advertisements(port, advertised_streams, subscribed_streams),
+        wc_delays,
+        port
+    )
 
-    return True
+
+def check_admission(subscription: Reservation, port, advertised_streams=None,
+                    subscribed_streams=None, wc_delays=None):
+    """ Runs the admission tests for a subscription on its output port
+
+    Parameters
+    ----------
+    subscription: Reservation
+        The subscription to test
+    port
+        The port on which the stream would be deployed
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`
+    subscribed_streams: optional
+        The deployed streams to use instead of `SUBSCRIBED_STREAMS`
+    wc_delays: optional
+        The worst-case delays to use instead of `SUBSCRIPTION_WC_DELAYS`
+
+    Returns
+    -------
+    str
+        The reason for rejecting the subscription or `None` if it can be
+        deployed
+    """
+    # Test if deployment exceeds output-port bandwidth
+    if not out_bandwidth_check(subscription, port, subscribed_streams):
+        return 'Stream subscription would exceed out-port bandwidth'
+
+    # Test if deployment would violate any stream's delay guarantee
+    deployable = test_deployability(
+        subscription, port, advertised_streams, subscribed_streams, wc_delays
+    )
+    if not deployable:
+        return 'Stream subscription would cause breaking a delay-guarantee'
+
+    return None
+
+
+def max_admissible_streams(template: Reservation, port,
+                           advertised_streams=None, subscribed_streams=None,
+                           wc_delays=None):
+    """ Calculate the maximum number of additional streams with the parameters
+    of `template` that would be admitted on a given port one after another.
+
+    The delay each additional stream adds to every deployed stream is
+    calculated only once. The limit is then found by a galloping binary search
+    over the count, which is possible since every constraint is monotonic in
+    the number of added streams.
+
+    Parameters
+    ----------
+    template: Reservation
+        The subscription every additional stream is a copy of, carrying the
+        accumulated delays of its advertisement as received by the listener
+    port
+        The output port the streams would be deployed on
+    advertised_streams: optional
+        The advertisements to use instead of `ADVERTISED_STREAMS`, must
+        include the template
+    subscribed_streams: optional
+        The deployed streams to use instead of `SUBSCRIBED_STREAMS`
+    wc_delays: optional
+        The worst-case delays to use instead of `SUBSCRIPTION_WC_DELAYS`
+
+    Returns
+    -------
+    (count, binding_constraint)
+        The number of admissible streams and the constraint that prevents
+        admitting one more. The constraint is either `'bandwidth'`,
+        `'subscriptions'` or the priority of the traffic class whose delay
+        bound would be exceeded.
+    """
+    if advertised_streams is None:
+        advertised_streams = ADVERTISED_STREAMS
+    if subscribed_streams is None:
+        subscribed_streams = SUBSCRIBED_STREAMS
+    if wc_delays is None:
+        wc_delays = SUBSCRIPTION_WC_DELAYS
+    if port not in subscribed_streams:
+        subscribed_streams = ChainMap({port: set()}, subscribed_streams)
+    deployed = subscribed_streams[port]
+
+    used_bandwidth = sum(stream.burst_rate for (stream, _) in deployed)
+    free_subscriptions = MAX_SUBSCRIPTIONS - sum(
+        len(streams) for streams in subscribed_streams.values()
+    )
+
+    # Collect the remaining slack of every deployed stream that would be
+    # delayed by the new streams, only the smallest slack per class and
+    # added delay is relevant
+    advert_x = advertised_streams[template]['advertisement']
+    equal_prio_delay = LATENCY_MODEL.equal_prio_delay(advert_x, port)
+    constraints = {}
+    for (key, advert_i) in deployed_advertisements(
+            port, advertised_streams, subscribed_streams):
+        if advert_i.priority > advert_x.priority:
+            continue
+        added_delay = LATENCY_MODEL.interference(advert_x, advert_i, port)
+        slack = LATENCY_MODEL.class_delay(advert_i.priority) - wc_delays[key]
+        constraint = (advert_i.priority, added_delay)
+        constraints[constraint] = min(constraints.get(constraint, slack), slack)
+
+    constraints = sorted(constraints.items())
+
+    # Each new stream is tested against the previously added ones, which are
+    # delayed by all deployed streams and every other added stream
+    own_slack = LATENCY_MODEL.class_delay(template.priority) - \
+        get_worst_case_delay(
+            template, port, advertised_streams, subscribed_streams
+        ) + equal_prio_delay
+    link_speed = LATENCY_MODEL.link_speed_of(port)
+
+    def violated_constraint(count):
+        if used_bandwidth + count * template.burst_rate > link_speed:
+            return 'bandwidth'
+        if count > free_subscriptions:
+            return 'subscriptions'
+        for ((priority, added_delay), slack) in constraints:
+            if count * added_delay > slack:
+                return priority
+        if count > 1 and count * equal_prio_delay > own_slack:
+            return template.priority
+        return None
+
+    # Find an infeasible count by doubling, then bisect below it
+    (feasible, infeasible) = (0, 1)
+    while violated_constraint(infeasible) is None:
+        (feasible, infeasible) = (infeasible, infeasible * 2)
+    while infeasible - feasible > 1:
+        count = (feasible + infeasible) // 2
+        if violated_constraint(count) is None:
+            feasible = count
+        else:
+            infeasible = count
+
+    return feasible, violated_constraint(feasible + 1)
 
 
 def flood_advertisement(openflow_packet_in: OFPPacketIn,
@@ -426,9 +805,331 @@ def forward_subscription(subscription: Reservation,
     #)
 
 
+def remove_subscription(subscription: Reservation, dst_ip, port):
+    """ Removes a deployed subscription from a port, releasing its bandwidth,
+    rolling back the worst-case delays it caused for the remaining streams on
+    the port and removing its QoS-Filtering rule
+
+    Parameters
+    ----------
+    subscription: Reservation
+        The deployed subscription
+    dst_ip
+        The IP address of the subscribed listener
+    port
+        The output port the subscription is deployed on
+    """
+    STATE_TIMERS.cancel(('subscription', port, subscription, dst_ip))
+    if (subscription, dst_ip) not in SUBSCRIBED_STREAMS.get(port, ()):
+        return
+
+    SUBSCRIBED_STREAMS[port].discard((subscription, dst_ip))
+    SUBSCRIPTION_WC_DELAYS.pop((subscription, dst_ip), None)
+    rollback_worst_case_delays(subscription, port)
+    snapshot_publisher.mark_port(port)
+
+    # Return the advertisement to the unsubscribed ones if this was its last
+    # subscription
+    advert = ADVERTISED_STREAMS.get(subscription)
+    if advert is not None:
+        advert['subscriptions'].discard((port, dst_ip))
+        if not advert['subscriptions']:
+            UNSUBSCRIBED_ADVERTISEMENTS[subscription] = None
+
+    switch_interface.remove_tsn_stream(subscription, dst_ip)
+
+
+def remove_advertisement(advertisement: Reservation):
+    """ Removes an advertisement together with all subscriptions deployed for
+    its stream
+
+    Parameters
+    ----------
+    advertisement: Reservation
+        The advertisement to remove
+    """
+    advert = ADVERTISED_STREAMS.get(advertisement)
+    if advert is None:
+        return
+
+    # Subscriptions need the advertisement for rolling back their delays
+    for (port, dst_ip) in list(advert['subscriptions']):
+        remove_subscription(advert['advertisement'], dst_ip, port)
+
+    ADVERTISED_STREAMS.pop(advertisement)
+    UNSUBSCRIBED_ADVERTISEMENTS.pop(advertisement, None)
+    snapshot_publisher.mark_advertisement(advertisement)
+    STATE_TIMERS.cancel(('advertisement', advertisement))
+
+
+def expire_stale_state(now=None):
+    """ Removes all advertisements and subscriptions that have not been
+    refreshed within `REFRESH_MISSES` refresh intervals
+
+    Parameters
+    ----------
+    now, optional
+        The current time as given by the clock of `STATE_TIMERS`
+    """
+    for key in STATE_TIMERS.advance(now):
+        if key[0] == 'advertisement':
+            remove_advertisement(key[1])
+        else:
+            (_, port, subscription, dst_ip) = key
+            remove_subscription(subscription, dst_ip, port)
+
+
+def refresh_advertisement(advertisement: Reservation):
+    """ Renews the refresh deadline of an advertisement and enforces the
+    bound on unsubscribed advertisements
+
+    Parameters
+    ----------
+    advertisement: Reservation
+        The stored advertisement that has been received again
+    """
+    STATE_TIMERS.schedule(
+        ('advertisement', advertisement), REFRESH_INTERVAL * REFRESH_MISSES
+    )
+    if ADVERTISED_STREAMS[advertisement]['subscriptions']:
+        return
+
+    UNSUBSCRIBED_ADVERTISEMENTS[advertisement] = None
+    UNSUBSCRIBED_ADVERTISEMENTS.move_to_end(advertisement)
+    while len(UNSUBSCRIBED_ADVERTISEMENTS) > MAX_UNSUBSCRIBED_ADVERTISEMENTS:
+        (least_recent, _) = UNSUBSCRIBED_ADVERTISEMENTS.popitem(last=False)
+        remove_advertisement(least_recent)
+
+
+def send_reservations(openflow_packet_in: OFPPacketIn, status,
+                      reservations, out_port, in_port):
+    """ Sends reservations bundled into one frame with the headers of a
+    received reservation frame
+
+    Parameters:
+    -----------
+    openflow_packet_in: OFPPacketIn
+        The received OpenFlow message containing the required data
+    status
+        The status of the reservations
+    reservations
+        The reservations to send, sent as a single reservation if there is
+        only one
+    out_port
+        The port to send the frame on, e.g. `OFPP_FLOOD`
+    in_port
+        The port the frame counts as received on, `OFPP_NONE` for none
+    """
+    datapath = openflow_packet_in.datapath
+    out = OFPPacketOut(
+        datapath=datapath,
+        buffer_id=0xffffffff,
+        in_port=in_port,
+        actions=[OFPActionOutput(out_port, 0)],
+        data=replace_udp_payload(
+            openflow_packet_in.data, pack_bundle(status, reservations)
+        )
+    )
+    datapath.send_msg(out)
+
+
+def admit_advertisement(advertisement: Reservation, in_port):
+    """ Stores a new advertisement or refreshes a known one
+
+    Parameters:
+    -----------
+    advertisement: Reservation
+        The received advertisement
+    in_port
+        The port the advertisement was received on
+
+    Returns:
+    --------
+    Reservation
+        The advertisement with the delays accumulated up to the output ports
+        to flood, None if it is dropped
+    """
+    # Test if an advertisement for the same stream already exists
+    if advertisement in ADVERTISED_STREAMS:
+        old_advert = ADVERTISED_STREAMS[advertisement]['advertisement']
+        # Test if the advertisement's parameters have changed
+        if old_advert.stream_hash() == advertisement.stream_hash():
+            # If not, renew the advertisement and flood the modified
+            # version saved in the dict
+            refresh_advertisement(advertisement)
+            return ADVERTISED_STREAMS[advertisement]['advertisement_update']
+        else:
+            # If they have changed, remove the advertisement and the
+            # subscriptions deployed for its old parameters
+            remove_advertisement(advertisement)
+
+    # Test if enough bandwidth is available on the input port
+    #if not in_bandwidth_check(advertisement, in_port):
+    #    print("Exceeded In-Port Bandwidth limit")
+    #    return None
+
+    # Test whether the latency-requirement is violated
+    new_acc_max_delay = CLASS_DELAY_MAP[advertisement.priority] + \
+        advertisement.acc_max_delay
+    if new_acc_max_delay > advertisement.req_latency:
+        #print(
+        #    "Exceeded end-to-end latency requirement of "
+        #    f"({advertisement.signature()}) {advertisement.req_latency} "
+        #    f"({new_acc_max_delay})"
+        #)
+        return None
+
+    # Copy the advertisement
+    advertisement_copy = advertisement.copy()
+
+    # Update the accumulated minimum and maximum delay
+    (advertisement_copy.acc_min_delay,
+     advertisement_copy.acc_max_delay) = \
+        LATENCY_MODEL.forward_advertisement_delays(
+            advertisement_copy, in_port
+        )
+
+    # Store original and modified advertisement with input port in the dict
+    ADVERTISED_STREAMS[advertisement] = {
+        'advertisement': advertisement,
+        'advertisement_update': advertisement_copy,
+        'in_port': in_port,
+        'subscriptions': set()
+    }
+    refresh_advertisement(advertisement)
+    snapshot_publisher.mark_advertisement(advertisement)
+    return advertisement_copy
+
+
+def admit_subscription(subscription: Reservation, in_port):
+    """ Deploys a subscription on its output port if it passes the admission
+    tests, or renews an already deployed one
+
+    Parameters:
+    -----------
+    subscription: Reservation
+        The received subscription
+    in_port
+        The port the subscription was received on, the output port of its
+        stream
+
+    Returns:
+    --------
+    bool
+        Whether the subscription is forwarded towards its talker
+    """
+    # Subscriptions are only valid for currently advertised streams
+    if subscription not in ADVERTISED_STREAMS:
+        print('Received subscription for a non-advertised stream')
+        return False
+
+    # Create an entry in SUBSCRIBED_STREAMS for the output port of the
+    # subscription if it does not exist yet
+    if in_port not in SUBSCRIBED_STREAMS:
+        SUBSCRIBED_STREAMS[in_port] = set()
+
+    # A resent subscription for an already deployed stream only renews it
+    timer_key = ('subscription', in_port, subscription, subscription.dst_ip)
+    if (subscription, subscription.dst_ip) in SUBSCRIBED_STREAMS[in_port]:
+        STATE_TIMERS.schedule(timer_key, REFRESH_INTERVAL * REFRESH_MISSES)
+        return True
+
+    if len(SUBSCRIPTION_WC_DELAYS) >= MAX_SUBSCRIPTIONS:
+        print('Maximum number of subscriptions reached')
+        return False
+
+    # Test if deployment exceeds input-port bandwidth
+    #if not in_bandwidth_check(
+    #   subscription, ADVERTISED_STREAMS[subscription]['in_port']):
+    #    print('Stream subscription would exceed in-port bandwidth')
+    #    return False
+
+    # Test if deployment exceeds the output-port bandwidth or would
+    # violate any stream's delay guarantee
+    rejection = check_admission(subscription, in_port)
+    if rejection is not None:
+        print(rejection)
+        return False
+
+    # Add the delay caused by the new stream to the deployed ones and
+    # calculate its own worst-case delay before deploying it
+    update_worst_case_delays(subscription, in_port)
+    wc_delay = get_worst_case_delay(subscription, in_port)
+
+    # Add the subcsribed stream to the deployed streams on the output-port
+    SUBSCRIBED_STREAMS[in_port].add((subscription, subscription.dst_ip))
+
+    # Add an entry for the worst-case delay of the deployed subscription
+    SUBSCRIPTION_WC_DELAYS[(subscription, subscription.dst_ip)] = wc_delay
+
+    # Bind the subscription to its advertisement and start its soft state
+    ADVERTISED_STREAMS[subscription]['subscriptions'].add(
+        (in_port, subscription.dst_ip)
+    )
+    UNSUBSCRIBED_ADVERTISEMENTS.pop(subscription, None)
+    STATE_TIMERS.schedule(timer_key, REFRESH_INTERVAL * REFRESH_MISSES)
+    snapshot_publisher.mark_port(in_port)
+
+    # Create the QoS-Filtering rule for the subscribed stream
+    switch_interface.add_tsn_stream(subscription)
+    return True
+
+
+def handle_reservation_bundle(openflow_packet_in: OFPPacketIn, payload):
+    """ Processes a bundle of advertisements or subscriptions as a unit.
+
+    Every reservation is admitted in the order of the bundle as if it had
+    been received on its own. The admitted reservations are bundled again,
+    so that the whole bundle costs a single flood or one forward per talker
+    port instead of one per reservation.
+
+    Parameters:
+    -----------
+    openflow_packet_in: OFPPacketIn
+        The received message from the switch
+    payload
+        The UDP payload of the received frame, the bundle
+    """
+    try:
+        (status, records) = unpack_reservations(payload)
+    except ValueError as error:
+        print(f'Dropped reservation bundle: {error}')
+        return
+    reservations = [Reservation(**fields) for fields in records]
+    in_port = openflow_packet_in.in_port
+
+    if status == ADVERTISEMENT:
+        updates = [
+            update for update in (
+                admit_advertisement(advertisement, in_port)
+                for advertisement in reservations
+            ) if update is not None
+        ]
+        if updates:
+            send_reservations(
+                openflow_packet_in, ADVERTISEMENT, updates, OFPP_FLOOD,
+                in_port
+            )
+
+    elif status == SUBSCRIPTION:
+        # Subscriptions are forwarded over the in-ports of their
+        # advertisements, usually all the same
+        forwards = {}
+        for subscription in reservations:
+            if admit_subscription(subscription, in_port):
+                forwards.setdefault(
+                    ADVERTISED_STREAMS[subscription]['in_port'], []
+                ).append(subscription)
+        for (port, subscriptions) in forwards.items():
+            send_reservations(
+                openflow_packet_in, SUBSCRIPTION, subscriptions, port,
+                OFPP_NONE
+            )
+
+
 def handle_reservation_frame(openflow_packet_in: OFPPacketIn):
     """ Processes a reservation frame as either a stream advertisement or a
-    subscription
+    subscription, or a bundle of them
 
     Parameters:
     -----------
@@ -438,116 +1139,31 @@ def handle_reservation_frame(openflow_packet_in: OFPPacketIn):
     # Extract the captured packet from the OpenFlow message and gather the
     # contained reservation-information
     captured_packet = packet.Packet(openflow_packet_in.data)
-    stream_reservation_packet = ReservationPacket(
-        captured_packet.protocols[-1]
-    )
+    payload = captured_packet.protocols[-1]
+    if is_bundle(payload):
+        handle_reservation_bundle(openflow_packet_in, payload)
+        return
+
+    stream_reservation_packet = ReservationPacket(payload)
     stream_reservation = Reservation(stream_reservation_packet)
     in_port = openflow_packet_in.in_port
 
     # Process the reservation as an advertisement if its status is 0
-    if stream_reservation_packet.status == 0:
-        advertisement = stream_reservation
-
-        # Test if an advertisement for the same stream already exists
-        if advertisement in ADVERTISED_STREAMS:
-            old_advert = ADVERTISED_STREAMS[advertisement]['advertisement']
-            # Test if the advertisement's parameters have changed
-            if old_advert.stream_hash() == advertisement.stream_hash():
-                # If not, flood the modified version saved in the dict
-                copy = ADVERTISED_STREAMS[advertisement]['advertisement_update']
-                flood_advertisement(
-                    openflow_packet_in, captured_packet, copy
-                )
-                return
-            else:
-                # If they have changed, remove the advertisement from the dict
-                ADVERTISED_STREAMS.pop(advertisement)
-
-        # Test if enough bandwidth is available on the input port
-        #if not in_bandwidth_check(advertisement, in_port):
-        #    print("Exceeded In-Port Bandwidth limit")
-        #    return
-
-        # Test whether the latency-requirement is violated
-        new_acc_max_delay = CLASS_DELAY_MAP[advertisement.priority] + \
-            advertisement.acc_max_delay
-        if new_acc_max_delay > advertisement.req_latency:
-            #print(
-            #    "Exceeded end-to-end latency requirement of "
-            #    f"({advertisement.signature()}) {advertisement.req_latency} "
-            #    f"({new_acc_max_delay})"
-            #)
-            return
-
-        # Copy the advertisement
-        advertisement_copy = advertisement.copy()
-
-        # Update the accumulated minimum delay
-        advertisement_copy.acc_min_delay = round_up(
-            advertisement_copy.acc_min_delay +
-            (advertisement_copy.min_frame * 8) / LINK_SPEED
-        )
-
-        # Update the accumulated maximum delay
-        advertisement_copy.acc_max_delay = round_up(
-            advertisement_copy.acc_max_delay +
-            CLASS_DELAY_MAP[advertisement_copy.priority]
+    if stream_reservation_packet.status == ADVERTISEMENT:
+        advertisement_update = admit_advertisement(
+            stream_reservation, in_port
         )
-        
-        # Store original and modified advertisement with input port in the dict
-        ADVERTISED_STREAMS[advertisement] = {
-            'advertisement': advertisement,
-            'advertisement_update': advertisement_copy,
-            'in_port': in_port
-        }
-
         # Flood the advertisement to all ports
-        flood_advertisement(
-            openflow_packet_in, captured_packet, advertisement_copy
-        )
+        if advertisement_update is not None:
+            flood_advertisement(
+                openflow_packet_in, captured_packet, advertisement_update
+            )
 
     # Process the reservation as a subscription if its status is 1
-    elif stream_reservation_packet.status == 1:
-        subscription = stream_reservation
-
-        # Create an entry in SUBSCRIBED_STREAMS for the output port of the
-        # subscription if it does not exist yet
-        if in_port not in SUBSCRIBED_STREAMS:
-            SUBSCRIBED_STREAMS[in_port] = set()
-
-        # Test if deployment exceeds input-port bandwidth
-        #if not in_bandwidth_check(
-        #   subscription, ADVERTISED_STREAMS[subscription]['in_port']):
-        #    print('Stream subscription would exceed in-port bandwidth')
-        #    return
-
-        # Test if deployment exceeds output-port bandwidth
-        if not out_bandwidth_check(subscription, in_port):
-            print('Stream subscription would exceed out-port bandwidth')
-            return
-
-        # Test if deployment would violate any stream's delay guarantee
-        deployable = test_deployability(
-            subscription, in_port
-        )
-        if not deployable:
-            print('Stream subscription would cause breaking a delay-guarantee')
-            return
-
-        # Add the subcsribed stream to the deployed streams on the output-port
-        SUBSCRIBED_STREAMS[in_port].add((subscription, subscription.dst_ip))
-
-        # Add an entry for the worst-case delay of the deployed subscription
-        SUBSCRIPTION_WC_DELAYS[(subscription, subscription.dst_ip)] = \
-            get_worst_case_delay(subscription, in_port)
-
-        # Create the QoS-Filtering rule for the subscribed stream
-        switch_interface.add_tsn_stream(subscription)
-
+    elif stream_reservation_packet.status == SUBSCRIPTION:
         # Forward the subscription to over its advertisement's input-port
-        print(len(SUBSCRIBED_STREAMS[in_port]))
-        forward_subscription(subscription, openflow_packet_in)
-        #print(f'Forwared subscription {subscription.signature()}')
+        if admit_subscription(stream_reservation, in_port):
+            forward_subscription(stream_reservation, openflow_packet_in)
 
 
 def reset_openflow(datapath: Datapath):
@@ -590,8 +1206,35 @@ def reset_openflow(datapath: Datapath):
 class SwitchController(app_manager.RyuApp):
     """ This will be loaded by the RYU
     """
+    _CONTEXTS = {'wsgi': WSGIApplication}
+
     def __init__(self, *args, **kwargs):
         super(SwitchController, self).__init__(*args, **kwargs)
+        kwargs['wsgi'].register(
+            ReservationQueryController, {'snapshots': snapshot_publisher}
+        )
+        self.expiry_thread = hub.spawn(self._expire_stale_state)
+        self.snapshot_thread = hub.spawn(self._publish_snapshots)
+        self.recorder = None
+        if PACKET_IN_RECORDING is not None:
+            self.recorder = PacketInRecorder(PACKET_IN_RECORDING)
+            atexit.register(self.recorder.close)
+
+    def _publish_snapshots(self):
+        """ Periodically publish the reservation state changed by the
+        admissions since the last snapshot
+        """
+        while True:
+            hub.sleep(SNAPSHOT_INTERVAL)
+            snapshot_publisher.publish()
+
+    def _expire_stale_state(self):
+        """ Periodically expire advertisements and subscriptions that have
+        not been refreshed
+        """
+        while True:
+            hub.sleep(EXPIRY_TICK)
+            expire_stale_state()
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
@@ -607,6 +1250,11 @@ class SwitchController(app_manager.RyuApp):
         """ Handle a relayed packet.
         """
         openflow_packet_in = event.msg
+        if self.recorder is not None:
+            self.recorder.record(
+                openflow_packet_in.datapath.id, openflow_packet_in.in_port,
+                openflow_packet_in.data
+            )
         # As the switch is configured to only relay reservation-protocol frames
         # they will be handled accordingly
         handle_reservation_frame(openflow_packet_in)
@@ -0,0 +1,422 @@
+import argparse as ap
+import contextlib
+import csv
+import importlib
+import importlib.util
+import io
+import json
+import math
+import os
+import resource
+import sys
+import time
+import types
+
+# The latency percentiles reported
+PERCENTILES = (50, 90, 99, 99.9)
+# The columns of the decisions file
+DECISION_FIELDS = (
+    'index', 'record', 'time', 'datapath_id', 'in_port', 'status', 'stream',
+    'listener', 'decision', 'acc_min_delay', 'acc_max_delay', 'reason'
+)
+# The columns compared between two replays
+COMPARED_FIELDS = ('decision', 'acc_min_delay', 'acc_max_delay')
+# The input port of frames read from captures that do not record it
+DEFAULT_IN_PORT = 1
+# The number of differing decisions printed by --compare
+SHOWN_DIFFERENCES = 10
+
+
+def _load_local_module(name):
+    # Loaded from this directory, as the controller may be imported from
+    # another version of the source tree that does not include it, or an
+    # older version without support for bundles
+    path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'reservation_interfaces',
+        f'{name}.py'
+    )
+    spec = importlib.util.spec_from_file_location(f'_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StubDatapath:
+    """ Stands in for the connection to a switch, keeping the messages the
+    controller sends to it
+    """
+    def __init__(self, datapath_id):
+        self.id = datapath_id
+        self.sent = []
+
+    def send_msg(self, message):
+        self.sent.append(message)
+
+
+class StubTelnet:
+    """ Stands in for `telnetlib.Telnet` while the controller is imported,
+    as older versions of it connect to the switch at import time
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def read_until(self, expected, timeout=None):
+        return b''
+
+    def read_very_eager(self):
+        return b''
+
+    def write(self, buffer):
+        pass
+
+
+class StubSwitchInterface:
+    """ Stands in for the Telnet interface of the switch, keeping the
+    QoS-Filtering rules of the deployed streams
+    """
+    def __init__(self):
+        self.connected = False
+        self.flow_entries = {}
+        self.sequence_no = 1
+
+    def connect(self):
+        self.connected = True
+
+    def add_tsn_stream(self, subscription):
+        self.flow_entries[(subscription, subscription.dst_ip)] = \
+            self.sequence_no
+        self.sequence_no += 1
+
+    def remove_tsn_stream(self, subscription, dst_ip):
+        self.flow_entries.pop((subscription, dst_ip), None)
+
+    def add_default_filter(self):
+        pass
+
+
+def percentile(ordered, p):
+    """ The nearest-rank percentile `p` of sorted values """
+    if not ordered:
+        return None
+    rank = max(math.ceil(p * len(ordered) / 100), 1)
+    return ordered[rank - 1]
+
+
+def _reservations(wire, data):
+    """ The status and fields of the reservations in a frame, a single
+    reservation or a bundle
+    """
+    if wire.is_bundle(data, wire.RESERVATION_OFFSET):
+        return wire.unpack_reservations(data, wire.RESERVATION_OFFSET)
+    (status, fields) = wire.unpack_reservation(
+        data, len(data) - wire.RESERVATION_STRUCT.size
+    )
+    return (status, [fields])
+
+
+def _stream_key(fields):
+    return (fields['src_ip'], fields['src_port'], fields['dst_port'],
+            fields['dst_ip'])
+
+
+def _decisions(wire, status, records, sent, output):
+    """ The decisions of the controller on the reservations of a packet-in
+    and the accumulated delays of the reservations it sent on, see `replay`
+    """
+    forwarded = {}
+    for message in sent:
+        if getattr(message, 'data', None):
+            for fields in _reservations(wire, message.data)[1]:
+                forwarded[_stream_key(fields)] = (
+                    fields['acc_min_delay'], fields['acc_max_delay']
+                )
+    # The controller prints the reasons of rejections, which can not be
+    # told apart between the reservations of a bundle
+    reason = output.strip().replace('\n', '; ')
+    decisions = []
+    for fields in records:
+        delays = forwarded.get(_stream_key(fields))
+        if status == wire.ADVERTISEMENT:
+            decision = 'flooded' if delays else 'dropped'
+        elif status == wire.SUBSCRIPTION:
+            decision = 'forwarded' if delays else 'rejected'
+        else:
+            decision = 'ignored'
+        decisions.append(
+            (decision, *(delays or ('', '')), '' if delays else reason)
+        )
+    return decisions
+
+
+def replay(controller, packet_ins, timing='asap', speed=1.0):
+    """ Feeds recorded packet-ins into `controller.handle_reservation_frame`
+    against stubbed switches, with the controller's clock of soft state
+    following the recorded times
+
+    Parameters
+    ----------
+    controller
+        The controller module, with fresh state
+    packet_ins
+        The `RecordedPacketIn`s in the order they were received
+    timing, optional
+        `asap` to handle every packet-in as soon as the previous one is done,
+        `recorded` to handle them at their recorded times, divided by `speed`
+
+    Returns
+    -------
+    (latencies, decisions, seconds)
+        The time in seconds from the arrival of every packet-in, which is its
+        start without recorded timing, until it was handled, the decision
+        on every reservation as dict of `DECISION_FIELDS`, one per
+        reservation of a bundle, and the duration of the replay
+    """
+    wire = _load_local_module('wire')
+
+    switch = StubSwitchInterface()
+    controller.switch_interface = switch
+    recorded_now = [0.0]
+    datapaths = {}
+    latencies = []
+    decisions = []
+    output = io.StringIO()
+    (first, start) = (None, time.perf_counter())
+    for (index, recorded) in enumerate(packet_ins):
+        recorded_now[0] = recorded.time
+        if first is None:
+            (first, start) = (recorded.time, time.perf_counter())
+            # Soft state expires in recorded time, independent of the speed
+            # of the replay
+            if hasattr(controller, 'STATE_TIMERS'):
+                controller.STATE_TIMERS = controller.TimerWheel(
+                    tick=controller.EXPIRY_TICK,
+                    clock=lambda: recorded_now[0]
+                )
+        if hasattr(controller, 'STATE_TIMERS'):
+            with contextlib.redirect_stdout(output):
+                controller.expire_stale_state()
+        datapath = datapaths.get(recorded.datapath_id)
+        if datapath is None:
+            datapath = datapaths[recorded.datapath_id] = \
+                StubDatapath(recorded.datapath_id)
+        in_port = recorded.in_port if recorded.in_port is not None \
+            else DEFAULT_IN_PORT
+        message = controller.OFPPacketIn(
+            datapath, buffer_id=controller.OFP_NO_BUFFER,
+            total_len=len(recorded.data), in_port=in_port, reason=0,
+            data=recorded.data
+        )
+        (status, records) = _reservations(wire, recorded.data)
+
+        if timing == 'recorded':
+            arrival = start + (recorded.time - first) / speed
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            arrival = time.perf_counter()
+        output.seek(0)
+        output.truncate()
+        try:
+            with contextlib.redirect_stdout(output):
+                controller.handle_reservation_frame(message)
+            latencies.append(time.perf_counter() - arrival)
+            outcomes = _decisions(
+                wire, status, records, datapath.sent, output.getvalue()
+            )
+        except Exception as error:
+            latencies.append(time.perf_counter() - arrival)
+            outcomes = [('error', '', '', repr(error))] * len(records)
+        datapath.sent.clear()
+
+        for (record, (fields, decision)) in enumerate(
+                zip(records, outcomes)):
+            decisions.append(dict(zip(DECISION_FIELDS, (
+                index, record, f'{recorded.time - first:.6f}',
+                recorded.datapath_id, in_port, status,
+                f"{fields['src_ip']}:{fields['src_port']}->"
+                f"{fields['dst_port']}",
+                fields['dst_ip'] if status != wire.ADVERTISEMENT else '',
+                *decision
+            ))))
+    return (latencies, decisions, time.perf_counter() - start)
+
+
+def write_decisions(path, decisions):
+    with open(path, 'w', newline='') as output:
+        writer = csv.DictWriter(output, DECISION_FIELDS)
+        writer.writeheader()
+        writer.writerows(decisions)
+
+
+def compare_decisions(path, decisions):
+    """ The decisions that differ from those of an earlier replay of the
+    same recording written to `path`
+
+    Returns
+    -------
+    list
+        `(earlier, current)` decisions as dicts, None for packet-ins missing
+        from either replay
+    """
+    with open(path, newline='') as earlier_file:
+        earlier = list(csv.DictReader(earlier_file))
+    differences = []
+    for i in range(max(len(earlier), len(decisions))):
+        before = earlier[i] if i < len(earlier) else None
+        after = decisions[i] if i < len(decisions) else None
+        if before is None or after is None or any(
+                str(before[field]) != str(after[field])
+                for field in COMPARED_FIELDS):
+            differences.append((before, after))
+    return differences
+
+
+def _describe(decision):
+    if decision is None:
+        return 'missing'
+    described = f"{decision['decision']}"
+    if decision['acc_max_delay'] != '':
+        described += f" ({decision['acc_min_delay']}/" \
+            f"{decision['acc_max_delay']} µs)"
+    if decision['reason']:
+        described += f": {decision['reason']}"
+    return described
+
+
+def main(recording=None, timing=None, speed=None, strategy=None,
+         source_dir=None, decisions_file=None, compare=None, report=None):
+    recording_module = _load_local_module('packet_in_recording')
+    if source_dir is not None:
+        sys.path.insert(0, os.path.abspath(source_dir))
+    # The switch is replaced by `StubSwitchInterface` after the import, but
+    # older controllers already connect to it while being imported
+    telnetlib = types.ModuleType('telnetlib')
+    telnetlib.Telnet = StubTelnet
+    sys.modules['telnetlib'] = telnetlib
+    controller = importlib.import_module('controller')
+    if strategy is not None:
+        controller.WORST_CASE_STRATEGY = strategy
+        controller.LATENCY_MODEL.strategy = strategy
+    packet_ins = list(recording_module.read_packet_ins(recording))
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    (latencies, decisions, seconds) = replay(
+        controller, packet_ins, timing, speed
+    )
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + \
+        (usage_after.ru_stime - usage_before.ru_stime)
+
+    ordered = sorted(latencies)
+    counts = {}
+    for decision in decisions:
+        counts[decision['decision']] = counts.get(decision['decision'], 0) + 1
+    results = {
+        'recording': recording,
+        'controller': os.path.abspath(controller.__file__),
+        'strategy': getattr(controller, 'WORST_CASE_STRATEGY', None),
+        'timing': timing,
+        'packet_ins': len(latencies),
+        'reservations': len(decisions),
+        'seconds': seconds,
+        'throughput': len(latencies) / seconds if seconds else None,
+        'latency_us': {
+            f'p{p:g}': percentile(ordered, p) * 1e6 if ordered else None
+            for p in PERCENTILES
+        },
+        'cpu_seconds': cpu_seconds,
+        'cpu_utilization': cpu_seconds / seconds if seconds else None,
+        # ru_maxrss is given in KiB on Linux
+        'max_rss_mib': usage_after.ru_maxrss / 1024,
+        'decisions': counts,
+    }
+    if ordered:
+        results['latency_us']['max'] = ordered[-1] * 1e6
+
+    print(f"Replayed {results['packet_ins']} packet-ins with "
+          f"{results['reservations']} reservations in {seconds:.3f}s "
+          f"({results['throughput'] or 0:.0f}/s) with the "
+          f"{results['strategy']} strategy")
+    print('Latency ' + ', '.join(
+        f'{name} {value:.1f}µs'
+        for (name, value) in results['latency_us'].items()
+        if value is not None
+    ))
+    print(f"CPU {cpu_seconds:.3f}s "
+          f"({(results['cpu_utilization'] or 0) * 100:.0f}%), "
+          f"peak memory {results['max_rss_mib']:.1f} MiB")
+    print('Decisions ' + ', '.join(
+        f'{decision} {count}' for (decision, count) in sorted(counts.items())
+    ))
+
+    if decisions_file is not None:
+        write_decisions(decisions_file, decisions)
+    if report is not None:
+        with open(report, 'w') as report_file:
+            json.dump(results, report_file, indent=2)
+    if compare is not None:
+        differences = compare_decisions(compare, decisions)
+        print(f'{len(differences)} decisions differ from {compare}')
+        for (before, after) in differences[:SHOWN_DIFFERENCES]:
+            shown = after or before
+            print(f"  #{shown['index']} {shown['stream']} "
+                  f"{shown['listener']}: {_describe(before)} -> "
+                  f"{_describe(after)}")
+        return 1 if differences else 0
+    return 0
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Replay the packet-ins recorded by the controller (see "
+                    "PACKET_IN_RECORDING) against stubbed switches and "
+                    "report the controller's throughput, latency, CPU and "
+                    "memory usage and decisions.")
+
+    parser.add_argument(
+        'recording',
+        help="The pcapng file written by the controller, or a pcap or "
+             "pcapng capture of reservation frames")
+
+    parser.add_argument(
+        '--timing',
+        choices=['asap', 'recorded'],
+        help="Handle the packet-ins as fast as possible or at their "
+             "recorded times",
+        default='asap')
+
+    parser.add_argument(
+        '--speed',
+        type=float,
+        help="The factor by which recorded timing is sped up",
+        default=1.0)
+
+    parser.add_argument(
+        '--strategy',
+        choices=['naive', 'optimized'],
+        help="The worst-case delay strategy of the controller, defaults to "
+             "its WORST_CASE_STRATEGY")
+
+    parser.add_argument(
+        '--source-dir',
+        help="The source directory of another version of the controller to "
+             "replay against")
+
+    parser.add_argument(
+        '--decisions',
+        dest='decisions_file',
+        help="A CSV file to write the decision on every reservation to, "
+             "one row per reservation of a bundle")
+
+    parser.add_argument(
+        '--compare',
+        help="The decisions file of an earlier replay of the same "
+             "recording to compare with, exits with 1 if any differ")
+
+    parser.add_argument(
+        '--report',
+        help="A JSON file to write the measured statistics to")
+
+    kwargs = vars(parser.parse_args())
+    raise SystemExit(main(**kwargs))
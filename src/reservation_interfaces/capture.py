@@ -0,0 +1,343 @@
+import ctypes
+import socket
+import struct
+import threading
+
+from .wire import ACKNOWLEDGEMENT_PORT, BUNDLE, ETHER_HEADER_LEN, MTU, \
+    RESERVATION_PORT, UDP_HEADER_LEN, bytes_to_ip, unpack_reservations
+
+ETH_P_IP = 0x0800
+ETH_P_ALL = 0x0003
+IP_PROTO_UDP = 17
+SO_ATTACH_FILTER = 26
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+PACKET_OUTGOING = 4
+IP_DESTINATION_OFFSET = ETHER_HEADER_LEN + 16
+
+# Classic BPF opcodes, see linux/filter.h
+BPF_LD_W_ABS = 0x20
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_LD_H_IND = 0x48
+BPF_LD_B_IND = 0x50
+BPF_LDX_B_MSH = 0xb1
+BPF_JEQ_K = 0x15
+BPF_JSET_K = 0x45
+BPF_RET_K = 0x06
+# Ancillary load of the packet type, e.g. `PACKET_OUTGOING`
+SKF_AD_PKTTYPE = 0xfffff000 + 4
+
+# The number of Byte of a frame passed to user space, enough for a bundle
+# of reservations filling the MTU
+SNAP_LEN = ETHER_HEADER_LEN + MTU
+
+
+class SockFilter(ctypes.Structure):
+    _fields_ = [
+        ('code', ctypes.c_uint16),
+        ('jt', ctypes.c_uint8),
+        ('jf', ctypes.c_uint8),
+        ('k', ctypes.c_uint32),
+    ]
+
+
+class SockFprog(ctypes.Structure):
+    _fields_ = [
+        ('len', ctypes.c_uint16),
+        ('filter', ctypes.POINTER(SockFilter)),
+    ]
+
+
+def reservation_filter(statuses,
+                       ports=(RESERVATION_PORT, ACKNOWLEDGEMENT_PORT),
+                       inbound_only=True):
+    """ Assembles a classic BPF program accepting only reservation frames
+
+    A frame passes if it is an unfragmented IPv4/UDP frame to one of `ports`
+    whose first payload byte, the reservation's status, is one of `statuses`,
+    or that carries a bundle of reservations of one of `statuses`.
+
+    Parameters
+    ----------
+    statuses
+        The reservation statuses to accept
+    ports, optional
+        The UDP destination ports to accept (default is 1000 and 999)
+    inbound_only, optional
+        Whether frames sent by this host are dropped (default is True)
+
+    Returns
+    -------
+    list
+        `(code, jt, jf, k)` instructions
+    """
+    statuses = list(statuses)
+    ports = list(ports)
+    assert statuses and ports
+    # Instructions are built with symbolic jump targets first
+    program = []
+    if inbound_only:
+        program += [
+            (BPF_LD_W_ABS, None, None, SKF_AD_PKTTYPE),
+            (BPF_JEQ_K, 'drop', None, PACKET_OUTGOING),
+        ]
+    program += [
+        (BPF_LD_H_ABS, None, None, 12),
+        (BPF_JEQ_K, None, 'drop', ETH_P_IP),
+        (BPF_LD_B_ABS, None, None, ETHER_HEADER_LEN + 9),
+        (BPF_JEQ_K, None, 'drop', IP_PROTO_UDP),
+        (BPF_LD_H_ABS, None, None, ETHER_HEADER_LEN + 6),
+        (BPF_JSET_K, 'drop', None, 0x1fff),
+        # X = length of the IPv4 header
+        (BPF_LDX_B_MSH, None, None, ETHER_HEADER_LEN),
+        (BPF_LD_H_IND, None, None, ETHER_HEADER_LEN + 2),
+    ]
+    for (index, port) in enumerate(ports):
+        last = index == len(ports) - 1
+        program.append((BPF_JEQ_K, 'status', 'drop' if last else None, port))
+    program += [
+        ('status', BPF_LD_B_IND, ETHER_HEADER_LEN + UDP_HEADER_LEN),
+        (BPF_JEQ_K, None, 'statuses', BUNDLE),
+        # The status of a bundle follows its marker and version
+        (BPF_LD_B_IND, None, None, ETHER_HEADER_LEN + UDP_HEADER_LEN + 2),
+    ]
+    for (index, status) in enumerate(statuses):
+        last = index == len(statuses) - 1
+        instruction = (BPF_JEQ_K, 'accept', 'drop' if last else None, status)
+        if index == 0:
+            instruction = ('statuses',) + instruction
+        program.append(instruction)
+    program.append(('accept', BPF_RET_K, SNAP_LEN))
+    program.append(('drop', BPF_RET_K, 0))
+
+    # Resolve the labels to relative jump offsets. Labelled instructions
+    # are given as `(label, code, k)` or `(label, code, jt, jf, k)`
+    labels = {}
+    instructions = []
+    for entry in program:
+        if isinstance(entry[0], str):
+            labels[entry[0]] = len(instructions)
+            entry = entry[1:] if len(entry) == 5 else \
+                (entry[1], None, None, entry[2])
+        instructions.append(entry)
+
+    def offset(target, position):
+        if target is None:
+            return 0
+        return labels[target] - position - 1
+
+    return [
+        (code, offset(jt, position), offset(jf, position), k)
+        for (position, (code, jt, jf, k)) in enumerate(instructions)
+    ]
+
+
+def attach_filter(sock, program):
+    """ Attaches a classic BPF program to a socket """
+    filters = (SockFilter * len(program))(*[
+        SockFilter(code, jt, jf, k) for (code, jt, jf, k) in program
+    ])
+    fprog = SockFprog(len(program), filters)
+    # The kernel copies the program, `filters` only has to outlive the call
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, bytes(
+        ctypes.string_at(ctypes.addressof(fprog), ctypes.sizeof(fprog))
+    ))
+
+
+def decode_reservation_frame(frame, length=None):
+    """ Decodes the reservations of a raw Ethernet frame without scapy
+
+    Parameters
+    ----------
+    frame
+        The frame's bytes, starting with the Ethernet header
+    length, optional
+        The number of valid Byte in `frame`
+
+    Returns
+    -------
+    (status, records) or None
+        See `wire.unpack_reservations`, None if the frame is no IPv4/UDP
+        frame carrying a complete reservation or bundle
+    """
+    if length is None:
+        length = len(frame)
+    if length < ETHER_HEADER_LEN + 20 + UDP_HEADER_LEN or \
+            frame[12:14] != b'\x08\x00' or \
+            frame[ETHER_HEADER_LEN + 9] != IP_PROTO_UDP:
+        return None
+    ip_header_len = (frame[ETHER_HEADER_LEN] & 0x0f) * 4
+    offset = ETHER_HEADER_LEN + ip_header_len + UDP_HEADER_LEN
+    try:
+        return unpack_reservations(frame, offset, length)
+    except ValueError:
+        return None
+
+
+class ReservationCapture:
+    """
+    Receives reservation frames on a raw `AF_PACKET` socket. A BPF program
+    drops all other frames in the kernel, the reservations are decoded
+    directly from the frames' bytes.
+
+    Frames are either read by a background thread, see `start`, or by the
+    owner of the socket, e.g. an event loop, through `fileno` and `poll`.
+    The reservations of a bundle are passed on one by one, unless `bundles`
+    is set.
+
+    Attributes
+    ----------
+    interface
+        The system's interface to capture on
+    bundles
+        Whether callbacks are called once per frame with the `status` and
+        the list of the fields of all its reservations, instead of once per
+        reservation
+    received
+        The number of frames passed to user space
+    parsed
+        The number of reservations decoded successfully
+    dropped
+        The number of frames passed to user space that were no complete
+        reservation or bundle
+    """
+    def __init__(self, interface, statuses,
+                 ports=(RESERVATION_PORT, ACKNOWLEDGEMENT_PORT),
+                 inbound_only=True, sock=None, bundles=False):
+        self.interface = interface
+        self.bundles = bundles
+        self.received = 0
+        self.parsed = 0
+        self.dropped = 0
+        self.program = reservation_filter(statuses, ports, inbound_only)
+        if sock is None:
+            # Bind only after attaching the filter, so that no unfiltered
+            # frames are queued in between
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+            attach_filter(sock, self.program)
+            sock.bind((interface, ETH_P_ALL))
+        self.socket = sock
+        self._buffer = bytearray(SNAP_LEN)
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def _decode(self, length):
+        self.received += 1
+        reservations = decode_reservation_frame(self._buffer, length)
+        if reservations is None:
+            self.dropped += 1
+        else:
+            self.parsed += len(reservations[1])
+        return reservations
+
+    def _dispatch(self, callback, reservations, *args):
+        (status, records) = reservations
+        if self.bundles:
+            callback(status, records, *args)
+            return
+        for fields in records:
+            callback(status, fields, *args)
+
+    def receive(self):
+        """ Blocks until a frame is received
+
+        Returns
+        -------
+        (status, records) or None
+            The decoded reservations, see `decode_reservation_frame`
+        """
+        return self._decode(self.socket.recv_into(self._buffer))
+
+    def poll(self, callback, max_frames=64, destination=False):
+        """ Reads the frames already queued on a non-blocking socket
+
+        Parameters
+        ----------
+        callback
+            Called with `status` and `fields` of every decoded reservation,
+            see `bundles`
+        max_frames, optional
+            The maximum number of frames to read at once
+        destination, optional
+            Whether the frame's IPv4 destination address is passed to
+            `callback` as third argument
+
+        Returns
+        -------
+        int
+            The number of frames read
+        """
+        for frames in range(max_frames):
+            try:
+                length = self.socket.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return frames
+            reservations = self._decode(length)
+            if reservations is None:
+                continue
+            if destination:
+                self._dispatch(callback, reservations, bytes_to_ip(
+                    self._buffer[IP_DESTINATION_OFFSET:
+                                 IP_DESTINATION_OFFSET + 4]
+                ))
+            else:
+                self._dispatch(callback, reservations)
+        return max_frames
+
+    def start(self, callback):
+        """ Starts a thread passing `status` and `fields` of every decoded
+        reservation to `callback`, see `bundles`
+        """
+        self.socket.settimeout(0.5)
+
+        def capture():
+            while not self._stopped.is_set():
+                try:
+                    reservations = self.receive()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stopped.is_set():
+                        return
+                    raise
+                if reservations is not None:
+                    self._dispatch(callback, reservations)
+
+        self._thread = threading.Thread(target=capture, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.socket.close()
+
+    def statistics(self):
+        """ The capture's counters
+
+        Returns
+        -------
+        dict
+            `received`, `parsed` and `dropped` as counted in user space and
+            the `kernel_received` and `kernel_dropped` frames that passed the
+            filter since the last call, as counted by the kernel. Frames
+            dropped by the kernel did not fit into the socket's buffer
+        """
+        statistics = {
+            'received': self.received,
+            'parsed': self.parsed,
+            'dropped': self.dropped,
+        }
+        try:
+            (packets, drops) = struct.unpack('II', self.socket.getsockopt(
+                SOL_PACKET, PACKET_STATISTICS, 8
+            ))
+            statistics['kernel_received'] = packets
+            statistics['kernel_dropped'] = drops
+        except OSError:
+            pass
+        return statistics
@@ -0,0 +1,338 @@
+import asyncio
+import socket
+import threading
+
+from .capture import ReservationCapture
+from .port_allocator import PortAllocator
+from .sender import FrameSender
+from .reservation_tracker import DEFAULT_REFRESH_INTERVAL, RESEND_TICK, \
+    ReservationTracker
+from .subscription_policy import SubscriptionCache
+from .talker import create_advertisement
+from .timer_wheel import TimerWheel
+from .util import Reservation
+from .wire import ACKNOWLEDGEMENT, ACKNOWLEDGEMENT_PORT, ADVERTISEMENT, \
+    MAX_BUNDLE_RESERVATIONS, RESERVATION_PORT, SUBSCRIPTION
+
+# The receive buffer of the shared capture socket in Byte. Every broadcast
+# advertisement is answered by all hosted listeners at once
+RECEIVE_BUFFER = 16 * 2 ** 20
+
+
+class VirtualTalker:
+    """
+    A talker hosted by an `EndpointRuntime`, sending and receiving through
+    the runtime's shared socket. Works like `Talker` without own threads,
+    its resends and refreshes are driven by the runtime's timer wheel.
+
+    Attributes
+    ----------
+    runtime
+        The hosting `EndpointRuntime`
+    ip
+        The talker's IPv4 address
+    ports
+        The `PortAllocator` of the talker's streams, as streams are told
+        apart by their talker's IP address and ports
+    advertised_streams
+        The advertisements of all streams not withdrawn
+    stream_subscriptions
+        The IP addresses of the subscribed listeners by advertisement
+    reservations
+        The `ReservationTracker` of the talker's streams
+    statistics
+        The talker's frame counters
+    """
+    def __init__(self, runtime, ip):
+        self.runtime = runtime
+        self.ip = ip
+        self.ports = PortAllocator()
+        self.reservations = ReservationTracker(
+            runtime.loop, self._send_advertisement, runtime.timeout,
+            runtime.resends, jitter=runtime.jitter, backoff=runtime.backoff,
+            max_timeout=runtime.max_timeout,
+            refresh_interval=runtime.refresh_interval, ports=self.ports,
+            wheel=runtime.resend_wheel, lock=runtime.resend_lock
+        )
+        self.advertised_streams = self.reservations.advertised_streams
+        self.stream_subscriptions = self.reservations.stream_subscriptions
+        self.statistics = {
+            'advertisements_sent': 0,
+            'subscriptions_received': 0,
+            'acknowledgements_sent': 0,
+        }
+
+    def advertise_stream(self, subscriptions=1, deadline=None, **kwargs):
+        """ Advertise a stream, see `Talker.advertise_stream`
+
+        Returns
+        -------
+        asyncio.Future or None
+            Resolves to the stream's `ReservationResult`. None if the stream
+            could not be advertised
+        """
+        advertisement = create_advertisement(
+            self.ip, self.ports, **kwargs
+        )
+        if advertisement is None:
+            return None
+        future = self.reservations.track(
+            advertisement, subscriptions, deadline
+        )
+        self._send_advertisement(advertisement)
+        return future
+
+    def advertise_streams(self, stream_specifications, subscriptions=1,
+                          deadline=None):
+        """ Advertises every stream specification `instances` times, see
+        `advertise_stream`
+
+        Returns
+        -------
+        list
+            The futures of all streams that could be advertised
+        """
+        futures = []
+        for data in stream_specifications:
+            data = dict(data)
+            instances = data.pop('instances', 1)
+            combinations = [None] if instances == 1 else \
+                self.ports.allocate_many(
+                    instances, data.get('src_port'), data.get('dst_port')
+                )
+            for ports in combinations:
+                future = self.advertise_stream(
+                    subscriptions, deadline, ports=ports, **data
+                )
+                if future is not None:
+                    futures.append(future)
+        return futures
+
+    def withdraw(self, advertisement):
+        """ Stops advertising and refreshing a stream and releases its port
+        combination
+        """
+        self.reservations.withdraw(advertisement)
+
+    def _send_advertisement(self, advertisement):
+        self.runtime.sender.queue(
+            self.runtime.broadcast_ip, RESERVATION_PORT, RESERVATION_PORT,
+            ADVERTISEMENT, advertisement, src_ip=self.ip
+        )
+        self.statistics['advertisements_sent'] += 1
+
+    def _handle_subscription(self, fields):
+        subscription = Reservation(**fields)
+        if not self.reservations.subscribe(subscription):
+            return
+        self.statistics['subscriptions_received'] += 1
+        self.runtime.sender.queue(
+            subscription.dst_ip, RESERVATION_PORT, ACKNOWLEDGEMENT_PORT,
+            ACKNOWLEDGEMENT, subscription, src_ip=self.ip
+        )
+        self.statistics['acknowledgements_sent'] += 1
+        self.reservations.subscription_received(subscription)
+
+
+class VirtualListener:
+    """
+    A listener hosted by an `EndpointRuntime`, answering advertisements
+    like `Listener`.
+
+    Attributes
+    ----------
+    runtime
+        The hosting `EndpointRuntime`
+    ip
+        The listener's IPv4 address
+    subscriptions
+        The `SubscriptionCache` deciding which advertisements are answered
+    statistics
+        The listener's frame counters
+    """
+    def __init__(self, runtime, ip, policy=None):
+        self.runtime = runtime
+        self.ip = ip
+        self.subscriptions = SubscriptionCache(policy, clock=runtime.loop.time)
+        self.statistics = {
+            'advertisements_received': 0,
+            'subscriptions_sent': 0,
+            'acknowledgements_received': 0,
+        }
+
+    def _handle_advertisement(self, fields):
+        self.statistics['advertisements_received'] += 1
+        subscription = Reservation(**fields)
+        if not self.subscriptions.should_answer(subscription):
+            return
+        subscription.dst_ip = self.ip
+        self.runtime.sender.queue(
+            subscription.src_ip, RESERVATION_PORT, RESERVATION_PORT,
+            SUBSCRIPTION, subscription, src_ip=self.ip
+        )
+        self.statistics['subscriptions_sent'] += 1
+
+    def _handle_acknowledgement(self, fields):
+        acknowledgement = Reservation(**fields)
+        if acknowledgement.dst_ip == self.ip and \
+           self.subscriptions.acknowledge(acknowledgement):
+            self.statistics['acknowledgements_received'] += 1
+
+
+class EndpointRuntime:
+    """
+    Hosts many virtual talkers and listeners in a single asyncio event loop.
+
+    All endpoints share one capture socket, registered with the event loop
+    through `loop.add_reader`, and one `FrameSender`. Received reservations
+    are dispatched by the frame's IPv4 destination: subscriptions to the
+    talker, acknowledgements to the listener and advertisements to the
+    addressed listener or, if broadcast, to all of them. Frames queued while
+    handling a batch of received frames or resends are sent together, the
+    reservations of one status to the same destination bundled into frames
+    of up to `max_bundle` reservations.
+
+    Attributes
+    ----------
+    loop
+        The event loop running all endpoints
+    broadcast_ip
+        The Broadcast IPv4 address advertisements are sent to
+    timeout
+        The time in seconds until an advertisement is resent
+    resends
+        The number of times an advertisement would be resent
+    jitter
+        The fraction by which every resend interval is randomized
+    backoff
+        The factor by which the resend interval grows after every resend
+    max_timeout
+        The upper bound in seconds of the growing resend interval, None for
+        no bound
+    refresh_interval
+        The interval in seconds in which subscribed advertisements are
+        refreshed, None to never refresh
+    talkers
+        The virtual talkers by IPv4 address
+    listeners
+        The virtual listeners by IPv4 address
+    unrouted
+        The number of received reservations addressed to no hosted endpoint
+    """
+    def __init__(self, interface, mac, broadcast_ip, timeout=1, resends=None,
+                 jitter=0.1, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 loop=None, sender=None, capture=None,
+                 max_bundle=MAX_BUNDLE_RESERVATIONS, backoff=1,
+                 max_timeout=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.broadcast_ip = broadcast_ip
+        self.timeout = timeout
+        self.resends = resends
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_timeout = max_timeout
+        self.refresh_interval = refresh_interval
+        self.sender = sender or FrameSender(
+            interface, mac, '0.0.0.0', max_bundle=max_bundle
+        )
+        self.capture = capture or ReservationCapture(
+            interface, [ADVERTISEMENT, SUBSCRIPTION, ACKNOWLEDGEMENT]
+        )
+        self.capture.socket.setblocking(False)
+        self.capture.socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER
+        )
+        self.talkers = {}
+        self.listeners = {}
+        self.unrouted = 0
+        # The resends and refreshes of all virtual talkers share one timer
+        # wheel, see `ReservationTracker`
+        self.resend_wheel = TimerWheel(
+            tick=RESEND_TICK, slots=1024, clock=self.loop.time
+        )
+        self.resend_lock = threading.Lock()
+        self._tick_handle = None
+
+    def add_talker(self, ip):
+        talker = VirtualTalker(self, ip)
+        self.talkers[ip] = talker
+        return talker
+
+    def add_listener(self, ip, policy=None):
+        listener = VirtualListener(self, ip, policy)
+        self.listeners[ip] = listener
+        return listener
+
+    def start(self):
+        """ Registers the capture socket and the resend timer with the loop
+        """
+        self.loop.add_reader(self.capture.fileno(), self._receive)
+        self._tick_handle = self.loop.call_later(RESEND_TICK, self._tick)
+
+    def stop(self):
+        self.loop.remove_reader(self.capture.fileno())
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+        self.sender.flush()
+
+    def _receive(self):
+        self.capture.poll(self._dispatch, destination=True)
+        self.sender.flush()
+
+    def _dispatch(self, status, fields, destination):
+        if status == ADVERTISEMENT:
+            listener = self.listeners.get(destination)
+            if listener is not None:
+                listener._handle_advertisement(fields)
+                return
+            for listener in self.listeners.values():
+                listener._handle_advertisement(fields)
+            return
+        if status == SUBSCRIPTION:
+            endpoint = self.talkers.get(destination)
+            if endpoint is not None:
+                endpoint._handle_subscription(fields)
+                return
+        elif status == ACKNOWLEDGEMENT:
+            endpoint = self.listeners.get(destination)
+            if endpoint is not None:
+                endpoint._handle_acknowledgement(fields)
+                return
+        self.unrouted += 1
+
+    def _tick(self):
+        """ Resends or refreshes every advertisement whose interval has
+        passed and gives up on those without resends left
+        """
+        with self.resend_lock:
+            for advertisement in self.resend_wheel.advance():
+                self.talkers[advertisement.src_ip].reservations.resend(
+                    advertisement
+                )
+        self.sender.flush()
+        self._tick_handle = self.loop.call_later(RESEND_TICK, self._tick)
+
+    def statistics(self):
+        """ The frame counters of the runtime and every endpoint
+
+        Returns
+        -------
+        dict
+            The capture's counters, the number of frames sent and unrouted
+            and the counters of every talker and listener by IPv4 address
+        """
+        return {
+            'capture': self.capture.statistics(),
+            'frames_sent': self.sender.frames_sent,
+            'unrouted': self.unrouted,
+            'talkers': {
+                ip: dict(talker.statistics)
+                for (ip, talker) in self.talkers.items()
+            },
+            'listeners': {
+                ip: dict(
+                    listener.statistics, **listener.subscriptions.statistics
+                )
+                for (ip, listener) in self.listeners.items()
+            },
+        }
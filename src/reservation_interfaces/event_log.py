@@ -0,0 +1,75 @@
+from collections import deque
+import time
+
+# Events of a listener
+ANSWERED = 'answered'
+IGNORED = 'ignored'
+ACKNOWLEDGED = 'acknowledged'
+
+# The messages of the events, formatted with the reservation's signature
+# and accumulated maximum delay
+EVENT_MESSAGES = {
+    ANSWERED: 'Answered advertisement for {} with accMaxD of {}',
+    IGNORED: 'Ignored advertisement for {} with accMaxD of {}',
+    ACKNOWLEDGED: 'Received acknowledgement for {} with accMaxD of {}',
+}
+# The number of events kept
+DEFAULT_EVENT_LOG_SIZE = 4096
+
+
+class EventLog:
+    """
+    A bounded in-memory log of reservation events.
+
+    Recording an event only appends a tuple to a ring buffer, the messages
+    are formatted when the log is read, so that logging does not slow down
+    answering reservations. The oldest events are dropped once `capacity`
+    is exceeded.
+
+    Attributes
+    ----------
+    capacity
+        The maximum number of events kept
+    recorded
+        The number of events recorded in total
+    """
+    def __init__(self, capacity=DEFAULT_EVENT_LOG_SIZE):
+        self.capacity = capacity
+        self.recorded = 0
+        self._events = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, event, reservation):
+        """ Appends an event, one of `EVENT_MESSAGES`, concerning a
+        reservation
+        """
+        self._events.append((time.time(), event, reservation))
+        self.recorded += 1
+
+    def lines(self, last=None):
+        """ The formatted events, oldest first
+
+        Parameters
+        ----------
+        last, optional
+            The number of most recent events to return (default is all)
+        """
+        events = list(self._events)
+        if last is not None:
+            events = events[-last:]
+        return [
+            f'{time.strftime("%H:%M:%S", time.localtime(timestamp))}'
+            f'.{int(timestamp % 1 * 1000):03d} ' +
+            EVENT_MESSAGES[event].format(
+                reservation.signature(), reservation.acc_max_delay
+            )
+            for (timestamp, event, reservation) in events
+        ]
+
+    def write(self, path):
+        """ Writes the formatted events to a text file """
+        with open(path, 'w') as log_file:
+            for line in self.lines():
+                log_file.write(line + '\n')
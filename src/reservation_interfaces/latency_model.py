@@ -0,0 +1,324 @@
+# The size in Byte of the largest frame of a lower priority that may block the
+# transmission of a burst, including preamble, delimiter and CRC
+MAX_BLOCKING_FRAME = 1530
+
+# Strategies for testing the deployability of a new stream. 'naive'
+# recalculates the worst-case delay of every deployed stream from scratch,
+# 'optimized' adds the new stream's delay to their stored worst-case delays
+NAIVE = 'naive'
+OPTIMIZED = 'optimized'
+STRATEGIES = (NAIVE, OPTIMIZED)
+
+
+def ceil_div(dividend: int, divisor: int):
+    """ Integer division rounding towards positive infinity
+
+    Parameters
+    ----------
+    dividend: int
+        The number to divide
+    divisor: int
+        The positive number to divide by
+
+    Returns
+    -------
+    int
+        The smallest integer greater than or equal to `dividend / divisor`
+    """
+    return -(-dividend // divisor)
+
+
+def burst_rate(burst_size: int, burst_interval: int):
+    """ The rate in Bit/s of a stream sending `burst_size` Byte every
+    `burst_interval` µs, rounded up
+    """
+    return ceil_div(burst_size * 8 * 1000000, burst_interval)
+
+
+def best_possible_burst_rate(burst_rate: int):
+    """ Matches a given burst rate to the closest value technically possible.
+    This is necessary because the used NEC PF5420 switch can only limit
+    bandwidths from 64kBps up to 960kBps in 64kBps steps or from 1MBps on
+    in 0.1MBps steps
+
+    Parameters
+    ----------
+    burst_rate: int
+        The raw burst rate e.g. as provided by a stream advertisement
+
+    Returns
+    -------
+    possible_burst_rate: int
+        The closest burst rate equal or higher than the given one, wich is
+        technically possible
+     """
+    if burst_rate <= 960000:
+        return ceil_div(burst_rate, 64000) * 64000
+    elif burst_rate <= 1000000:
+        return 1000000
+    else:
+        return ceil_div(burst_rate, 100000) * 100000
+
+
+def first_hop_delays(max_frame: int, link_speed: int, processing_delay: int):
+    """ The delays a talker puts into a new advertisement
+
+    Parameters
+    ----------
+    max_frame: int
+        The largest frame of the stream in Byte
+    link_speed: int
+        The speed of the talker's link in Bit/s
+    processing_delay: int
+        The preconfigured processing delay bound in µs
+
+    Returns
+    -------
+    (acc_min_delay, acc_max_delay)
+        The transmission delay to the first hop and that delay plus the
+        processing delay bound
+    """
+    acc_min_delay = (max_frame * 8) // link_speed
+    return acc_min_delay, acc_min_delay + processing_delay
+
+
+class LatencyModel:
+    """
+    The bridge-local latency model for strict priority queuing. All delays are
+    integers in µs and calculated exactly with integer arithmetic.
+
+    Link speeds and class delays are looked up from tables built once when the
+    model is created. Streams are passed as objects with the attributes of a
+    `Reservation`, i.e. the advertisements stored by the controller.
+
+    Attributes
+    ----------
+    class_delays
+        The delay guarantee in µs of each traffic class by priority
+    link_speed
+        The default link speed in Bit/s for ports without an own entry
+    port_link_speeds
+        The link speed in Bit/s by port
+    strategy
+        The default strategy of `is_deployable`, one of `STRATEGIES`
+    """
+
+    def __init__(self, class_delays, link_speed, port_link_speeds=None,
+                 strategy=OPTIMIZED):
+        assert strategy in STRATEGIES
+        self.class_delays = dict(class_delays)
+        self.link_speed = link_speed
+        self.port_link_speeds = dict(port_link_speeds or {})
+        self.strategy = strategy
+
+        # Worst-case blocking by a single lower-priority frame for each port
+        self._blocking_delays = {
+            port: ceil_div(MAX_BLOCKING_FRAME * 8 * 1000000, speed)
+            for (port, speed) in self.port_link_speeds.items()
+        }
+        self._default_blocking_delay = ceil_div(
+            MAX_BLOCKING_FRAME * 8 * 1000000, link_speed
+        )
+
+    def link_speed_of(self, port=None):
+        """ The link speed in Bit/s of a port """
+        return self.port_link_speeds.get(port, self.link_speed)
+
+    def class_delay(self, priority):
+        """ The delay guarantee in µs of a traffic class """
+        return self.class_delays[priority]
+
+    def blocking_delay(self, port=None):
+        """ The delay in µs a single lower-priority frame may cause on a port
+        """
+        return self._blocking_delays.get(port, self._default_blocking_delay)
+
+    def transmission_delay(self, size, port=None):
+        """ The time in µs needed to send `size` Byte on a port, rounded up """
+        return ceil_div(size * 8 * 1000000, self.link_speed_of(port))
+
+    def forward_advertisement_delays(self, advertisement, port=None):
+        """ The accumulated delays of an advertisement after passing a hop
+
+        Parameters
+        ----------
+        advertisement
+            The advertisement as received on `port`
+        port, optional
+            The port the advertisement was received on
+
+        Returns
+        -------
+        (acc_min_delay, acc_max_delay)
+            The updated accumulated delays
+        """
+        acc_min_delay = advertisement.acc_min_delay + ceil_div(
+            advertisement.min_frame * 8, self.link_speed_of(port)
+        )
+        acc_max_delay = advertisement.acc_max_delay + \
+            self.class_delays[advertisement.priority]
+        return acc_min_delay, acc_max_delay
+
+    def higher_prio_delay(self, advert_x, advert_i, port=None):
+        """ Calculate the worst-case delay a stream x may cause for an
+        observed stream i of a lower-priority traffic class
+
+        Parameters
+        ----------
+        advert_x
+            The advertisement of the higher-priority stream
+        advert_i
+            The advertisement of the observed lower-priority stream
+        port, optional
+            The port both streams are deployed on
+
+        Returns
+        -------
+        int
+            The maximum delay caused by stream x
+        """
+        # The accumulated maximum delay is taken from the observed stream's
+        # advertisement, as in the original controller implementation
+        y = ceil_div(
+            advert_i.acc_max_delay + self.class_delays[advert_x.priority] -
+            advert_x.acc_min_delay + self.class_delays[advert_i.priority],
+            advert_x.burst_interval
+        )
+        return self.transmission_delay(y * advert_x.burst_size, port)
+
+    def equal_prio_delay(self, advert_x, port=None):
+        """ Calculate the worst-case delay a stream x may cause for any other
+        stream of the same priority
+
+        Parameters
+        ----------
+        advert_x
+            The advertisement of the stream
+        port, optional
+            The port the streams are deployed on
+
+        Returns
+        -------
+        int
+            The maximum delay caused by stream x
+        """
+        z = ceil_div(
+            advert_x.acc_max_delay + self.class_delays[advert_x.priority] -
+            advert_x.acc_min_delay,
+            advert_x.burst_interval
+        )
+        return self.transmission_delay(z * advert_x.burst_size, port)
+
+    def interference(self, advert_x, advert_i, port=None):
+        """ The delay stream x causes for stream i depending on their
+        priorities, 0 if x has a lower priority than i
+        """
+        if advert_x.priority > advert_i.priority:
+            return self.higher_prio_delay(advert_x, advert_i, port)
+        elif advert_x.priority == advert_i.priority:
+            return self.equal_prio_delay(advert_x, port)
+        return 0
+
+    def worst_case_delay(self, advert_i, deployed, port=None):
+        """ Calculate the worst-case delay for an observed stream i caused by
+        the streams deployed on the same port and by itself
+
+        Parameters
+        ----------
+        advert_i
+            The advertisement of the observed stream
+        deployed
+            The advertisements of all other streams deployed on the port
+        port, optional
+            The port the streams are deployed on
+
+        Returns
+        -------
+        int
+            The worst case delay a burst of the stream could experience
+            passing through the switch
+        """
+        worst_case_delay = self.equal_prio_delay(advert_i, port)
+        for advert_x in deployed:
+            worst_case_delay += self.interference(advert_x, advert_i, port)
+        return worst_case_delay + self.blocking_delay(port)
+
+    def is_deployable(self, advert_x, deployed, wc_delays, port=None,
+                      strategy=None):
+        """ Test whether a stream x can be deployed on a port without causing
+        any deployed stream to exceed its delay guarantee
+
+        Parameters
+        ----------
+        advert_x
+            The advertisement of the new stream
+        deployed
+            `(key, advertisement)` pairs of all streams deployed on the port
+        wc_delays
+            The current worst-case delays of the deployed streams by key, only
+            used by the optimized strategy
+        port, optional
+            The port the stream would be deployed on
+        strategy, optional
+            One of `STRATEGIES`, defaults to the model's strategy
+
+        Returns
+        -------
+        bool
+            Whether the new stream can be deployed safely or not
+        """
+        if strategy is None:
+            strategy = self.strategy
+
+        if strategy == OPTIMIZED:
+            equal_prio_delay = self.equal_prio_delay(advert_x, port)
+            for (key, advert_i) in deployed:
+                if advert_i.priority == advert_x.priority:
+                    added_delay = equal_prio_delay
+                elif advert_i.priority < advert_x.priority:
+                    added_delay = self.higher_prio_delay(
+                        advert_x, advert_i, port
+                    )
+                else:
+                    continue
+                if wc_delays[key] + added_delay > \
+                        self.class_delays[advert_i.priority]:
+                    return False
+            return True
+
+        # Recalculate the worst-case delay of every affected stream with the
+        # new stream deployed
+        deployed = list(deployed)
+        adverts = [advert_i for (_, advert_i) in deployed] + [advert_x]
+        for (index, (_, advert_i)) in enumerate(deployed):
+            if advert_i.priority > advert_x.priority:
+                continue
+            others = adverts[:index] + adverts[index + 1:]
+            if self.worst_case_delay(advert_i, others, port) > \
+                    self.class_delays[advert_i.priority]:
+                return False
+        return True
+
+    def worst_case_delays(self, deployed, port=None):
+        """ Recalculate the worst-case delays of all streams on a port
+
+        Parameters
+        ----------
+        deployed
+            `(key, advertisement)` pairs of all streams deployed on the port
+        port, optional
+            The port the streams are deployed on
+
+        Returns
+        -------
+        dict
+            The worst-case delay of every stream by key
+        """
+        deployed = list(deployed)
+        adverts = [advert for (_, advert) in deployed]
+        return {
+            key: self.worst_case_delay(
+                advert_i, adverts[:index] + adverts[index + 1:], port
+            )
+            for (index, (key, advert_i)) in enumerate(deployed)
+        }
@@ -0,0 +1,297 @@
+from collections import OrderedDict
+import csv
+import json
+import threading
+
+# The quantiles estimated for every latency metric
+QUANTILES = (0.5, 0.9, 0.99)
+# The handshake intervals measured by a listener, in nanoseconds:
+# `processing` from receiving an advertisement to sending its subscription,
+# `acknowledgement` from sending the subscription to receiving its
+# acknowledgement and `handshake` from the advertisement to the
+# acknowledgement
+METRICS = ('processing', 'acknowledgement', 'handshake')
+# The columns of a timings file
+TIMING_FIELDS = (
+    'src_ip', 'src_port', 'dst_port', 'priority', 'advertised_ns',
+    'subscribed_ns', 'acknowledged_ns'
+) + tuple(f'{metric}_ns' for metric in METRICS)
+# The maximum number of streams whose timings are kept
+DEFAULT_MAX_TIMINGS = 65536
+
+
+class P2Quantile:
+    """
+    Estimates a quantile of a stream of values in constant memory with the
+    P² algorithm (Jain and Chlamtac, 1985): five markers track the minimum,
+    the maximum, the quantile and two values in between, and are adjusted
+    with a piecewise-parabolic interpolation after every value.
+
+    Attributes
+    ----------
+    p
+        The quantile to estimate, between 0 and 1
+    count
+        The number of values added
+    """
+    def __init__(self, p):
+        assert 0 < p < 1
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [0, 1, 2, 3, 4]
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        heights = self._heights
+        self.count += 1
+        if self.count <= 5:
+            heights.append(value)
+            if self.count == 5:
+                heights.sort()
+            return
+
+        # Find the cell of the value and shift the markers above it
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            offset = self._desired[i] - positions[i]
+            if offset >= 1 and positions[i + 1] - positions[i] > 1 or \
+                    offset <= -1 and positions[i - 1] - positions[i] < -1:
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (
+                        heights[i + step] - heights[i]
+                    ) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        heights = self._heights
+        positions = self._positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) *
+            (heights[i + 1] - heights[i]) /
+            (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - step) *
+            (heights[i] - heights[i - 1]) /
+            (positions[i] - positions[i - 1])
+        )
+
+    def value(self):
+        """ The current estimate, exact for up to five values, None without
+        any value
+        """
+        if not self.count:
+            return None
+        if self.count < 5:
+            heights = sorted(self._heights)
+            return heights[round(self.p * (len(heights) - 1))]
+        return self._heights[2]
+
+
+class LatencyStatistics:
+    """
+    Streaming summary of a latency metric
+
+    Attributes
+    ----------
+    count
+        The number of values added
+    minimum
+        The smallest value, None without any value
+    maximum
+        The largest value, None without any value
+    """
+    def __init__(self, quantiles=QUANTILES):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.quantiles = [P2Quantile(p) for p in quantiles]
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        for quantile in self.quantiles:
+            quantile.add(value)
+
+    def summary(self):
+        """ The statistics as a dict of `count`, `min`, `mean`, `max` and
+        every estimated quantile, e.g. `p99`
+        """
+        summary = {
+            'count': self.count,
+            'min': self.minimum,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.maximum,
+        }
+        for quantile in self.quantiles:
+            summary[f'p{quantile.p * 100:g}'] = quantile.value()
+        return summary
+
+
+class StreamTiming:
+    """
+    The handshake timestamps of a stream at a listener, taken with
+    `time.perf_counter_ns`
+
+    Attributes
+    ----------
+    reservation
+        The answered advertisement
+    advertised_ns
+        The time the advertisement was received
+    subscribed_ns
+        The time the subscription was sent
+    acknowledged_ns
+        The time the acknowledgement was received, None until it is
+    """
+    __slots__ = (
+        'reservation', 'advertised_ns', 'subscribed_ns', 'acknowledged_ns'
+    )
+
+    def __init__(self, reservation, advertised_ns, subscribed_ns):
+        self.reservation = reservation
+        self.advertised_ns = advertised_ns
+        self.subscribed_ns = subscribed_ns
+        self.acknowledged_ns = None
+
+    def intervals(self):
+        """ The `METRICS` of the stream in nanoseconds, None if unknown """
+        if self.acknowledged_ns is None:
+            return (self.subscribed_ns - self.advertised_ns, None, None)
+        return (
+            self.subscribed_ns - self.advertised_ns,
+            self.acknowledged_ns - self.subscribed_ns,
+            self.acknowledged_ns - self.advertised_ns,
+        )
+
+    def to_row(self):
+        reservation = self.reservation
+        return dict(zip(TIMING_FIELDS, (
+            reservation.src_ip, reservation.src_port, reservation.dst_port,
+            reservation.priority, self.advertised_ns, self.subscribed_ns,
+            self.acknowledged_ns
+        ) + self.intervals()))
+
+
+class LatencyRecorder:
+    """
+    Records the handshake timings of the streams a listener answers and
+    keeps streaming statistics of every metric in `METRICS`.
+
+    Only the timings of the most recently answered `max_timings` streams
+    are kept, the statistics cover all streams.
+
+    Attributes
+    ----------
+    timings
+        The `StreamTiming` of every stream by advertisement
+    statistics
+        The `LatencyStatistics` of every metric by name
+    """
+    def __init__(self, max_timings=DEFAULT_MAX_TIMINGS, quantiles=QUANTILES):
+        self.max_timings = max_timings
+        self.timings = OrderedDict()
+        self.statistics = {
+            metric: LatencyStatistics(quantiles) for metric in METRICS
+        }
+        self._lock = threading.Lock()
+
+    def subscribed(self, advertisement, advertised_ns, subscribed_ns):
+        """ Records that an advertisement was answered, restarting the
+        timing of a stream that was already answered before
+        """
+        with self._lock:
+            self.timings[advertisement] = StreamTiming(
+                advertisement, advertised_ns, subscribed_ns
+            )
+            self.timings.move_to_end(advertisement)
+            if len(self.timings) > self.max_timings:
+                self.timings.popitem(last=False)
+            self.statistics['processing'].add(subscribed_ns - advertised_ns)
+
+    def acknowledged(self, acknowledgement, acknowledged_ns):
+        """ Records the first acknowledgement of a subscription
+
+        Returns
+        -------
+        bool
+            Whether the acknowledgement completed a recorded handshake
+        """
+        with self._lock:
+            timing = self.timings.get(acknowledgement)
+            if timing is None or timing.acknowledged_ns is not None:
+                return False
+            timing.acknowledged_ns = acknowledged_ns
+            (_, acknowledgement_ns, handshake_ns) = timing.intervals()
+            self.statistics['acknowledgement'].add(acknowledgement_ns)
+            self.statistics['handshake'].add(handshake_ns)
+            return True
+
+    def summary(self):
+        """ The summary of every metric by name, see
+        `LatencyStatistics.summary`
+        """
+        with self._lock:
+            return {
+                metric: statistics.summary()
+                for (metric, statistics) in self.statistics.items()
+            }
+
+    def rows(self):
+        """ The timings of all kept streams, see `TIMING_FIELDS` """
+        with self._lock:
+            return [timing.to_row() for timing in self.timings.values()]
+
+    def write_statistics(self, path):
+        """ Writes the summary of every metric to a .json file or, for any
+        other extension, to a CSV file with one row per metric
+        """
+        summary = self.summary()
+        if path.endswith('.json'):
+            with open(path, 'w') as json_file:
+                json.dump(summary, json_file, indent=2)
+            return
+        fields = ['metric'] + list(next(iter(summary.values())))
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fields)
+            writer.writeheader()
+            for (metric, values) in summary.items():
+                writer.writerow(dict(values, metric=metric))
+
+    def write_timings(self, path):
+        """ Writes the kept timings to a .json file or, for any other
+        extension, to a CSV file, see `TIMING_FIELDS`
+        """
+        rows = self.rows()
+        if path.endswith('.json'):
+            with open(path, 'w') as json_file:
+                json.dump(rows, json_file, indent=2)
+            return
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=TIMING_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
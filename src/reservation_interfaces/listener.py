@@ -1,10 +1,15 @@
-from scapy.all import AsyncSniffer
-from scapy.config import conf
-from scapy.layers.inet import IP, UDP
-from scapy.layers.l2 import Ether
+import time
 
-
-from .util import BROADCAST_MAC, ReservationPacket, Reservation
+from .capture import ReservationCapture
+from .event_log import ACKNOWLEDGED, ANSWERED, DEFAULT_EVENT_LOG_SIZE, \
+    IGNORED, EventLog
+from .latency_stats import DEFAULT_MAX_TIMINGS, LatencyRecorder
+from .sender import FrameSender
+from .subscription_policy import DEFAULT_ACK_TIMEOUT, DEFAULT_MAX_STREAMS, \
+    DEFAULT_SUBSCRIPTION_TTL, SubscriptionCache
+from .util import Reservation
+from .wire import ACKNOWLEDGEMENT, ADVERTISEMENT, MAX_BUNDLE_RESERVATIONS, \
+    RESERVATION_PORT, SUBSCRIPTION
 
 
 class Listener:
@@ -12,6 +17,10 @@ class Listener:
     A wrapper for receiving and answering stream advertisements in a TSN
     network.
 
+    The advertisements received in one frame are answered together, a
+    bundle of advertisements with a bundle of subscriptions to every talker,
+    a single advertisement with a single subscription.
+
     Attributes
     ----------
     interface
@@ -20,53 +29,101 @@ class Listener:
         The IPv4 address used as the source in answers
     mac
         The MAC address used as the source in answers
+    subscriptions
+        The `SubscriptionCache` deciding which advertisements are answered
+    latency
+        The `LatencyRecorder` timing the handshake of every answered stream
+    events
+        The `EventLog` of answered advertisements and received
+        acknowledgements
     """
-    def __init__(self, interface, ip, mac):
+    def __init__(self, interface, ip, mac, policy=None,
+                 ttl=DEFAULT_SUBSCRIPTION_TTL, ack_timeout=DEFAULT_ACK_TIMEOUT,
+                 max_streams=DEFAULT_MAX_STREAMS,
+                 max_timings=DEFAULT_MAX_TIMINGS,
+                 event_log_size=DEFAULT_EVENT_LOG_SIZE):
+        """
+        Parameters
+        ----------
+        policy, optional
+            The `SubscriptionPolicy` selecting the streams to subscribe to
+            (default is all streams)
+        ttl, optional
+            The time in seconds an answered stream is not answered again,
+            see `SubscriptionCache`
+        ack_timeout, optional
+            The time in seconds after which a stream is answered again if
+            its subscription was not acknowledged
+        max_streams, optional
+            The maximum number of streams remembered
+        max_timings, optional
+            The maximum number of streams whose handshake timings are kept
+        event_log_size, optional
+            The maximum number of events kept
+        """
         self.interface = interface
         self.ip = ip
         self.mac = mac
-        self.socket = conf.L2socket(iface=self.interface)
-        self.sniffer = AsyncSniffer(
-            iface=self.interface,
-            filter="inbound and dst portrange 999-1000",
-            prn=lambda p: self._handle_packet(p)
+        self.sender = FrameSender(
+            self.interface, self.mac, self.ip,
+            max_bundle=MAX_BUNDLE_RESERVATIONS
+        )
+        self.subscriptions = SubscriptionCache(
+            policy, ttl, ack_timeout, max_streams
+        )
+        self.latency = LatencyRecorder(max_timings)
+        self.events = EventLog(event_log_size)
+        self.capture = ReservationCapture(
+            self.interface, [ADVERTISEMENT, ACKNOWLEDGEMENT], bundles=True
         )
-        self.answered_advertisements = set()
-        self.subscribed_streams = set()
-        self.sniffer.start()
+        self.capture.start(self._handle_packet)
 
-    def _handle_packet(self, raw_packet):
-        try:
-            packet = ReservationPacket(raw_packet[3])
-            if packet.status == 0:
-                self._handle_advertisement(Reservation(packet))
-            elif packet.status == 2:
-                self._handle_acknowledgement(Reservation(packet))
-            else:
-                return
-        except Exception:
-            print("Received a non-advertisement packet")
-            return
+    @property
+    def subscribed_streams(self):
+        """ The acknowledged subscriptions still remembered """
+        return set(self.subscriptions.subscribed_streams())
+
+    def _handle_packet(self, status, records):
+        received_ns = time.perf_counter_ns()
+        if status == ADVERTISEMENT:
+            answered = [
+                advertisement for advertisement in (
+                    Reservation(**fields) for fields in records
+                ) if self._handle_advertisement(advertisement)
+            ]
+            self.sender.flush()
+            sent_ns = time.perf_counter_ns()
+            for advertisement in answered:
+                self.latency.subscribed(advertisement, received_ns, sent_ns)
+                self.events.record(ANSWERED, advertisement)
+        elif status == ACKNOWLEDGEMENT:
+            for fields in records:
+                self._handle_acknowledgement(
+                    Reservation(**fields), received_ns
+                )
 
     def _handle_advertisement(self, advertisement: Reservation):
-        approval = advertisement.to_subscription_packet(self.ip)
-        self.socket.send(
-            Ether(src=self.mac, dst=BROADCAST_MAC) /
-            IP(src=self.ip, dst=advertisement.src_ip) /
-            UDP(dport=1000, sport=1000) /
-            approval
-        )
-        self.answered_advertisements.add(advertisement)
-        print(
-            f"Answered advertisement for {advertisement.signature()} "
-            f"with accMaxD of {advertisement.acc_max_delay}"
+        """ Queues the subscription to an advertisement if it is answered
+
+        Returns
+        -------
+        bool
+            Whether the advertisement is answered
+        """
+        if not self.subscriptions.should_answer(advertisement):
+            self.events.record(IGNORED, advertisement)
+            return False
+        subscription = advertisement.copy()
+        subscription.dst_ip = self.ip
+        self.sender.queue(
+            advertisement.src_ip, RESERVATION_PORT, RESERVATION_PORT,
+            SUBSCRIPTION, subscription
         )
+        return True
 
-    def _handle_acknowledgement(self, acknowledgement: Reservation):
-        if acknowledgement in self.answered_advertisements and \
-           acknowledgement.dst_ip == self.ip:
-            self.subscribed_streams.add(acknowledgement)
-            print(
-                f"Receieved acknowledgement for {acknowledgement.signature()} "
-                f"with accMaxD of {acknowledgement.acc_max_delay}"
-            )
+    def _handle_acknowledgement(self, acknowledgement: Reservation,
+                                received_ns):
+        if acknowledgement.dst_ip == self.ip and \
+           self.subscriptions.acknowledge(acknowledgement):
+            self.latency.acknowledged(acknowledgement, received_ns)
+            self.events.record(ACKNOWLEDGED, acknowledgement)
@@ -0,0 +1,276 @@
+import asyncio
+import csv
+import random
+import threading
+import time
+
+from .wire import ADVERTISEMENT, RESERVATION_PORT
+
+# Arrival processes of new advertisements
+POISSON = 'poisson'
+CONSTANT = 'constant'
+ARRIVAL_PROCESSES = (POISSON, CONSTANT)
+
+# The columns of a result file. `id` is the stream's destination port and
+# `out`, `in` and `delay` are in seconds relative to the first advertisement,
+# as used by the subscription delay graphs
+RECORD_FIELDS = (
+    'id', 'template', 'priority', 'listener', 'out', 'in', 'delay',
+    'advertised_ns', 'subscribed_ns', 'acknowledged_ns'
+)
+
+
+def arrival_offsets(process, rate, n, rng=random):
+    """ The send times of `n` advertisements
+
+    Parameters
+    ----------
+    process
+        One of `ARRIVAL_PROCESSES`
+    rate
+        The mean number of advertisements per second
+    n
+        The number of advertisements
+    rng, optional
+        The random number generator for Poisson arrivals
+
+    Returns
+    -------
+    list
+        The offset in seconds of every advertisement from the start of the
+        run
+    """
+    assert process in ARRIVAL_PROCESSES
+    assert rate > 0
+    if process == CONSTANT:
+        return [i / rate for i in range(n)]
+    offsets = []
+    offset = 0.0
+    for _ in range(n):
+        offsets.append(offset)
+        # The intervals between arrivals of a Poisson process are
+        # exponentially distributed
+        offset += rng.expovariate(rate)
+    return offsets
+
+
+class StreamRecord:
+    """
+    The timestamps of a single stream of a load run, taken with
+    `time.perf_counter_ns`
+
+    Attributes
+    ----------
+    advertisement
+        The advertised stream
+    template
+        The index of the stream template the stream was created from
+    advertised_ns
+        The time the advertisement was sent
+    subscribed_ns
+        The time the first subscription was received, None if there was none
+    acknowledged_ns
+        The time the acknowledgement of that subscription was sent
+    listener
+        The IP address of the first subscribed listener
+    """
+    __slots__ = (
+        'advertisement', 'template', 'advertised_ns', 'subscribed_ns',
+        'acknowledged_ns', 'listener'
+    )
+
+    def __init__(self, advertisement, template, advertised_ns):
+        self.advertisement = advertisement
+        self.template = template
+        self.advertised_ns = advertised_ns
+        self.subscribed_ns = None
+        self.acknowledged_ns = None
+        self.listener = None
+
+    def to_row(self, start_ns):
+        """ The record as a row of `RECORD_FIELDS`, with times relative to
+        `start_ns`
+        """
+        def seconds(ns):
+            return None if ns is None else (ns - start_ns) / 1e9
+
+        delay = None
+        if self.subscribed_ns is not None:
+            delay = (self.subscribed_ns - self.advertised_ns) / 1e9
+        return {
+            'id': self.advertisement.dst_port,
+            'template': self.template,
+            'priority': self.advertisement.priority,
+            'listener': self.listener,
+            'out': seconds(self.advertised_ns),
+            'in': seconds(self.subscribed_ns),
+            'delay': delay,
+            'advertised_ns': self.advertised_ns,
+            'subscribed_ns': self.subscribed_ns,
+            'acknowledged_ns': self.acknowledged_ns,
+        }
+
+
+class LoadGenerator:
+    """
+    Open-loop reservation load for a talker: advertisements are sent at
+    predetermined times regardless of the subscriptions received, each
+    once and without resends.
+
+    Attributes
+    ----------
+    talker
+        The `Talker` sending the advertisements
+    templates
+        Stream specifications as accepted by `Talker.advertise_stream`. An
+        optional `weight` entry sets how often a template is picked
+        (default is 1)
+    rate
+        The mean number of advertisements per second
+    process
+        The arrival process, one of `ARRIVAL_PROCESSES`
+    records
+        The `StreamRecord` of every advertised stream by advertisement
+    """
+
+    def __init__(self, talker, templates, rate, process=POISSON, seed=None):
+        assert templates
+        self.talker = talker
+        self.templates = [dict(template) for template in templates]
+        self.weights = [
+            template.pop('weight', 1) for template in self.templates
+        ]
+        for template in self.templates:
+            template.pop('instances', None)
+            template.pop('dst_port', None)
+        self.rate = rate
+        self.process = process
+        self.rng = random.Random(seed)
+        self.records = {}
+        self._unsubscribed = 0
+        self._all_subscribed = None
+        self._lock = threading.Lock()
+
+    def run(self, n, first_port=2001, drain=5):
+        """ Advertises `n` streams and waits for their subscriptions
+
+        Parameters
+        ----------
+        n
+            The number of streams to advertise
+        first_port, optional
+            The destination port of the first stream, every further stream
+            uses the next port
+        drain, optional
+            The time in seconds to wait for subscriptions after the last
+            advertisement was sent
+
+        Returns
+        -------
+        list
+            The rows of all streams in the order of their advertisement, see
+            `RECORD_FIELDS`
+        """
+        self.talker.subscription_callbacks.append(self._subscription_received)
+        try:
+            self.talker.loop.run_until_complete(
+                self._run(n, first_port, drain)
+            )
+        finally:
+            self.talker.subscription_callbacks.remove(
+                self._subscription_received
+            )
+        return self.rows()
+
+    async def _run(self, n, first_port, drain):
+        loop = self.talker.loop
+        sender = self.talker.sender
+        self._all_subscribed = None
+        picks = self.rng.choices(
+            range(len(self.templates)), weights=self.weights, k=n
+        )
+        offsets = arrival_offsets(self.process, self.rate, n, self.rng)
+
+        start = loop.time()
+        for (i, (template, offset)) in enumerate(zip(picks, offsets)):
+            delay = start + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            advertisement = self.talker._create_advertisement(
+                dst_port=first_port + i, **self.templates[template]
+            )
+            if advertisement is None:
+                continue
+            with self._lock:
+                self.records[advertisement] = StreamRecord(
+                    advertisement, template, time.perf_counter_ns()
+                )
+                self._unsubscribed += 1
+            sender.send(
+                self.talker.broadcast_ip, RESERVATION_PORT, RESERVATION_PORT,
+                ADVERTISEMENT, advertisement
+            )
+
+        # Only created now, so that it is not resolved while streams are
+        # still being advertised
+        self._all_subscribed = loop.create_future()
+        self._subscriptions_complete()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(self._all_subscribed), drain
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    def _subscription_received(self, subscription, subscribed_ns,
+                               acknowledged_ns):
+        """ Internal method. Records the first subscription of a stream,
+        called from the talker's capture thread.
+        """
+        with self._lock:
+            record = self.records.get(subscription)
+            if record is None or record.subscribed_ns is not None:
+                return
+            record.subscribed_ns = subscribed_ns
+            record.acknowledged_ns = acknowledged_ns
+            record.listener = subscription.dst_ip
+            self._unsubscribed -= 1
+            if self._unsubscribed:
+                return
+        self.talker.loop.call_soon_threadsafe(self._subscriptions_complete)
+
+    def _subscriptions_complete(self):
+        if self._all_subscribed is None or self._all_subscribed.done():
+            return
+        if not self._unsubscribed:
+            self._all_subscribed.set_result(True)
+
+    def rows(self):
+        """ The rows of all streams recorded so far, see `RECORD_FIELDS` """
+        with self._lock:
+            records = list(self.records.values())
+        if not records:
+            return []
+        start_ns = records[0].advertised_ns
+        return [record.to_row(start_ns) for record in records]
+
+    def write(self, path):
+        """ Writes the recorded rows to a file, as Parquet if `path` ends in
+        '.parquet' (requires `pandas` and `pyarrow`), otherwise as CSV
+
+        Parameters
+        ----------
+        path
+            The path of the file to write
+        """
+        rows = self.rows()
+        if path.endswith('.parquet'):
+            import pandas as pd
+            pd.DataFrame(rows, columns=RECORD_FIELDS).to_parquet(
+                path, index=False
+            )
+            return
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
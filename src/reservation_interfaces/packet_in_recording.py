@@ -0,0 +1,235 @@
+import collections
+import struct
+import time
+
+# pcapng blocks, see https://www.ietf.org/archive/id/draft-ietf-opsawg-pcapng
+SECTION_HEADER = 0x0a0d0d0a
+INTERFACE_DESCRIPTION = 1
+ENHANCED_PACKET = 6
+BYTE_ORDER_MAGIC = 0x1a2b3c4d
+LINKTYPE_ETHERNET = 1
+# Interface options
+OPTION_END = 0
+OPTION_IF_NAME = 2
+OPTION_IF_TSRESOL = 9
+# Timestamps are recorded in nanoseconds
+NANOSECONDS = 9
+
+# Classic pcap files, as read in little-endian byte order
+PCAP_MAGIC_MICROSECONDS = 0xa1b2c3d4
+PCAP_MAGIC_NANOSECONDS = 0xa1b23c4d
+PCAP_HEADER_LEN = 24
+PCAP_RECORD_HEADER = struct.Struct('IIII')
+
+# A packet-in read from a recording. Its datapath ID and input port are None
+# if the capture did not record them
+RecordedPacketIn = collections.namedtuple(
+    'RecordedPacketIn', ['time', 'datapath_id', 'in_port', 'data']
+)
+
+
+def _padded(data):
+    return data + b'\x00' * (-len(data) % 4)
+
+
+def _option(code, value):
+    return struct.pack('<HH', code, len(value)) + _padded(value)
+
+
+def _block(block_type, body):
+    length = 12 + len(body)
+    return struct.pack('<II', block_type, length) + body + \
+        struct.pack('<I', length)
+
+
+def interface_name(datapath_id, in_port):
+    """ The name of the capture interface of a switch port in a recording """
+    return f'{datapath_id}:{in_port}'
+
+
+def parse_interface_name(name):
+    """ The `(datapath_id, in_port)` of a capture interface written by
+    `PacketInRecorder`, `(None, None)` for other interfaces
+    """
+    try:
+        (datapath_id, in_port) = name.rsplit(':', 1)
+        return (int(datapath_id), int(in_port))
+    except (AttributeError, ValueError):
+        return (None, None)
+
+
+class PacketInRecorder:
+    """
+    Writes the frames of the packet-ins received by the controller to a
+    pcapng file, which can be opened with Wireshark and replayed with
+    `replay_packet_ins.py`.
+
+    Every switch port is described as a capture interface named
+    `datapath_id:in_port`, so that the port a frame was received on is kept.
+
+    Attributes
+    ----------
+    path
+        The path of the recording
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._interfaces = {}
+        self._file.write(_block(
+            SECTION_HEADER,
+            struct.pack('<IHHq', BYTE_ORDER_MAGIC, 1, 0, -1)
+        ))
+
+    def record(self, datapath_id, in_port, data, timestamp_ns=None):
+        """ Appends the frame of a packet-in
+
+        Parameters
+        ----------
+        datapath_id
+            The ID of the switch that sent the packet-in
+        in_port
+            The port the frame was received on
+        data
+            The frame
+        timestamp_ns, optional
+            The time of reception in nanoseconds since the epoch, defaults to
+            now
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        interface = self._interfaces.get((datapath_id, in_port))
+        if interface is None:
+            interface = len(self._interfaces)
+            self._interfaces[(datapath_id, in_port)] = interface
+            name = interface_name(datapath_id, in_port).encode()
+            self._file.write(_block(
+                INTERFACE_DESCRIPTION,
+                struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 0) +
+                _option(OPTION_IF_NAME, name) +
+                _option(OPTION_IF_TSRESOL, bytes([NANOSECONDS])) +
+                _option(OPTION_END, b'')
+            ))
+        data = bytes(data)
+        self._file.write(_block(
+            ENHANCED_PACKET,
+            struct.pack(
+                '<IIIII', interface, timestamp_ns >> 32,
+                timestamp_ns & 0xffffffff, len(data), len(data)
+            ) + _padded(data)
+        ))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def _interface(body, byteorder):
+    """ The `(datapath_id, in_port)` and timestamp resolution in seconds of an
+    interface description block's body
+    """
+    (name, resolution) = (None, 1e-6)
+    position = 8
+    while position + 4 <= len(body):
+        (code, length) = struct.unpack_from(byteorder + 'HH', body, position)
+        if code == OPTION_END:
+            break
+        value = body[position + 4:position + 4 + length]
+        if code == OPTION_IF_NAME:
+            name = value.rstrip(b'\x00').decode(errors='replace')
+        elif code == OPTION_IF_TSRESOL:
+            # The most significant bit selects a power of two
+            resolution = 2.0 ** -(value[0] & 0x7f) if value[0] & 0x80 \
+                else 10.0 ** -value[0]
+        position += 4 + length + (-length % 4)
+    return (parse_interface_name(name), resolution)
+
+
+def _read_pcapng(capture):
+    byteorder = '<'
+    interfaces = []
+    while True:
+        header = capture.read(8)
+        if len(header) < 8:
+            return
+        (block_type,) = struct.unpack('<I', header[:4])
+        if block_type == SECTION_HEADER:
+            magic = capture.read(4)
+            byteorder = '<' if struct.unpack('<I', magic)[0] == \
+                BYTE_ORDER_MAGIC else '>'
+            interfaces = []
+            (length,) = struct.unpack(byteorder + 'I', header[4:])
+            body = magic + capture.read(length - 12)
+        else:
+            (block_type, length) = struct.unpack(byteorder + 'II', header)
+            body = capture.read(length - 8)
+        if len(body) < length - 8:
+            return
+        if block_type == INTERFACE_DESCRIPTION:
+            interfaces.append(_interface(body[:-4], byteorder))
+        elif block_type == ENHANCED_PACKET:
+            (interface, high, low, captured) = struct.unpack_from(
+                byteorder + 'IIII', body
+            )
+            ((datapath_id, in_port), resolution) = interfaces[interface]
+            ticks = (high << 32) | low
+            ticks_per_second = round(1 / resolution)
+            yield RecordedPacketIn(
+                ticks // ticks_per_second +
+                ticks % ticks_per_second * resolution,
+                datapath_id, in_port, body[20:20 + captured]
+            )
+
+
+def _read_pcap(capture, magic):
+    capture.read(PCAP_HEADER_LEN - 4)
+    byteorder = '<' if magic in (
+        PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS
+    ) else '>'
+    if byteorder == '>':
+        (magic,) = struct.unpack('>I', struct.pack('<I', magic))
+    resolution = 1e-9 if magic == PCAP_MAGIC_NANOSECONDS else 1e-6
+    record_header = struct.Struct(byteorder + PCAP_RECORD_HEADER.format)
+    while True:
+        header = capture.read(record_header.size)
+        if len(header) < record_header.size:
+            return
+        (seconds, fraction, captured, _) = record_header.unpack(header)
+        data = capture.read(captured)
+        if len(data) < captured:
+            return
+        yield RecordedPacketIn(seconds + fraction * resolution, None, None,
+                               data)
+
+
+def read_packet_ins(path):
+    """ Reads the packet-ins of a recording written by `PacketInRecorder`
+    in the order they were received
+
+    Other pcap and pcapng captures of reservation frames, e.g. taken at a
+    switch port, can be read as well, but do not record the datapath and
+    input port of their frames.
+
+    Yields
+    ------
+    RecordedPacketIn
+        The time in seconds since the epoch, the datapath ID, the input port
+        and the frame of every packet-in
+    """
+    with open(path, 'rb') as capture:
+        head = capture.read(4)
+        if len(head) < 4:
+            return
+        (magic,) = struct.unpack('<I', head)
+        if magic == SECTION_HEADER:
+            capture.seek(0)
+            yield from _read_pcapng(capture)
+        elif magic in (PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS) or \
+                struct.unpack('>I', head)[0] in (
+                    PCAP_MAGIC_MICROSECONDS, PCAP_MAGIC_NANOSECONDS):
+            yield from _read_pcap(capture, magic)
+        else:
+            raise ValueError(f'{path} is no pcap or pcapng file!')
@@ -0,0 +1,198 @@
+from array import array
+from collections import deque
+import random
+
+# Ports below are reserved for the reservation protocol itself
+FIRST_STREAM_PORT = 1001
+LAST_STREAM_PORT = 2 ** 16 - 1
+# The number of random ports tried before scanning all ports for a free
+# combination
+SCAN_PROBES = 32
+
+
+class PortAllocator:
+    """
+    Allocates unique `(src_port, dst_port)` combinations for streams.
+
+    Every port keeps a count of the combinations using it as source and as
+    destination port. Ports without any combination are kept in shuffled
+    free lists, so that a free combination is found in O(1) by combining a
+    free port with any other: a source port no combination uses yet can be
+    paired with every destination port and vice versa. Ports that get used by
+    a pinned combination while in a free list are skipped lazily.
+
+    Attributes
+    ----------
+    first_port
+        The lowest port to allocate
+    last_port
+        The highest port to allocate
+    combinations
+        The set of all allocated combinations
+    """
+
+    def __init__(self, first_port=FIRST_STREAM_PORT,
+                 last_port=LAST_STREAM_PORT, rng=random):
+        assert 0 < first_port <= last_port <= LAST_STREAM_PORT
+        self.first_port = first_port
+        self.last_port = last_port
+        self.rng = rng
+        self.combinations = set()
+        self._uses = (
+            array('I', bytes(4 * (last_port + 1))),
+            array('I', bytes(4 * (last_port + 1)))
+        )
+        # Whether a port is currently in the free list, to avoid duplicates
+        self._listed = (bytearray(last_port + 1), bytearray(last_port + 1))
+        self._free = (self._shuffled_ports(), self._shuffled_ports())
+        for port in range(first_port, last_port + 1):
+            self._listed[0][port] = self._listed[1][port] = 1
+
+    def __len__(self):
+        return len(self.combinations)
+
+    def __contains__(self, combination):
+        return combination in self.combinations
+
+    def _shuffled_ports(self):
+        ports = list(range(self.first_port, self.last_port + 1))
+        self.rng.shuffle(ports)
+        return deque(ports)
+
+    def _pop_free(self, side):
+        """ Removes and returns a port without any combination on `side`
+        (0 for source, 1 for destination ports), None if there is none
+        """
+        free = self._free[side]
+        uses = self._uses[side]
+        listed = self._listed[side]
+        while free:
+            port = free.popleft()
+            listed[port] = 0
+            if not uses[port]:
+                return port
+        return None
+
+    def _scan(self, src_port, dst_port):
+        """ Finds a free combination for one pinned port once all ports of
+        the other side are in use. Random ports are tried first, which
+        succeeds in O(1) unless the pinned port is nearly exhausted, then all
+        ports in O(number of ports)
+        """
+        for _ in range(SCAN_PROBES):
+            port = self.rng.randint(self.first_port, self.last_port)
+            combination = (port, dst_port) if src_port is None \
+                else (src_port, port)
+            if combination not in self.combinations:
+                return combination
+        for port in range(self.first_port, self.last_port + 1):
+            combination = (port, dst_port) if src_port is None \
+                else (src_port, port)
+            if combination not in self.combinations:
+                return combination
+        raise ValueError('No free port combination left!')
+
+    def allocate(self, src_port=None, dst_port=None):
+        """ Allocates a free port combination
+
+        Parameters
+        ----------
+        src_port, optional
+            A pinned source port, otherwise a free one is chosen
+        dst_port, optional
+            A pinned destination port, otherwise a free one is chosen
+
+        Returns
+        -------
+        (src_port, dst_port)
+            The allocated combination
+
+        Raises
+        ------
+        ValueError
+            If both ports are pinned and the combination is in use, or if no
+            free combination is left
+        """
+        if src_port is not None and dst_port is not None:
+            if (src_port, dst_port) in self.combinations:
+                raise ValueError('Port combination already in use!')
+            combination = (src_port, dst_port)
+
+        elif src_port is None and dst_port is None:
+            src_port = self._pop_free(0)
+            dst_port = self._pop_free(1)
+            if src_port is not None:
+                # An unused source port can be combined with any destination
+                if dst_port is None:
+                    dst_port = self.rng.randint(
+                        self.first_port, self.last_port
+                    )
+                combination = (src_port, dst_port)
+            elif dst_port is not None:
+                combination = (
+                    self.rng.randint(self.first_port, self.last_port),
+                    dst_port
+                )
+            else:
+                combination = self._scan(
+                    self.rng.randint(self.first_port, self.last_port), None
+                )
+
+        elif src_port is None:
+            src_port = self._pop_free(0)
+            combination = (src_port, dst_port) if src_port is not None \
+                else self._scan(None, dst_port)
+
+        else:
+            dst_port = self._pop_free(1)
+            combination = (src_port, dst_port) if dst_port is not None \
+                else self._scan(src_port, None)
+
+        self.combinations.add(combination)
+        self._uses[0][combination[0]] += 1
+        self._uses[1][combination[1]] += 1
+        return combination
+
+    def allocate_many(self, n, src_port=None, dst_port=None):
+        """ Allocates `n` free port combinations at once, e.g. for the
+        `instances` of a stream specification, see `allocate`
+
+        Returns
+        -------
+        list
+            The allocated combinations
+        """
+        combinations = []
+        try:
+            for _ in range(n):
+                combinations.append(self.allocate(src_port, dst_port))
+        except ValueError:
+            for combination in combinations:
+                self.release(combination)
+            raise
+        return combinations
+
+    def release(self, combination):
+        """ Returns a port combination, making its ports available again
+
+        Parameters
+        ----------
+        combination
+            A `(src_port, dst_port)` tuple returned by `allocate`
+
+        Returns
+        -------
+        bool
+            Whether the combination was allocated
+        """
+        if combination not in self.combinations:
+            return False
+        self.combinations.remove(combination)
+        for side in (0, 1):
+            port = combination[side]
+            self._uses[side][port] -= 1
+            if not self._uses[side][port] and not self._listed[side][port] \
+                    and self.first_port <= port <= self.last_port:
+                self._listed[side][port] = 1
+                self._free[side].append(port)
+        return True
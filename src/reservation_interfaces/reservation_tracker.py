@@ -0,0 +1,361 @@
+from functools import partial
+import random
+import threading
+
+from .timer_wheel import TimerWheel
+
+# The resolution in seconds of the resend scheduler
+RESEND_TICK = 0.01
+# The interval in seconds in which subscribed advertisements are refreshed,
+# matching the controller's `REFRESH_INTERVAL`
+DEFAULT_REFRESH_INTERVAL = 10
+
+
+class ReservationResult:
+    """
+    The outcome of a stream's reservation, to which the futures returned by
+    `Talker.advertise_stream` and `Talker.advertise_streams` resolve
+
+    Attributes
+    ----------
+    advertisement
+        The advertised stream
+    required
+        The number of listeners that had to subscribe
+    subscribed
+        Whether `required` listeners subscribed in time
+    delays
+        The accumulated `(acc_min_delay, acc_max_delay)` in µs along the path
+        to every subscribed listener by the listener's IP address
+    advertised
+        The time of the first advertisement according to `time.monotonic`
+    latency
+        The time in seconds from the first advertisement to the subscription
+        completing the reservation, None if it failed
+    """
+
+    def __init__(self, advertisement, required, advertised):
+        self.advertisement = advertisement
+        self.required = required
+        self.subscribed = False
+        self.delays = {}
+        self.advertised = advertised
+        self.latency = None
+
+    @property
+    def listeners(self):
+        """ The IP addresses of the subscribed listeners """
+        return set(self.delays)
+
+    def __bool__(self):
+        return self.subscribed
+
+
+class ReservationTracker:
+    """
+    The reservation and resend bookkeeping of a talker's streams.
+
+    Every tracked advertisement is resent each `timeout` seconds, see
+    `backoff` and `jitter`, until enough listeners subscribed or its resends
+    are used up, and is refreshed each `refresh_interval` seconds as long as
+    it has any subscriptions. The reservation of every advertisement
+    resolves a future to its `ReservationResult`.
+
+    All resends and refreshes are driven by a `TimerWheel`, which several
+    trackers may share together with its lock, see `EndpointRuntime`.
+    `subscribe`, `advance` and `resend` may be called from any thread, all
+    other methods only from the event loop's thread.
+
+    Attributes
+    ----------
+    loop
+        The event loop resolving the futures
+    send
+        Called with every advertisement that is due to be resent or
+        refreshed, queueing it for sending
+    timeout
+        The time in seconds until an advertisement is resent, None to never
+        resend
+    resends
+        The number of times an advertisement would be resent, None for no
+        limit
+    jitter
+        The fraction by which every resend interval is randomly shortened or
+        prolonged, so that resends of streams advertised together spread out
+    backoff
+        The factor by which the resend interval grows after every resend,
+        1 for a constant interval
+    max_timeout
+        The upper bound in seconds of the growing resend interval, None for
+        no bound
+    refresh_interval
+        The interval in seconds in which subscribed advertisements are resent
+        to keep them from expiring on the switches, None to never refresh
+    ports
+        The `PortAllocator` the port combinations of withdrawn streams are
+        released to, None to keep them
+    advertised_streams
+        The advertisements of all streams not withdrawn
+    stream_subscriptions
+        The IP addresses of the subscribed listeners by advertisement
+    pending_subscriptions
+        The future, `ReservationResult` and deadline timer of every
+        advertisement still waiting for subscriptions
+    wheel
+        The timer wheel of the resends and refreshes
+    lock
+        The lock guarding `wheel` and the resend state
+    """
+
+    def __init__(self, loop, send, timeout, resends, jitter=0.1, backoff=1,
+                 max_timeout=None, refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 ports=None, wheel=None, lock=None):
+        self.loop = loop
+        self.send = send
+        self.timeout = timeout
+        self.resends = resends
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_timeout = max_timeout
+        self.refresh_interval = refresh_interval
+        self.ports = ports
+        self.advertised_streams = set()
+        self.stream_subscriptions = {}
+        self.pending_subscriptions = {}
+        self.wheel = TimerWheel(tick=RESEND_TICK, slots=1024) \
+            if wheel is None else wheel
+        self.lock = threading.Lock() if lock is None else lock
+        # The number of sends and the current interval of every advertisement
+        # that is resent, and the number of listeners it waits for
+        self.resend_state = {}
+        self.required_subscriptions = {}
+
+    def track(self, advertisement, subscriptions=1, deadline=None):
+        """ Starts the reservation of a stream, whose first advertisement the
+        caller sends right after
+
+        Parameters
+        ----------
+        advertisement
+            The advertisement of the stream
+        subscriptions, optional
+            The number of listeners that must subscribe to the stream for its
+            reservation to succeed (default is 1)
+        deadline, optional
+            The time in seconds after which the reservation fails if not
+            enough listeners have subscribed. Without a deadline, it fails
+            once the stream's resends are used up, and without a `timeout`
+            it waits for its subscriptions for as long as it takes
+
+        Returns
+        -------
+        asyncio.Future
+            Resolves to the stream's `ReservationResult`
+        """
+        self.advertised_streams.add(advertisement)
+        result = ReservationResult(
+            advertisement, subscriptions, self.loop.time()
+        )
+        future = self.loop.create_future()
+        deadline_handle = None
+        if deadline is not None:
+            deadline_handle = self.loop.call_later(
+                deadline, self._timed_out, advertisement
+            )
+        self.pending_subscriptions[advertisement] = \
+            (future, result, deadline_handle)
+        future.add_done_callback(
+            partial(self._reservation_done, advertisement)
+        )
+        with self.lock:
+            self.required_subscriptions[advertisement] = subscriptions
+            if self.timeout:
+                self.resend_state[advertisement] = (1, self.timeout)
+                self._schedule(advertisement, self.timeout)
+        return future
+
+    def subscribe(self, subscription):
+        """ Adds a listener's subscription to `stream_subscriptions`. Stops
+        resending the advertisement once enough listeners subscribed and
+        refreshes it from now on; until then, it is refreshed if it is not
+        resent.
+
+        Parameters
+        ----------
+        subscription
+            The received subscription
+
+        Returns
+        -------
+        bool
+            Whether the subscribed stream is advertised
+        """
+        if subscription not in self.advertised_streams:
+            return False
+        listeners = self.stream_subscriptions.setdefault(subscription, set())
+        listeners.add(subscription.dst_ip)
+        with self.lock:
+            if len(listeners) >= \
+                    self.required_subscriptions.get(subscription, 1):
+                self._stop_resending(subscription)
+            else:
+                self._schedule_refresh(subscription)
+        return True
+
+    def subscription_received(self, subscription, received=None):
+        """ Adds a listener to a pending reservation and resolves it once
+        enough listeners have subscribed
+
+        Parameters
+        ----------
+        subscription
+            The received subscription
+        received, optional
+            The time of reception according to `time.monotonic`, defaults to
+            now
+        """
+        pending = self.pending_subscriptions.get(subscription)
+        if pending is None or pending[0].done():
+            return
+        (future, result, _) = pending
+        result.delays[subscription.dst_ip] = (
+            subscription.acc_min_delay, subscription.acc_max_delay
+        )
+        if len(result.delays) >= result.required:
+            if received is None:
+                received = self.loop.time()
+            result.subscribed = True
+            result.latency = received - result.advertised
+            future.set_result(result)
+
+    def withdraw(self, advertisement):
+        """ Stops resending and refreshing a stream, fails its reservation if
+        it is pending and releases its port combination. Its reservations on
+        the switches expire once they are no longer refreshed.
+
+        Parameters
+        ----------
+        advertisement
+            The advertisement of the stream to withdraw
+        """
+        with self.lock:
+            self.required_subscriptions.pop(advertisement, None)
+            self.resend_state.pop(advertisement, None)
+            self.wheel.cancel(advertisement)
+        pending = self.pending_subscriptions.get(advertisement)
+        if pending is not None and not pending[0].done():
+            pending[0].set_result(pending[1])
+        self.advertised_streams.discard(advertisement)
+        self.stream_subscriptions.pop(advertisement, None)
+        if self.ports is not None:
+            self.ports.release(
+                (advertisement.src_port, advertisement.dst_port)
+            )
+
+    def advance(self, now=None):
+        """ Resends or refreshes every advertisement whose interval has
+        passed, see `resend`
+
+        Parameters
+        ----------
+        now, optional
+            The current time, defaults to the wheel's clock
+
+        Returns
+        -------
+        int
+            The number of advertisements sent
+        """
+        with self.lock:
+            return sum(
+                self.resend(advertisement)
+                for advertisement in self.wheel.advance(now)
+            )
+
+    def resend(self, advertisement):
+        """ Resends or refreshes an advertisement taken from the wheel, or
+        gives up on it once its resends are used up. The caller must hold
+        `lock`.
+
+        Returns
+        -------
+        bool
+            Whether the advertisement was sent
+        """
+        state = self.resend_state.get(advertisement)
+        if state is None:
+            # Subscribed advertisement that is due for a refresh
+            interval = self.refresh_interval
+        else:
+            (sends, interval) = state
+            if self.resends is not None and sends > self.resends:
+                self._stop_resending(advertisement)
+                self.loop.call_soon_threadsafe(
+                    self._resends_exhausted, advertisement
+                )
+                return False
+            interval *= self.backoff
+            if self.max_timeout is not None:
+                interval = min(interval, self.max_timeout)
+            self.resend_state[advertisement] = (sends + 1, interval)
+        self.send(advertisement)
+        self._schedule(advertisement, interval)
+        return True
+
+    def _schedule(self, advertisement, interval):
+        """ Internal method. Schedules the next resend of an advertisement
+        `interval` seconds from now, randomized by `jitter`. The caller must
+        hold `lock`.
+        """
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.wheel.schedule(advertisement, interval)
+
+    def _stop_resending(self, advertisement):
+        """ Internal method. Cancels the resends of an advertisement, which
+        is only refreshed from now on if it has any subscriptions, whether or
+        not it was resent before. The caller must hold `lock`.
+        """
+        self.required_subscriptions.pop(advertisement, None)
+        if self.resend_state.pop(advertisement, None) is not None:
+            self.wheel.cancel(advertisement)
+        self._schedule_refresh(advertisement)
+
+    def _schedule_refresh(self, advertisement):
+        """ Internal method. Schedules the refresh of an advertisement with
+        subscriptions unless it is already due to be resent or refreshed, so
+        that every subscription does not postpone it. The caller must hold
+        `lock`.
+        """
+        if self.refresh_interval and \
+                advertisement in self.stream_subscriptions and \
+                advertisement not in self.wheel:
+            self._schedule(advertisement, self.refresh_interval)
+
+    def _reservation_done(self, advertisement, future):
+        """ Internal method. Forgets a resolved reservation """
+        (_, _, deadline_handle) = self.pending_subscriptions.pop(advertisement)
+        if deadline_handle is not None:
+            deadline_handle.cancel()
+
+    def _resends_exhausted(self, advertisement):
+        """ Internal method. Fails a reservation without deadline once its
+        resends are used up
+        """
+        pending = self.pending_subscriptions.get(advertisement)
+        if pending is not None and pending[2] is None:
+            self._timed_out(advertisement)
+
+    def _timed_out(self, advertisement):
+        """ Internal method. Fails a pending reservation, withdrawing its
+        stream if no listener subscribed at all
+        """
+        pending = self.pending_subscriptions.get(advertisement)
+        if pending is None or pending[0].done():
+            return
+        with self.lock:
+            self._stop_resending(advertisement)
+        pending[0].set_result(pending[1])
+        if advertisement not in self.stream_subscriptions:
+            # Without any subscription the stream expires
+            self.withdraw(advertisement)
@@ -0,0 +1,253 @@
+import socket
+import struct
+import threading
+
+from .wire import BROADCAST_MAC, ETHER_HEADER_LEN, IP_HEADER_LEN, \
+    RESERVATION_OFFSET, RESERVATION_STRUCT, UDP_HEADER_LEN, bundle_len, \
+    internet_checksum, ip_to_bytes, join_bundle, pack_reservation, \
+    pack_reservation_into, partial_checksum
+
+ETH_P_IP = 0x0800
+IP_PROTO_UDP = 17
+DEFAULT_TTL = 64
+
+FRAME_LEN = RESERVATION_OFFSET + RESERVATION_STRUCT.size
+UDP_CHECKSUM_OFFSET = ETHER_HEADER_LEN + IP_HEADER_LEN + 6
+
+
+def mac_to_bytes(mac):
+    return bytes(int(part, 16) for part in mac.split(':'))
+
+
+class FrameTemplate:
+    """
+    The prebuilt Ethernet, IPv4 and UDP headers of all reservation frames
+    of one payload size sent from one source to one destination address and
+    port.
+
+    The headers are identical to those crafted by scapy for
+    `Ether() / IP() / UDP() / ReservationPacket`, including the IPv4 header
+    checksum. Only the reservation and the UDP checksum differ between frames,
+    for the latter the sum over the pseudo header and the UDP header is
+    precalculated.
+
+    Attributes
+    ----------
+    frame_len
+        The size in Byte of the frames
+    """
+    def __init__(self, src_mac, dst_mac, src_ip, dst_ip, src_port, dst_port,
+                 payload_len=RESERVATION_STRUCT.size):
+        udp_len = UDP_HEADER_LEN + payload_len
+        ip_header = bytearray(struct.pack(
+            '!BBHHHBBH4s4s',
+            0x45, 0, IP_HEADER_LEN + udp_len, 1, 0, DEFAULT_TTL,
+            IP_PROTO_UDP, 0, ip_to_bytes(src_ip), ip_to_bytes(dst_ip)
+        ))
+        struct.pack_into('!H', ip_header, 10, internet_checksum(ip_header))
+        udp_header = struct.pack('!HHHH', src_port, dst_port, udp_len, 0)
+
+        self.frame_len = RESERVATION_OFFSET + payload_len
+        self.header = mac_to_bytes(dst_mac) + mac_to_bytes(src_mac) + \
+            struct.pack('!H', ETH_P_IP) + bytes(ip_header) + udp_header
+        self.pseudo_header_sum = partial_checksum(
+            ip_to_bytes(src_ip) + ip_to_bytes(dst_ip) +
+            struct.pack('!BBH', 0, IP_PROTO_UDP, udp_len) + udp_header
+        )
+
+    def write_into(self, buffer, offset, status, reservation):
+        """ Writes a complete frame for a reservation into a buffer
+
+        Parameters
+        ----------
+        buffer
+            A writable buffer with at least `frame_len` Byte after `offset`
+        offset
+            The position in `buffer` at which to write the frame
+        status
+            The status of the reservation packet
+        reservation
+            An object with the attributes of a `Reservation`
+        """
+        buffer[offset:offset + RESERVATION_OFFSET] = self.header
+        pack_reservation_into(
+            buffer, offset + RESERVATION_OFFSET, status, reservation
+        )
+        checksum = internet_checksum(
+            buffer[offset + RESERVATION_OFFSET:offset + self.frame_len],
+            self.pseudo_header_sum
+        )
+        # A computed checksum of zero is transmitted as all ones
+        struct.pack_into(
+            '!H', buffer, offset + UDP_CHECKSUM_OFFSET, checksum or 0xffff
+        )
+
+    def write_payload_into(self, buffer, offset, payload):
+        """ Writes a complete frame for an encoded payload, e.g. a bundle,
+        into a buffer, see `write_into`
+        """
+        buffer[offset:offset + RESERVATION_OFFSET] = self.header
+        end = offset + self.frame_len
+        buffer[offset + RESERVATION_OFFSET:end] = payload
+        checksum = internet_checksum(
+            buffer[offset + RESERVATION_OFFSET:end], self.pseudo_header_sum
+        )
+        struct.pack_into(
+            '!H', buffer, offset + UDP_CHECKSUM_OFFSET, checksum or 0xffff
+        )
+
+
+class FrameSender:
+    """
+    Sends reservation frames through a single raw `AF_PACKET` socket.
+
+    Frames are written from cached header templates into one reusable buffer
+    and queued until `flush` is called or `batch_size` frames are pending.
+    With a `max_bundle` above 1, queued reservations of the same status to
+    the same destination are sent together as bundles of up to `max_bundle`
+    reservations, see `wire.join_bundle`.
+
+    Attributes
+    ----------
+    interface
+        The system's interface to send the frames from
+    mac
+        The MAC address used as the source of all frames
+    ip
+        The IPv4 address used as the source of frames without an own
+        `src_ip`
+    batch_size
+        The number of frames queued before they are flushed automatically
+    max_bundle
+        The maximum number of reservations sent in one frame
+    frames_sent
+        The number of frames sent so far
+    """
+    def __init__(self, interface, mac, ip, batch_size=64, sock=None,
+                 max_bundle=1):
+        self.interface = interface
+        self.mac = mac
+        self.ip = ip
+        self.batch_size = batch_size
+        self.max_bundle = max_bundle
+        self.frames_sent = 0
+        if sock is None:
+            sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+            sock.bind((interface, 0))
+        self.socket = sock
+        self._templates = {}
+        # Every queued frame takes a slot of the size of the largest frame
+        self._slot_len = RESERVATION_OFFSET + bundle_len(max_bundle)
+        self._buffer = bytearray(batch_size * self._slot_len)
+        self._view = memoryview(self._buffer)
+        self._frame_lens = []
+        # The encoded reservations of the bundles still being filled by
+        # destination and status
+        self._bundles = {}
+        self._lock = threading.RLock()
+
+    def template(self, dst_ip, src_port, dst_port, dst_mac=BROADCAST_MAC,
+                 src_ip=None, payload_len=RESERVATION_STRUCT.size):
+        """ Returns the cached header template for a destination """
+        key = (dst_ip, src_port, dst_port, dst_mac, src_ip, payload_len)
+        template = self._templates.get(key)
+        if template is None:
+            template = FrameTemplate(
+                self.mac, dst_mac, src_ip or self.ip, dst_ip, src_port,
+                dst_port, payload_len
+            )
+            self._templates[key] = template
+        return template
+
+    def queue(self, dst_ip, src_port, dst_port, status, reservation,
+              dst_mac=BROADCAST_MAC, src_ip=None):
+        """ Queues a reservation frame, flushing the queue if it is full
+
+        Parameters
+        ----------
+        dst_ip
+            The IPv4 destination of the frame
+        src_port
+            The UDP source port of the frame
+        dst_port
+            The UDP destination port of the frame
+        status
+            The status of the reservation packet
+        reservation
+            An object with the attributes of a `Reservation`
+        dst_mac, optional
+            The MAC destination of the frame (default is broadcast)
+        src_ip, optional
+            The IPv4 source of the frame (default is the sender's `ip`)
+        """
+        with self._lock:
+            if self.max_bundle == 1:
+                template = self.template(
+                    dst_ip, src_port, dst_port, dst_mac, src_ip
+                )
+                template.write_into(
+                    self._buffer, self._next_slot(), status, reservation
+                )
+                self._frame_lens.append(template.frame_len)
+                return
+            key = (dst_ip, src_port, dst_port, dst_mac, src_ip, status)
+            records = self._bundles.setdefault(key, [])
+            # Encoded right away, as the reservation may change until sent
+            records.append(pack_reservation(status, reservation))
+            if len(records) == self.max_bundle:
+                self._queue_bundle(key)
+
+    def _next_slot(self):
+        """ The offset of the next free slot, sending the queued frames if
+        there is none
+        """
+        if len(self._frame_lens) == self.batch_size:
+            self._send_queued()
+        return len(self._frame_lens) * self._slot_len
+
+    def _queue_bundle(self, key):
+        (dst_ip, src_port, dst_port, dst_mac, src_ip, status) = key
+        payload = join_bundle(status, self._bundles.pop(key))
+        template = self.template(
+            dst_ip, src_port, dst_port, dst_mac, src_ip, len(payload)
+        )
+        template.write_payload_into(self._buffer, self._next_slot(), payload)
+        self._frame_lens.append(template.frame_len)
+
+    def send(self, dst_ip, src_port, dst_port, status, reservation,
+             dst_mac=BROADCAST_MAC, src_ip=None):
+        """ Sends a reservation frame immediately together with all queued
+        ones, see `queue`
+        """
+        with self._lock:
+            self.queue(
+                dst_ip, src_port, dst_port, status, reservation, dst_mac,
+                src_ip
+            )
+            self.flush()
+
+    def flush(self):
+        """ Sends all queued frames, including the bundles not yet full
+
+        Returns
+        -------
+        int
+            The number of frames sent
+        """
+        with self._lock:
+            for key in list(self._bundles):
+                self._queue_bundle(key)
+            return self._send_queued()
+
+    def _send_queued(self):
+        queued = len(self._frame_lens)
+        for (index, frame_len) in enumerate(self._frame_lens):
+            offset = index * self._slot_len
+            self.socket.send(self._view[offset:offset + frame_len])
+        self._frame_lens.clear()
+        self.frames_sent += queued
+        return queued
+
+    def close(self):
+        self.flush()
+        self.socket.close()
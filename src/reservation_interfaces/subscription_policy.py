@@ -0,0 +1,322 @@
+from collections import OrderedDict
+import ipaddress
+import time
+
+import yaml
+
+# Actions of a policy rule
+ACCEPT = 'accept'
+REJECT = 'reject'
+ACTIONS = (ACCEPT, REJECT)
+
+# The time in seconds an answered stream is not answered again. The talker
+# refreshes subscribed streams every 10 s and the controller expires
+# subscriptions not renewed within 30 s, so that every other refresh is
+# answered
+DEFAULT_SUBSCRIPTION_TTL = 15
+# The time in seconds after which an unacknowledged subscription is resent
+# on the next resend of its advertisement
+DEFAULT_ACK_TIMEOUT = 1
+# The maximum number of streams kept in the cache
+DEFAULT_MAX_STREAMS = 65536
+
+
+def _port_ranges(ports):
+    """ Converts a list of ports and `[first, last]` ranges into a tuple of
+    inclusive `(first, last)` ranges
+    """
+    ranges = []
+    for entry in ports:
+        if isinstance(entry, int):
+            ranges.append((entry, entry))
+        else:
+            (first, last) = entry
+            assert first <= last
+            ranges.append((int(first), int(last)))
+    return tuple(ranges)
+
+
+class PolicyRule:
+    """
+    A rule matching advertisements by their talker, ports and priority.
+    Every criterion that is None matches every advertisement.
+
+    Attributes
+    ----------
+    action
+        Either `ACCEPT` or `REJECT`
+    talkers
+        The talkers' networks, e.g. '10.0.0.0/24', or IPv4 addresses
+    src_ports
+        The streams' source ports and `[first, last]` port ranges
+    dst_ports
+        The streams' destination ports and `[first, last]` port ranges
+    priorities
+        The streams' priorities
+    """
+    def __init__(self, action=ACCEPT, talkers=None, src_ports=None,
+                 dst_ports=None, priorities=None):
+        assert action in ACTIONS
+        self.action = action
+        self.talkers = talkers
+        self.src_ports = src_ports
+        self.dst_ports = dst_ports
+        self.priorities = priorities
+        # Compiled criteria, compared against integers only
+        self._networks = None if talkers is None else tuple(
+            (int(network.network_address), int(network.netmask))
+            for network in (
+                ipaddress.IPv4Network(talker, strict=False)
+                for talker in talkers
+            )
+        )
+        self._src_ports = None if src_ports is None \
+            else _port_ranges(src_ports)
+        self._dst_ports = None if dst_ports is None \
+            else _port_ranges(dst_ports)
+        self._priorities = None if priorities is None \
+            else frozenset(priorities)
+
+    def matches(self, advertisement, talker=None):
+        """ Whether the rule matches an advertisement
+
+        Parameters
+        ----------
+        advertisement
+            A `Reservation`
+        talker, optional
+            The advertisement's `src_ip` as integer, if already converted
+        """
+        if self._priorities is not None and \
+                advertisement.priority not in self._priorities:
+            return False
+        if self._src_ports is not None and not any(
+                first <= advertisement.src_port <= last
+                for (first, last) in self._src_ports):
+            return False
+        if self._dst_ports is not None and not any(
+                first <= advertisement.dst_port <= last
+                for (first, last) in self._dst_ports):
+            return False
+        if self._networks is not None:
+            if talker is None:
+                talker = int(ipaddress.IPv4Address(advertisement.src_ip))
+            if not any(talker & mask == network
+                       for (network, mask) in self._networks):
+                return False
+        return True
+
+
+class SubscriptionPolicy:
+    """
+    Decides which advertisements a listener subscribes to. The first
+    matching rule decides, if no rule matches the `default` action does.
+
+    Attributes
+    ----------
+    rules
+        The `PolicyRule`s in order of precedence
+    default
+        The action for advertisements no rule matches
+    """
+    def __init__(self, rules=(), default=ACCEPT):
+        assert default in ACTIONS
+        self.rules = list(rules)
+        self.default = default
+
+    @classmethod
+    def from_yaml(cls, filepath):
+        """ Reads a policy from a yaml-file of the following form:
+
+            default: <accept|reject> (Optional, default is accept)
+            rules:
+              - action: <accept|reject> (Optional, default is accept)
+                talkers: [<network or IPv4 address>, ...] (Optional)
+                src_ports: [<port>, [<first>, <last>], ...] (Optional)
+                dst_ports: [<port>, [<first>, <last>], ...] (Optional)
+                priorities: [<priority>, ...] (Optional)
+              .
+              .
+              .
+        """
+        with open(filepath, 'r') as policy_file:
+            data = yaml.safe_load(policy_file) or {}
+        return cls(
+            [PolicyRule(**rule) for rule in data.get('rules', [])],
+            data.get('default', ACCEPT)
+        )
+
+    def accepts(self, advertisement):
+        """ Whether a listener should subscribe to an advertisement """
+        talker = None
+        if any(rule._networks is not None for rule in self.rules):
+            talker = int(ipaddress.IPv4Address(advertisement.src_ip))
+        for rule in self.rules:
+            if rule.matches(advertisement, talker):
+                return rule.action == ACCEPT
+        return self.default == ACCEPT
+
+
+class CachedStream:
+    """
+    The state of an advertised stream in a `SubscriptionCache`
+
+    Attributes
+    ----------
+    reservation
+        The last answered advertisement of the stream
+    stream_hash
+        The `stream_hash` of `reservation`
+    accepted
+        Whether the policy accepted the stream
+    updated
+        The time the stream was cached or last answered
+    acknowledged
+        Whether the last subscription was acknowledged
+    """
+    __slots__ = (
+        'reservation', 'stream_hash', 'accepted', 'updated', 'acknowledged'
+    )
+
+    def __init__(self, reservation, stream_hash, accepted, updated):
+        self.reservation = reservation
+        self.stream_hash = stream_hash
+        self.accepted = accepted
+        self.updated = updated
+        self.acknowledged = False
+
+
+class SubscriptionCache:
+    """
+    Suppresses subscriptions to advertisements that were already answered.
+
+    Streams are identified by their talker and ports together with their
+    `stream_hash`, so that a changed stream or path is answered again. A
+    resent advertisement is only answered again if the acknowledgement of
+    the last subscription is missing after `ack_timeout`, a refreshed one
+    after `ttl`, keeping the controller's soft state alive. Streams rejected
+    by the policy are cached as well, so that their resends are dropped
+    without evaluating the policy again until `ttl` passed. Expired streams
+    and the least recently updated ones beyond `max_streams` are evicted.
+
+    Attributes
+    ----------
+    policy
+        The `SubscriptionPolicy` deciding about new streams, None to accept
+        all
+    ttl
+        The time in seconds an answered stream is not answered again
+    ack_timeout
+        The time in seconds after which an unacknowledged stream is answered
+        again
+    max_streams
+        The maximum number of cached streams
+    clock
+        The function returning the current time in seconds
+    """
+    def __init__(self, policy=None, ttl=DEFAULT_SUBSCRIPTION_TTL,
+                 ack_timeout=DEFAULT_ACK_TIMEOUT,
+                 max_streams=DEFAULT_MAX_STREAMS, clock=time.monotonic):
+        assert ack_timeout <= ttl
+        self.policy = policy
+        self.ttl = ttl
+        self.ack_timeout = ack_timeout
+        self.max_streams = max_streams
+        self.clock = clock
+        # Ordered from the least to the most recently answered stream
+        self.streams = OrderedDict()
+        self.statistics = {
+            'answered': 0,
+            'suppressed': 0,
+            'rejected': 0,
+            'acknowledged': 0,
+            'evicted': 0,
+        }
+
+    def __len__(self):
+        return len(self.streams)
+
+    def __contains__(self, reservation):
+        return reservation in self.streams
+
+    def subscribed_streams(self):
+        """ The acknowledged streams still in the cache """
+        return [
+            stream.reservation for stream in self.streams.values()
+            if stream.acknowledged
+        ]
+
+    def should_answer(self, advertisement, now=None):
+        """ Decides whether to subscribe to an advertisement and, if so,
+        records the subscription as sent
+
+        Parameters
+        ----------
+        advertisement
+            The received `Reservation`
+        now, optional
+            The current time (default is `clock()`)
+
+        Returns
+        -------
+        bool
+            Whether a subscription should be sent
+        """
+        if now is None:
+            now = self.clock()
+        stream_hash = advertisement.stream_hash()
+        stream = self.streams.get(advertisement)
+        if stream is None or stream.stream_hash != stream_hash:
+            accepted = self.policy is None or \
+                self.policy.accepts(advertisement)
+            stream = CachedStream(advertisement, stream_hash, accepted, now)
+            self.streams[advertisement] = stream
+            self.streams.move_to_end(advertisement)
+            self._evict(now)
+            if not accepted:
+                self.statistics['rejected'] += 1
+                return False
+        elif not stream.accepted:
+            self.statistics['rejected'] += 1
+            return False
+        elif now - stream.updated < (self.ttl if stream.acknowledged
+                                     else self.ack_timeout):
+            self.statistics['suppressed'] += 1
+            return False
+        else:
+            stream.reservation = advertisement
+            stream.updated = now
+            stream.acknowledged = False
+            self.streams.move_to_end(advertisement)
+            self._evict(now)
+        self.statistics['answered'] += 1
+        return True
+
+    def acknowledge(self, acknowledgement):
+        """ Records the acknowledgement of a subscription
+
+        Returns
+        -------
+        bool
+            Whether a subscription to the acknowledged stream was sent
+        """
+        stream = self.streams.get(acknowledgement)
+        if stream is None or not stream.accepted:
+            return False
+        if not stream.acknowledged:
+            stream.acknowledged = True
+            self.statistics['acknowledged'] += 1
+        return True
+
+    def _evict(self, now):
+        """ Drops streams beyond `max_streams` and expired ones, both from
+        the least recently updated end
+        """
+        streams = self.streams
+        while len(streams) > 1:
+            stream = next(iter(streams.values()))
+            if len(streams) <= self.max_streams and \
+                    now - stream.updated < self.ttl:
+                return
+            streams.popitem(last=False)
+            self.statistics['evicted'] += 1
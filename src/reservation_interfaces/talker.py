@@ -1,21 +1,36 @@
 import asyncio
 import os
-from random import randint
+import threading
 import yaml
 
-from scapy.all import AsyncSniffer
-from scapy.config import conf
-from scapy.layers.inet import IP, UDP
-from scapy.layers.l2 import Ether
-
-from .util import BROADCAST_MAC, ReservationPacket, Reservation, round_up
+from .capture import ReservationCapture
+from .latency_model import first_hop_delays
+from .load_generator import CONSTANT, LoadGenerator
+from .port_allocator import PortAllocator
+from .reservation_tracker import DEFAULT_REFRESH_INTERVAL, \
+    ReservationResult, ReservationTracker
+from .sender import FrameSender
+from .util import Reservation
+from .wire import ACKNOWLEDGEMENT, ACKNOWLEDGEMENT_PORT, ADVERTISEMENT, \
+    MAX_BUNDLE_RESERVATIONS, RESERVATION_PORT, SUBSCRIPTION
 
 import time
-import random
 
 DEFAULT_PROCESSING_DELAY = 2000
 DEFAULT_LINK_SPEED = 100000000
 
+UDP_OVERHEAD = sum([
+    7,  # Preamble
+    1,  # Frame Delimiter
+    6,  # MAC Destination     -
+    6,  # MAC Source
+    2,  # Ethertype
+    20,  # IPv4 Header
+    8,  # UDP Header
+    4,  # CRC check sequence
+    12  # Interpacket gap
+])
+
 
 class Talker:
     """
@@ -33,9 +48,38 @@ class Talker:
         The time in seconds until an advertisement is resent
     resends
         The number of times an advertisement would be resent
+    rate
+        The maximum number of new advertisements sent per second, None for
+        no limit
+    max_in_flight
+        The maximum number of advertised streams waiting for a subscription
+        at once, None for no limit
+    jitter
+        The fraction by which every resend interval is randomly shortened or
+        prolonged, so that resends of streams advertised together spread out
+    backoff
+        The factor by which the resend interval grows after every resend,
+        1 for a constant interval
+    max_timeout
+        The upper bound in seconds of the growing resend interval, None for
+        no bound
+    refresh_interval
+        The interval in seconds in which subscribed advertisements are resent
+        to keep them from expiring on the switches, None to never refresh
+    max_bundle
+        The maximum number of advertisements or acknowledgements sent
+        together in one frame, 1 to send every one in its own frame for
+        controllers and listeners without support for bundles
+    reservations
+        The `ReservationTracker` resending the advertisements and resolving
+        the reservations
     """
 
-    def __init__(self, interface, ip, broadcast_ip, mac, timeout, resends):
+    def __init__(self, interface, ip, broadcast_ip, mac, timeout, resends,
+                 rate=None, max_in_flight=None, jitter=0.1, backoff=1,
+                 max_timeout=None,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 max_bundle=MAX_BUNDLE_RESERVATIONS):
         self.loop = asyncio.get_event_loop()
         self.interface = interface
         self.ip = ip
@@ -43,81 +87,160 @@ class Talker:
         self.mac = mac
         self.timeout = timeout
         self.resends = resends
-        self.used_port_combinations = set()
-        self.advertised_streams = set()
-        self.stream_subscriptions = {}
-        self.socket = conf.L2socket(iface=self.interface)
-        self.sniffer = AsyncSniffer(
-            iface=self.interface,
-            # filter="dst port 1000",
-            prn=self._handle_subscription
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_timeout = max_timeout
+        self.refresh_interval = refresh_interval
+        self.max_bundle = max_bundle
+        self.ports = PortAllocator()
+        # Called from the capture thread for every subscription with the
+        # `time.perf_counter_ns` of its reception and acknowledgement
+        self.subscription_callbacks = []
+        self.sender = FrameSender(
+            self.interface, self.mac, self.ip, max_bundle=max_bundle
+        )
+        # All resends and refreshes are driven by the tracker's timer wheel
+        # from a single thread
+        self.reservations = ReservationTracker(
+            self.loop, self._send_advertisement, timeout, resends,
+            jitter=jitter, backoff=backoff, max_timeout=max_timeout,
+            refresh_interval=refresh_interval, ports=self.ports
+        )
+        self.advertised_streams = self.reservations.advertised_streams
+        self.stream_subscriptions = self.reservations.stream_subscriptions
+        self.pending_subscriptions = self.reservations.pending_subscriptions
+        self.resend_thread = threading.Thread(
+            target=self._drive_resends, daemon=True
+        )
+        self.resend_thread.start()
+        # Only subscriptions reach user space, see `capture.statistics()`
+        self.capture = ReservationCapture(
+            self.interface, [SUBSCRIPTION], ports=[RESERVATION_PORT],
+            bundles=True
         )
-        self.sniffer.start()
+        self.capture.start(self._handle_subscriptions)
         self.n = 0
-        self.UDP_OVERHEAD = sum([
-            7,  # Preamble
-            1,  # Frame Delimiter
-            6,  # MAC Destination     -
-            6,  # MAC Source
-            2,  # Ethertype
-            20,  # IPv4 Header
-            8,  # UDP Header
-            4,  # CRC check sequence
-            12  # Interpacket gap
-        ])
-
-    def _handle_subscription(self, packet):
+        self.UDP_OVERHEAD = UDP_OVERHEAD
+
+    def _handle_subscriptions(self, status, records):
         """
-        Internal method for the handling of received subscriptions. Adds
-        the subscriptions to the `stream_subscriptions` dict.
+        Internal method for the handling of the subscriptions received in
+        one frame, see `_handle_subscription`. Their acknowledgements are
+        sent together.
 
         Parameters
         ----------
-        packet
-            The received packet
+        status
+            The status of the received reservation packet
+        records
+            The fields of every received reservation packet
         """
-        try:
-            stream_reservation_packet = ReservationPacket(packet[3])
-            if stream_reservation_packet.status != 1:
-                return
-            subscription = Reservation(stream_reservation_packet)
-        except Exception:
-            print("Received a non-reservation packet")
+        received_ns = time.perf_counter_ns()
+        received = time.monotonic()
+        if status != SUBSCRIPTION:
             return
-        if subscription not in self.advertised_streams:
+        subscriptions = [
+            subscription for subscription in (
+                self._handle_subscription(fields, received)
+                for fields in records
+            ) if subscription is not None
+        ]
+        self.sender.flush()
+        if self.subscription_callbacks and subscriptions:
+            acknowledged_ns = time.perf_counter_ns()
+            for subscription in subscriptions:
+                for callback in self.subscription_callbacks:
+                    callback(subscription, received_ns, acknowledged_ns)
+
+    def _handle_subscription(self, fields, received):
+        """
+        Internal method for the handling of a received subscription. Adds
+        the subscription to the `stream_subscriptions` dict, ends the
+        resending of the subscribed advertisement and queues the
+        acknowledgement.
+
+        Parameters
+        ----------
+        fields
+            The fields of the received reservation packet
+        received
+            The time of reception according to `time.monotonic`
+
+        Returns
+        -------
+        Reservation or None
+            The subscription, None if its stream was not advertised
+        """
+        subscription = Reservation(**fields)
+        if not self.reservations.subscribe(subscription):
             print('Received subscription for non-advertised stream')
-            return
-        if subscription in self.stream_subscriptions.keys():
-            self.stream_subscriptions[subscription].add(subscription.dst_ip)
-        else:
-            self.stream_subscriptions[subscription] = {subscription.dst_ip}
-
-        self.socket.send(
-                Ether(src=self.mac, dst=BROADCAST_MAC) /
-                IP(src=self.ip, dst=subscription.dst_ip) /
-                UDP(dport=999, sport=1000) /
-                subscription.to_acknowledgement_packet()
-            )
+            return None
+        # The capture runs in its own thread
+        self.loop.call_soon_threadsafe(
+            self.reservations.subscription_received, subscription, received
+        )
+
+        self.sender.queue(
+            subscription.dst_ip, RESERVATION_PORT, ACKNOWLEDGEMENT_PORT,
+            ACKNOWLEDGEMENT, subscription
+        )
+        return subscription
 
-    def load_test(self, filepath, n):
+    def load_test(self, filepath, n, rate=40, process=CONSTANT,
+                  output=None, drain=5, seed=None):
+        """ Sends an open-loop load of advertisements, each sent once, and
+        records when their first subscription arrived.
+
+        Parameters
+        ----------
+        filepath
+            Absolute path to a yaml-file with the stream templates, see
+            `advertise_streams_from_yaml`. Every template may have a
+            `weight` entry, setting how often it is picked (default is 1)
+        n
+            The number of streams to advertise, using the destination ports
+            2001 to 2000 + n
+        rate, optional
+            The mean number of advertisements per second (default is 40)
+        process, optional
+            The arrival process, 'constant' or 'poisson' (default is
+            'constant')
+        output, optional
+            Path of a .csv or .parquet file to write the per-stream
+            timestamps to
+        drain, optional
+            The time in seconds to wait for subscriptions after the last
+            advertisement (default is 5)
+        seed, optional
+            The seed for the template mix and the Poisson arrivals
+
+        Returns
+        -------
+        list
+            The per-stream rows, see `load_generator.RECORD_FIELDS`
+        """
         assert os.path.isfile(filepath)
-        stream_specification = yaml.safe_load(open(filepath, 'r'))[0]
-        if 'src_port' in stream_specification:
-            stream_specification.pop('src_port')
-        if 'dst_port' in stream_specification:
-            stream_specification.pop('dst_port')
-        self.resends = 0
-        self.timeout = 0
+        templates = yaml.safe_load(open(filepath, 'r'))
+        for template in templates:
+            template.pop('src_port', None)
 
+        generator = LoadGenerator(self, templates, rate, process, seed)
         a = time.time_ns()
-        for i in range(n):
-            self.advertise_stream(dst_port=i+2001, **stream_specification)
-            print(f"Sent {i+1}")
-            time.sleep(0.025)
-        print((time.time_ns() - a)/1000000000)
-
-    def advertise_streams_from_yaml(self, filepath):
-        """ Advertises a set of predefined streams from a yaml-file.
+        rows = generator.run(n, first_port=2001, drain=drain)
+        subscribed = sum(row['subscribed_ns'] is not None for row in rows)
+        print(f"Sent {len(rows)}, subscribed {subscribed} in "
+              f"{(time.time_ns() - a)/1000000000} s")
+        if output is not None:
+            generator.write(output)
+        return rows
+
+    def advertise_streams_from_yaml(self, filepath, rate=None,
+                                    max_in_flight=None, subscriptions=1,
+                                    deadline=None):
+        """ Advertises a set of predefined streams from a yaml-file and
+        waits until every stream is subscribed or timed out.
 
         Parameters
         ----------
@@ -141,66 +264,131 @@ class Talker:
             .
             .
             .
+        rate, optional
+            The maximum number of new advertisements sent per second
+            (default is the talker's `rate`)
+        max_in_flight, optional
+            The maximum number of advertised streams waiting for a
+            subscription at once (default is the talker's `max_in_flight`)
+        subscriptions, optional
+            The number of listeners that must subscribe to a stream for its
+            reservation to succeed (default is 1)
+        deadline, optional
+            The time in seconds after which a stream's reservation fails if
+            it is not subscribed, see `advertise_streams`
 
         Returns
         -------
         (successful_reservations, unsuccessful_reservations)
-            The final result of the reservation run
+            The `ReservationResult`s of the reservation run
         """
         assert os.path.isfile(filepath)
         stream_specifications = yaml.safe_load(open(filepath, 'r'))
 
-        src_data = []
-        for data in stream_specifications:
-            if 'instances' not in data:
-                src_data.append(data)
-                continue
-            src_data += ([data for x in range(data['instances'])])
-
         # Try to reserve every stream from the dataset
-        for data in stream_specifications:
-            if 'instances' in data:
-                for _ in range(data['instances']):
-                    self.advertise_stream(**data)
-                    time.sleep(0.01)
-            else:
-                self.advertise_stream(**data)
-        time.sleep(10)
+        results = self.wait(self.loop.run_until_complete(
+            self.advertise_streams(
+                stream_specifications, rate=rate,
+                max_in_flight=max_in_flight, subscriptions=subscriptions,
+                deadline=deadline
+            )
+        ).values())
+
         subscribed_by_prio = {i: 0 for i in range(1,8)}
         for (stream, subs) in self.stream_subscriptions.items():
             subscribed_by_prio[stream.priority] += len(subs)
         print("Subscriptions:")
         for (prio, subs) in subscribed_by_prio.items():
             print(f"Priority {prio}: {subs}")
-        return
 
-    async def advertise_streams(self, stream_specifications):
+        successful = [result for result in results if result.subscribed]
+        unsuccessful = [result for result in results if not result.subscribed]
+        return successful, unsuccessful
+
+    async def advertise_streams(self, stream_specifications, rate=None,
+                                max_in_flight=None, subscriptions=1,
+                                deadline=None):
         """ Advertise a set of streams, specified in an iterable
 
+        New advertisements are paced to `rate` per second and at most
+        `max_in_flight` streams wait for a subscription at the same time.
+        Every stream is resent each `timeout` seconds, see `backoff` and
+        `jitter`, until it is subscribed or its `resends` are used up.
+
         Parameters
         ----------
         stream_specifications : Iterable
-            The specifications of the streams to advertise
+            The specifications of the streams to advertise, see
+            `advertise_stream`. A specification with an `instances` entry is
+            advertised that many times
+        rate, optional
+            The maximum number of new advertisements sent per second
+            (default is the talker's `rate`, None for no limit)
+        max_in_flight, optional
+            The maximum number of advertised streams waiting for a
+            subscription at once (default is the talker's `max_in_flight`,
+            None for no limit)
+        subscriptions, optional
+            The number of listeners that must subscribe to a stream for its
+            reservation to succeed (default is 1)
+        deadline, optional
+            The time in seconds after the first advertisement of a stream at
+            which its reservation fails if not enough listeners have
+            subscribed. Without a deadline, a reservation fails once the
+            stream's resends are used up, and without a `timeout` it waits
+            for its subscriptions for as long as it takes
 
         Returns
         -------
-
+        dict
+            An `asyncio.Future` for every advertisement, resolving to its
+            `ReservationResult`. Returns once all streams are advertised,
+            which with `max_in_flight` means all but the last ones are
+            already resolved
         """
-        tasks = []
-        for data in stream_specifications:
-            if 'instances' in data:
-                for _ in range(data['instances']):
-                    tasks.append(
-                        self.loop.create_task(self._advertise_stream(**data))
-                    )
-            else:
-                tasks.append(
-                    self.loop.create_task(self._advertise_stream(**data))
-                )
-
-        await asyncio.wait(tasks)
-
-    def advertise_stream(self, **kwargs):
+        if rate is None:
+            rate = self.rate
+        if max_in_flight is None:
+            max_in_flight = self.max_in_flight
+
+        in_flight = asyncio.Semaphore(max_in_flight) if max_in_flight \
+            else None
+        futures = {}
+        next_send = self.loop.time()
+
+        for (data, ports) in self._expand_specifications(
+                stream_specifications):
+            advertisement = self._create_advertisement(ports=ports, **data)
+            if advertisement is None:
+                continue
+
+            if in_flight is not None and in_flight.locked():
+                # Send the queued advertisements before waiting for a slot
+                self.sender.flush()
+            if in_flight is not None:
+                await in_flight.acquire()
+
+            if rate:
+                delay = next_send - self.loop.time()
+                if delay > 0:
+                    self.sender.flush()
+                    await asyncio.sleep(delay)
+                # Don't catch up on time lost waiting for a free slot
+                next_send = max(next_send, self.loop.time()) + 1 / rate
+
+            future = self.reservations.track(
+                advertisement, subscriptions, deadline
+            )
+            if in_flight is not None:
+                # Releases the advertisement's in-flight slot
+                future.add_done_callback(lambda _: in_flight.release())
+            self._send_advertisement(advertisement)
+            futures[advertisement] = future
+
+        self.sender.flush()
+        return futures
+
+    def advertise_stream(self, subscriptions=1, deadline=None, **kwargs):
         """ Advertise a stream in a connected TSN-Network.
 
         Parameters
@@ -221,107 +409,170 @@ class Talker:
         burst_interval, optional
             The timeframe in which at most 'burst_size_udp' Byte of UDP Payload
             will be sent. Alternatively, 'send_rate' can be passed.
-        """
-        self.loop.run_until_complete(self._advertise_stream(**kwargs))
+        subscriptions, optional
+            The number of listeners that must subscribe to the stream for its
+            reservation to succeed (default is 1)
+        deadline, optional
+            The time in seconds after which the reservation fails if not
+            enough listeners have subscribed
 
-    async def _advertise_stream(self, req_latency, priority=0, src_port=None,
-                                dst_port=None, min_udp=0, max_udp=1472,
-                                burst_size_udp=None, send_rate=None,
-                                burst_interval=None, **kwargs):
-        """ Internal method. Use 'reserve_stream' insted.
+        Returns
+        -------
+        asyncio.Future or None
+            Resolves to the stream's `ReservationResult`, see `wait`. None if
+            the stream could not be advertised
         """
+        futures = self.loop.run_until_complete(self.advertise_streams(
+            [kwargs], subscriptions=subscriptions, deadline=deadline
+        ))
+        for future in futures.values():
+            return future
+        return None
 
-        assert 1 <= priority and priority <= 7
-        assert 0 <= min_udp and min_udp <= 1472
-        assert 0 <= max_udp and max_udp <= 1472
-        assert min_udp <= max_udp
-        assert burst_interval is not None or send_rate is not None
+    def wait(self, futures):
+        """ Runs the event loop until all given reservations are resolved
 
-        if burst_size_udp is None:
-            burst_size_udp = max_udp
+        Parameters
+        ----------
+        futures : Iterable
+            Futures as returned by `advertise_stream` or `advertise_streams`
+
+        Returns
+        -------
+        list
+            The `ReservationResult` of every future in the given order
+        """
+        futures = list(futures)
+        if not futures:
+            return []
+        return self.loop.run_until_complete(asyncio.gather(*futures))
 
-        min_frame = min_udp + self.UDP_OVERHEAD
-        max_frame = max_udp + self.UDP_OVERHEAD
-        burst_size = burst_size_udp + self.UDP_OVERHEAD
+    def withdraw(self, advertisement):
+        """ Stops advertising and refreshing a stream and releases its port
+        combination. Its reservations on the switches expire once they are no
+        longer refreshed. Must be called from the event loop's thread.
 
-        # Get a random value for not defined src-or dst-port values
-        if src_port is None and dst_port is None:
-            (src_port, dst_port) = (
-                randint(1001, 2 ** 16 - 1), randint(1001, 2 ** 16 - 1)
-            )
-            while (src_port, dst_port) in self.used_port_combinations:
-                (src_port, dst_port) = (
-                    randint(1001, 2 ** 16), randint(1001, 2 ** 16)
-                )
-
-        elif src_port is None:
-            src_port = randint(1001, 2 ** 16)
-            while (src_port, dst_port) in self.used_port_combinations:
-                src_port = randint(1001, 2 ** 16)
-
-        elif dst_port is None:
-            dst_port = randint(1001, 2 ** 16)
-            while (src_port, dst_port) in self.used_port_combinations:
-                dst_port = randint(1001, 2 ** 16)
-
-        else:
-            if (src_port, dst_port) in self.used_port_combinations:
-                raise ValueError('Port combination already in use!')
-
-        # Add the now used port-combination to the set of used ones
-        self.used_port_combinations.add((src_port, dst_port))
-
-        # If no temporal context is given for the burst size, raise ValueError
-        if send_rate is None and burst_interval is None:
-            raise ValueError('Missing burst-rate or burst-interval!')
-
-        # If a burst rate is given, derive the burst_interval from it
-        if send_rate is not None:
-            burst_interval = int((burst_size * 8 * 1000000) / send_rate)
-
-        # Set the transmission delay to the first hop as the accumulated
-        # minimum delay
-        acc_min_delay = int((max_frame * 8) / DEFAULT_LINK_SPEED)
-
-        # Set the sum of accumulated minimum delay and the preconfigured
-        # processing delay bound as the accumulated maximum delay
-        acc_max_delay = acc_min_delay + DEFAULT_PROCESSING_DELAY
-
-        # Check if the accumulated maximum delay does not already surpass
-        # required end-to-end latency
-        if acc_max_delay >= req_latency:
-            print(f"Required latency of {req_latency} not possible.")
-            return None
+        Parameters
+        ----------
+        advertisement
+            The advertisement of the stream to withdraw
+        """
+        self.reservations.withdraw(advertisement)
 
-        # Create a new stream-reservation
-        advertisement = Reservation(
-            # End-to-end information
-            req_latency=req_latency,
-            priority=priority,
-            src_ip=self.ip,
-            src_port=src_port,
-            dst_port=dst_port,
-            # Stream description
-            min_frame=min_frame,
-            max_frame=max_frame,
-            burst_size=burst_size,
-            burst_interval=burst_interval,
-            # Delay carriers
-            acc_min_delay=acc_min_delay,
-            acc_max_delay=acc_min_delay
+    def _expand_specifications(self, stream_specifications):
+        """ Yields every stream specification `instances` times, together
+        with a port combination if they were allocated in bulk
+        """
+        for data in stream_specifications:
+            instances = data.get('instances', 1)
+            if instances == 1:
+                yield (data, None)
+                continue
+            for ports in self.ports.allocate_many(
+                    instances, data.get('src_port'), data.get('dst_port')):
+                yield (data, ports)
+
+    def _send_advertisement(self, advertisement):
+        """ Internal method. Queues an advertisement for sending """
+        self.sender.queue(
+            self.broadcast_ip, RESERVATION_PORT, RESERVATION_PORT,
+            ADVERTISEMENT, advertisement
         )
 
-        self.advertised_streams.add(advertisement)
+    def _drive_resends(self):
+        """ Internal method. Advances the resend scheduler every tick """
+        while True:
+            time.sleep(self.reservations.wheel.tick)
+            if self.reservations.advance():
+                self.sender.flush()
 
-        # Send the advertisement 1 + `resends` times with a `timeout` interval
-        sends = 0
-        while self.resends is None or sends <= self.resends:
-            self.socket.send(
-                Ether(src=self.mac, dst=BROADCAST_MAC) /
-                IP(src=self.ip, dst=self.broadcast_ip) /
-                UDP(dport=1000, sport=1000) /
-                advertisement.to_advertisement_packet()
-            )
-            if self.timeout != 0:
-                await asyncio.sleep(self.timeout)
-            sends += 1
+    def _create_advertisement(self, **kwargs):
+        """ Internal method. Use 'advertise_stream' insted. Creates and
+        stores a new advertisement, see `create_advertisement`.
+        """
+        advertisement = create_advertisement(self.ip, self.ports, **kwargs)
+        if advertisement is not None:
+            self.advertised_streams.add(advertisement)
+        return advertisement
+
+
+def create_advertisement(src_ip, port_allocator, req_latency, priority=0,
+                         src_port=None, dst_port=None, min_udp=0,
+                         max_udp=1472, burst_size_udp=None, send_rate=None,
+                         burst_interval=None, ports=None, **kwargs):
+    """ Creates the advertisement of a new stream from its specification,
+    see `Talker.advertise_stream`
+
+    Parameters
+    ----------
+    src_ip
+        The IPv4 address of the stream's talker
+    port_allocator
+        The `PortAllocator` to allocate the stream's ports from
+    ports, optional
+        A port combination already allocated for the stream
+
+    Returns
+    -------
+    Reservation or None
+        The new advertisement, None if the required latency can't be met
+    """
+    assert 1 <= priority and priority <= 7
+    assert 0 <= min_udp and min_udp <= 1472
+    assert 0 <= max_udp and max_udp <= 1472
+    assert min_udp <= max_udp
+    assert burst_interval is not None or send_rate is not None
+
+    if burst_size_udp is None:
+        burst_size_udp = max_udp
+
+    min_frame = min_udp + UDP_OVERHEAD
+    max_frame = max_udp + UDP_OVERHEAD
+    burst_size = burst_size_udp + UDP_OVERHEAD
+
+    # If no temporal context is given for the burst size, raise ValueError
+    if send_rate is None and burst_interval is None:
+        raise ValueError('Missing burst-rate or burst-interval!')
+
+    # If a burst rate is given, derive the burst_interval from it
+    if send_rate is not None:
+        burst_interval = int((burst_size * 8 * 1000000) / send_rate)
+
+    # Set the transmission delay to the first hop as the accumulated
+    # minimum delay and its sum with the preconfigured processing delay
+    # bound as the accumulated maximum delay
+    (acc_min_delay, acc_max_delay) = first_hop_delays(
+        max_frame, DEFAULT_LINK_SPEED, DEFAULT_PROCESSING_DELAY
+    )
+
+    # Check if the accumulated maximum delay does not already surpass
+    # required end-to-end latency
+    if acc_max_delay >= req_latency:
+        print(f"Required latency of {req_latency} not possible.")
+        if ports is not None:
+            port_allocator.release(ports)
+        return None
+
+    # Allocate free ports for those that are not pinned
+    if ports is None:
+        ports = port_allocator.allocate(src_port, dst_port)
+    (src_port, dst_port) = ports
+
+    # Create a new stream-reservation
+    advertisement = Reservation(
+        # End-to-end information
+        req_latency=req_latency,
+        priority=priority,
+        src_ip=src_ip,
+        src_port=src_port,
+        dst_port=dst_port,
+        # Stream description
+        min_frame=min_frame,
+        max_frame=max_frame,
+        burst_size=burst_size,
+        burst_interval=burst_interval,
+        # Delay carriers
+        acc_min_delay=acc_min_delay,
+        acc_max_delay=acc_min_delay
+    )
+    return advertisement
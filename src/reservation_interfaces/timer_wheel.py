@@ -0,0 +1,124 @@
+import time
+
+
+class TimerWheel:
+    """
+    A hashed timing wheel for large numbers of deadlines that are frequently
+    renewed or cancelled.
+
+    Instead of running one timer per entry, every deadline is hashed into one
+    of `slots` buckets by its tick. Scheduling, renewing and cancelling an
+    entry are O(1), advancing the wheel only touches the buckets of the ticks
+    that have passed.
+
+    Attributes
+    ----------
+    tick
+        The resolution of the wheel in seconds
+    slots
+        The number of buckets of the wheel
+    clock
+        A callable returning the current time in seconds
+    """
+
+    def __init__(self, tick=1.0, slots=512, clock=time.monotonic):
+        assert tick > 0
+        assert slots > 0
+        self.tick = tick
+        self.clock = clock
+        self._buckets = [dict() for _ in range(slots)]
+        self._deadlines = {}
+        self._current_tick = int(self.clock() / self.tick)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def schedule(self, key, delay, now=None):
+        """ Schedules `key` to expire `delay` seconds from now. An already
+        scheduled key is renewed with the new deadline.
+
+        Parameters
+        ----------
+        key
+            Any hashable identifying the entry
+        delay
+            The time in seconds until the entry expires
+        now, optional
+            The current time, defaults to `clock()`
+        """
+        if now is None:
+            now = self.clock()
+        self.cancel(key)
+        # Never schedule into a tick that has already been processed
+        deadline = max(
+            int((now + delay) / self.tick), self._current_tick + 1
+        )
+        self._buckets[deadline % len(self._buckets)][key] = deadline
+        self._deadlines[key] = deadline
+
+    def cancel(self, key):
+        """ Removes `key` from the wheel if it is scheduled
+
+        Returns
+        -------
+        bool
+            Whether the key was scheduled
+        """
+        deadline = self._deadlines.pop(key, None)
+        if deadline is None:
+            return False
+        self._buckets[deadline % len(self._buckets)].pop(key, None)
+        return True
+
+    def deadline(self, key):
+        """ Returns the time in seconds at which `key` expires, or `None` """
+        deadline = self._deadlines.get(key)
+        if deadline is None:
+            return None
+        return deadline * self.tick
+
+    def advance(self, now=None):
+        """ Advances the wheel to the current time and collects all entries
+        whose deadline has passed
+
+        Parameters
+        ----------
+        now, optional
+            The current time, defaults to `clock()`
+
+        Returns
+        -------
+        list
+            The keys of all expired entries in the order of their deadlines
+        """
+        if now is None:
+            now = self.clock()
+        target_tick = int(now / self.tick)
+        expired = []
+        if target_tick <= self._current_tick:
+            return expired
+
+        # A full rotation visits every bucket, so there is no need to walk
+        # more ticks than there are buckets
+        first_tick = max(
+            self._current_tick + 1, target_tick - len(self._buckets) + 1
+        )
+        for tick in range(first_tick, target_tick + 1):
+            bucket = self._buckets[tick % len(self._buckets)]
+            if not bucket:
+                continue
+            due = [
+                (deadline, key) for (key, deadline) in bucket.items()
+                if deadline <= target_tick
+            ]
+            for (_, key) in due:
+                bucket.pop(key)
+                self._deadlines.pop(key)
+            expired += due
+
+        self._current_tick = target_tick
+        expired.sort(key=lambda entry: entry[0])
+        return [key for (_, key) in expired]
@@ -1,8 +1,8 @@
 from scapy.fields import ByteEnumField, IntField, ShortField, IPField
 from scapy.packet import Packet
 
-
-BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+from .latency_model import burst_rate
+from .wire import BROADCAST_MAC
 
 
 def round_up(x):
@@ -155,9 +155,7 @@ class Reservation:
             self.acc_max_delay = acc_max_delay
             self.acc_min_delay = acc_min_delay
 
-        self.burst_rate = round_up(
-            self.burst_size * 8 / (self.burst_interval / 10**6)
-        )
+        self.burst_rate = burst_rate(self.burst_size, self.burst_interval)
 
     def __str__(self):
         return f"Stream Reservation:\n"\
@@ -0,0 +1,270 @@
+import struct
+
+BROADCAST_MAC = 'ff:ff:ff:ff:ff:ff'
+
+# The UDP ports used by the reservation protocol. Advertisements and
+# subscriptions are sent to 1000, acknowledgements to 999
+RESERVATION_PORT = 1000
+ACKNOWLEDGEMENT_PORT = 999
+
+# Status values of a reservation packet
+ADVERTISEMENT = 0
+SUBSCRIPTION = 1
+ACKNOWLEDGEMENT = 2
+
+# The fixed layout of a `ReservationPacket` in network byte order
+RESERVATION_STRUCT = struct.Struct('!BII4s4sHHIIIIII')
+RESERVATION_FIELDS = (
+    'req_latency', 'priority', 'src_ip', 'dst_ip', 'src_port', 'dst_port',
+    'min_frame', 'max_frame', 'burst_size', 'burst_interval',
+    'acc_max_delay', 'acc_min_delay'
+)
+
+ETHER_HEADER_LEN = 14
+IP_HEADER_LEN = 20
+UDP_HEADER_LEN = 8
+# Offset of the reservation in an Ethernet frame without VLAN tag and options
+RESERVATION_OFFSET = ETHER_HEADER_LEN + IP_HEADER_LEN + UDP_HEADER_LEN
+IP_PROTO_UDP = 17
+
+# Several reservations of the same status can be sent in one frame as a
+# bundle: a header of `BUNDLE`, a value no status takes, the version of the
+# format, the status and the number of reservations, followed by the
+# reservations encoded as single ones. A bundle of one reservation is always
+# sent as a single reservation, so that receivers without support for
+# bundles keep understanding every frame that carries only one
+BUNDLE = 0x80
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('!BBBB')
+# The IPv4 MTU of the network, which bounds the size of a bundle
+MTU = 1500
+MAX_BUNDLE_RESERVATIONS = (
+    MTU - IP_HEADER_LEN - UDP_HEADER_LEN - BUNDLE_HEADER.size
+) // RESERVATION_STRUCT.size
+
+
+def ip_to_bytes(ip):
+    return bytes(int(part) for part in ip.split('.'))
+
+
+def bytes_to_ip(raw):
+    return '.'.join(str(part) for part in raw)
+
+
+def pack_reservation_into(buffer, offset, status, reservation):
+    """ Writes a reservation packet into a buffer
+
+    Parameters
+    ----------
+    buffer
+        A writable buffer, e.g. a `bytearray`
+    offset
+        The position in `buffer` at which to write the packet
+    status
+        One of `ADVERTISEMENT`, `SUBSCRIPTION` or `ACKNOWLEDGEMENT`
+    reservation
+        An object with the attributes of a `Reservation`
+    """
+    RESERVATION_STRUCT.pack_into(
+        buffer, offset, status,
+        reservation.req_latency,
+        reservation.priority,
+        ip_to_bytes(reservation.src_ip),
+        ip_to_bytes(reservation.dst_ip),
+        reservation.src_port,
+        reservation.dst_port,
+        reservation.min_frame,
+        reservation.max_frame,
+        reservation.burst_size,
+        reservation.burst_interval,
+        reservation.acc_max_delay,
+        reservation.acc_min_delay
+    )
+
+
+def pack_reservation(status, reservation):
+    """ Encodes a reservation packet, see `pack_reservation_into` """
+    buffer = bytearray(RESERVATION_STRUCT.size)
+    pack_reservation_into(buffer, 0, status, reservation)
+    return bytes(buffer)
+
+
+def unpack_reservation(buffer, offset=0):
+    """ Decodes a reservation packet
+
+    Parameters
+    ----------
+    buffer
+        The raw bytes containing the packet
+    offset, optional
+        The position of the packet in `buffer`
+
+    Returns
+    -------
+    (status, fields)
+        The status of the packet and a dict of its fields that can be passed
+        to the `Reservation` constructor
+    """
+    values = RESERVATION_STRUCT.unpack_from(buffer, offset)
+    fields = dict(zip(RESERVATION_FIELDS, values[1:]))
+    fields['src_ip'] = bytes_to_ip(fields['src_ip'])
+    fields['dst_ip'] = bytes_to_ip(fields['dst_ip'])
+    return values[0], fields
+
+
+def bundle_len(count):
+    """ The size in Byte of the UDP payload carrying `count` reservations """
+    if count == 1:
+        return RESERVATION_STRUCT.size
+    return BUNDLE_HEADER.size + count * RESERVATION_STRUCT.size
+
+
+def join_bundle(status, records):
+    """ Joins encoded reservations of one status into the payload of a frame
+
+    Parameters
+    ----------
+    status
+        The status of all reservations
+    records
+        The reservations encoded by `pack_reservation`, at most
+        `MAX_BUNDLE_RESERVATIONS`
+
+    Returns
+    -------
+    bytes
+        A bundle, or the only reservation if there is just one
+    """
+    if not 0 < len(records) <= MAX_BUNDLE_RESERVATIONS:
+        raise ValueError(f'A bundle carries 1 to {MAX_BUNDLE_RESERVATIONS} '
+                         f'reservations, not {len(records)}')
+    if len(records) == 1:
+        return bytes(records[0])
+    return BUNDLE_HEADER.pack(BUNDLE, BUNDLE_VERSION, status, len(records)) \
+        + b''.join(records)
+
+
+def pack_bundle(status, reservations):
+    """ Encodes reservations of one status, see `join_bundle` """
+    return join_bundle(status, [
+        pack_reservation(status, reservation) for reservation in reservations
+    ])
+
+
+def is_bundle(buffer, offset=0):
+    return len(buffer) > offset and buffer[offset] == BUNDLE
+
+
+def unpack_reservations(buffer, offset=0, length=None):
+    """ Decodes a single reservation or a bundle of reservations
+
+    Parameters
+    ----------
+    buffer
+        The raw bytes containing the reservations
+    offset, optional
+        The position of the reservations in `buffer`
+    length, optional
+        The number of valid Byte in `buffer`
+
+    Returns
+    -------
+    (status, records)
+        The status of the reservations and the fields of every reservation,
+        see `unpack_reservation`
+
+    Raises
+    ------
+    ValueError
+        If the buffer holds no complete reservation or bundle, or a bundle
+        of an unknown version
+    """
+    if length is None:
+        length = len(buffer)
+    if length < offset + RESERVATION_STRUCT.size:
+        raise ValueError('Truncated reservation')
+    if not is_bundle(buffer, offset):
+        (status, fields) = unpack_reservation(buffer, offset)
+        return (status, [fields])
+
+    (_, version, status, count) = BUNDLE_HEADER.unpack_from(buffer, offset)
+    if version != BUNDLE_VERSION:
+        raise ValueError(f'Unsupported bundle version {version}')
+    start = offset + BUNDLE_HEADER.size
+    if length < start + count * RESERVATION_STRUCT.size:
+        raise ValueError('Truncated bundle')
+    return (status, [
+        unpack_reservation(buffer, start + i * RESERVATION_STRUCT.size)[1]
+        for i in range(count)
+    ])
+
+
+def replace_udp_payload(frame, payload):
+    """ Copies an Ethernet/IPv4/UDP frame with another UDP payload, updating
+    the lengths and checksums of its IPv4 and UDP headers
+
+    Parameters
+    ----------
+    frame
+        The frame's bytes, starting with the Ethernet header
+    payload
+        The new UDP payload
+
+    Returns
+    -------
+    bytes
+        The new frame
+    """
+    ip_start = ETHER_HEADER_LEN
+    ip_header_len = (frame[ip_start] & 0x0f) * 4
+    udp_start = ip_start + ip_header_len
+    udp_len = UDP_HEADER_LEN + len(payload)
+    header = bytearray(frame[:udp_start + UDP_HEADER_LEN])
+
+    struct.pack_into('!H', header, ip_start + 2, ip_header_len + udp_len)
+    struct.pack_into('!H', header, ip_start + 10, 0)
+    struct.pack_into('!H', header, ip_start + 10, internet_checksum(
+        header[ip_start:udp_start]
+    ))
+    struct.pack_into('!HH', header, udp_start + 4, udp_len, 0)
+    pseudo_header_sum = partial_checksum(
+        bytes(header[ip_start + 12:ip_start + 20]) +
+        struct.pack('!BBH', 0, IP_PROTO_UDP, udp_len)
+    )
+    checksum = internet_checksum(
+        bytes(header[udp_start:]) + payload, pseudo_header_sum
+    )
+    # A computed checksum of zero is transmitted as all ones
+    struct.pack_into('!H', header, udp_start + 6, checksum or 0xffff)
+    return bytes(header) + payload
+
+
+def internet_checksum(data, initial=0):
+    """ The one's complement checksum of RFC 1071
+
+    Parameters
+    ----------
+    data
+        The bytes to sum, padded with a zero byte if of odd length
+    initial, optional
+        A partial, not yet complemented sum to continue from
+
+    Returns
+    -------
+    int
+        The complemented 16 bit checksum
+    """
+    return 0xffff & ~fold_checksum(partial_checksum(data, initial))
+
+
+def partial_checksum(data, initial=0):
+    """ The uncomplemented, unfolded sum of `data` as 16 bit words """
+    if len(data) % 2:
+        data = bytes(data) + b'\x00'
+    return initial + sum(struct.unpack(f'!{len(data) // 2}H', data))
+
+
+def fold_checksum(total):
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return total
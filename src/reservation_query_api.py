@@ -0,0 +1,201 @@
+import json
+
+from ryu.app.wsgi import ControllerBase, route
+from webob import Response
+
+from reservation_interfaces.util import Reservation
+
+# Fields of a hypothetical subscription that may be passed to admission
+# queries and their default values
+CANDIDATE_FIELDS = {
+    'priority': None,
+    'min_frame': 84,
+    'max_frame': 1542,
+    'burst_size': None,
+    'burst_interval': None,
+    'send_rate': None,
+    'acc_min_delay': 0,
+    'acc_max_delay': 0,
+}
+
+
+def stream_to_dict(stream: Reservation, dst_ip):
+    """ Converts a deployed stream to a JSON-serializable dict
+
+    Parameters
+    ----------
+    stream: Reservation
+        The deployed stream
+    dst_ip
+        The IP address of the subscribed listener
+
+    Returns
+    -------
+    dict
+        The identifying attributes and the burst rate of the stream
+    """
+    return {
+        'src_ip': stream.src_ip,
+        'src_port': stream.src_port,
+        'dst_ip': dst_ip,
+        'dst_port': stream.dst_port,
+        'priority': stream.priority,
+        'burst_rate': stream.burst_rate,
+    }
+
+
+def candidate_from_query(params):
+    """ Creates a hypothetical subscription from the parameters of a query
+
+    Parameters
+    ----------
+    params
+        The query parameters, must contain `priority`, `burst_size` and either
+        `burst_interval` in µs or `send_rate` in Bit/s, all of them but
+        `priority` positive
+
+    Returns
+    -------
+    Reservation
+        The subscription to test
+
+    Raises
+    ------
+    ValueError
+        If a parameter is missing, not an integer or not positive
+    """
+    values = {}
+    for (field, default) in CANDIDATE_FIELDS.items():
+        values[field] = int(params[field]) if field in params else default
+
+    if values['priority'] is None or values['burst_size'] is None:
+        raise ValueError('Missing priority or burst_size!')
+    if values['burst_size'] <= 0:
+        raise ValueError('burst_size must be positive!')
+    if values['burst_interval'] is None:
+        if values['send_rate'] is None:
+            raise ValueError('Missing send_rate or burst_interval!')
+        if values['send_rate'] <= 0:
+            raise ValueError('send_rate must be positive!')
+        values['burst_interval'] = int(
+            (values['burst_size'] * 8 * 1000000) / values['send_rate']
+        )
+    if values['burst_interval'] <= 0:
+        # Also for a send rate too high for an interval of at least 1 µs
+        raise ValueError('burst_interval must be positive!')
+
+    return Reservation(
+        src_ip='0.0.0.0', src_port=0, dst_port=0, **values
+    )
+
+
+def json_response(body, status=200):
+    return Response(
+        status=status,
+        content_type='application/json',
+        charset='utf-8',
+        text=json.dumps(body)
+    )
+
+
+class ReservationQueryController(ControllerBase):
+    """ Read-only REST interface to the controller's reservations.
+
+    All queries are answered from the most recent snapshot published by the
+    controller, so they never access the state used for admission.
+    """
+    def __init__(self, req, link, data, **config):
+        super(ReservationQueryController, self).__init__(
+            req, link, data, **config
+        )
+        self.snapshots = data['snapshots']
+
+    @route('reservations', '/reservations/ports', methods=['GET'])
+    def get_ports(self, req, **kwargs):
+        """ Lists the streams deployed on each port """
+        snapshot = self.snapshots.snapshot
+        return json_response({
+            'version': snapshot.version,
+            'ports': {
+                port: [
+                    stream_to_dict(stream, dst_ip)
+                    for (stream, dst_ip) in streams
+                ]
+                for (port, streams) in snapshot.subscribed_streams.items()
+                if streams
+            }
+        })
+
+    @route('reservations', '/reservations/streams', methods=['GET'])
+    def get_streams(self, req, **kwargs):
+        """ Lists the worst-case delay of every deployed stream together with
+        the delay bound of its traffic class
+        """
+        snapshot = self.snapshots.snapshot
+        streams = []
+        for (port, stream, dst_ip, wc_delay, class_delay) in \
+                snapshot.streams():
+            entry = stream_to_dict(stream, dst_ip)
+            entry.update({
+                'port': port,
+                'worst_case_delay': wc_delay,
+                'class_delay': class_delay,
+                'slack': class_delay - wc_delay,
+            })
+            streams.append(entry)
+        return json_response({'version': snapshot.version, 'streams': streams})
+
+    @route('reservations', '/reservations/bandwidth', methods=['GET'])
+    def get_bandwidth(self, req, **kwargs):
+        """ Lists the reserved and remaining bandwidth of every port """
+        snapshot = self.snapshots.snapshot
+        return json_response({
+            'version': snapshot.version,
+            'ports': {
+                port: {
+                    'used': used,
+                    'headroom': snapshot.headroom(port),
+                }
+                for (port, used) in snapshot.used_bandwidth.items()
+            }
+        })
+
+    @route('reservations', '/reservations/ports/{port}/admission',
+           methods=['GET'], requirements={'port': r'\d+'})
+    def get_admission(self, req, port, **kwargs):
+        """ Answers whether a stream with the given parameters could be
+        admitted on a port
+        """
+        snapshot = self.snapshots.snapshot
+        try:
+            candidate = candidate_from_query(req.GET)
+        except (KeyError, ValueError) as error:
+            return json_response({'error': str(error)}, status=400)
+
+        rejection = snapshot.check_admission(candidate, int(port))
+        return json_response({
+            'version': snapshot.version,
+            'admissible': rejection is None,
+            'reason': rejection,
+        })
+
+    @route('reservations', '/reservations/ports/{port}/capacity',
+           methods=['GET'], requirements={'port': r'\d+'})
+    def get_capacity(self, req, port, **kwargs):
+        """ Answers how many more streams with the given parameters could be
+        admitted on a port and which constraint limits them
+        """
+        snapshot = self.snapshots.snapshot
+        try:
+            template = candidate_from_query(req.GET)
+            (count, binding) = snapshot.max_admissible_streams(
+                template, int(port)
+            )
+        except (KeyError, ValueError) as error:
+            return json_response({'error': str(error)}, status=400)
+
+        return json_response({
+            'version': snapshot.version,
+            'count': count,
+            'binding_constraint': binding,
+        })
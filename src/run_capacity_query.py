@@ -0,0 +1,94 @@
+import argparse as ap
+import json
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+
+def main(controller=None, port=None, **template):
+    query = urlencode({
+        field: value for (field, value) in template.items()
+        if value is not None
+    })
+    url = f'{controller}/reservations/ports/{port}/capacity?{query}'
+    try:
+        answer = json.load(urlopen(url))
+    except HTTPError as error:
+        try:
+            print(json.load(error)['error'])
+        except (ValueError, KeyError):
+            # Not answered by the query API, e.g. a wrong URL
+            print(f'The controller answered {error.code} {error.reason}')
+        return 1
+    except URLError as error:
+        print(f'Could not reach the controller at {controller}: '
+              f'{error.reason}')
+        return 1
+
+    binding = answer['binding_constraint']
+    if binding == 'bandwidth':
+        reason = 'the port bandwidth'
+    elif binding == 'subscriptions':
+        reason = 'the maximum number of subscriptions'
+    else:
+        reason = f'the delay bound of priority {binding}'
+    print(f"{answer['count']} more streams fit on port {port}, "
+          f"limited by {reason}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(
+        description="Ask a running controller how many more streams of the "
+                    "given parameters can be admitted on a port.")
+
+    parser.add_argument(
+        '--controller',
+        help="The base URL of the controller's query API",
+        default='http://127.0.0.1:8080')
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        help="The switch port on which the streams would be deployed",
+        required=True)
+
+    parser.add_argument(
+        '--priority',
+        type=int,
+        help="The priority of the streams",
+        required=True)
+
+    parser.add_argument(
+        '--burst-size',
+        type=int,
+        help="The burst size of the streams in Byte, including overhead",
+        required=True)
+
+    parser.add_argument(
+        '--send-rate',
+        type=int,
+        help="The rate at which the streams are sent in Bit/s")
+
+    parser.add_argument(
+        '--burst-interval',
+        type=int,
+        help="The burst interval of the streams in µs, alternative to "
+             "--send-rate")
+
+    parser.add_argument(
+        '--acc-min-delay',
+        type=int,
+        help="The accumulated minimum delay of the streams' advertisement in "
+             "µs as received by the listener",
+        default=0)
+
+    parser.add_argument(
+        '--acc-max-delay',
+        type=int,
+        help="The accumulated maximum delay of the streams' advertisement in "
+             "µs as received by the listener",
+        default=0)
+
+    kwargs = vars(parser.parse_args())
+    raise SystemExit(main(**kwargs))
@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import yaml
+from reservation_interfaces.endpoint_runtime import EndpointRuntime
+from reservation_interfaces.wire import MAX_BUNDLE_RESERVATIONS
+
+
+def main(iface=None, mac=None, broadcast_ip=None, talkers=None,
+         first_talker_ip=None, listeners=None, first_listener_ip=None,
+         stream_file=None, timeout=None, resends=None, jitter=None,
+         subscriptions=None, deadline=None, duration=None, stats_file=None,
+         max_bundle=None, backoff=None):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runtime = EndpointRuntime(iface, mac, broadcast_ip, timeout, resends,
+                              jitter=jitter, loop=loop, max_bundle=max_bundle,
+                              backoff=backoff)
+    for i in range(listeners):
+        runtime.add_listener(
+            str(ipaddress.IPv4Address(first_listener_ip) + i)
+        )
+    streams = []
+    if talkers:
+        with open(stream_file) as stream_yaml:
+            streams = yaml.safe_load(stream_yaml)
+    virtual_talkers = [
+        runtime.add_talker(str(ipaddress.IPv4Address(first_talker_ip) + i))
+        for i in range(talkers)
+    ]
+
+    async def run():
+        futures = []
+        for talker in virtual_talkers:
+            futures += talker.advertise_streams(
+                streams, subscriptions, deadline
+            )
+        if futures:
+            results = await asyncio.gather(*futures)
+            subscribed = [result for result in results if result]
+            print(f"Advertised: {len(results)}\n"
+                  f"Subscribed: {len(subscribed)}")
+        # Keep answering the advertisements of other hosts
+        await asyncio.sleep(duration)
+
+    runtime.start()
+    try:
+        loop.run_until_complete(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.stop()
+
+    statistics = runtime.statistics()
+    if stats_file:
+        with open(stats_file, 'w') as stats_json:
+            json.dump(statistics, stats_json, indent=2)
+    else:
+        print(json.dumps({
+            key: value for (key, value) in statistics.items()
+            if key not in ('talkers', 'listeners')
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Run many virtual talkers and listeners in a single "
+                    "process, sharing one socket and event loop.")
+
+    parser.add_argument(
+        '--iface',
+        help="The interface to send and receive reservations on")
+
+    parser.add_argument(
+        '--mac',
+        help="Source MAC address of all virtual endpoints")
+
+    parser.add_argument(
+        '--broadcast-ip',
+        help="The Broadcast IPv4 address of the used subnet.")
+
+    parser.add_argument(
+        '--talkers',
+        type=int,
+        help="The number of virtual talkers, each advertising the streams "
+             "of --stream-file",
+        default=0)
+
+    parser.add_argument(
+        '--first-talker-ip',
+        help="The IP address of the first talker, every further talker "
+             "uses the next address")
+
+    parser.add_argument(
+        '--listeners',
+        type=int,
+        help="The number of virtual listeners",
+        default=0)
+
+    parser.add_argument(
+        '--first-listener-ip',
+        help="The IP address of the first listener, every further listener "
+             "uses the next address")
+
+    parser.add_argument(
+        '--stream-file',
+        help="Path to .yaml with stream specifications")
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        help="The time in seconds until an advertisement is resent",
+        default=1)
+
+    parser.add_argument(
+        '--resends',
+        type=int,
+        help="The number of times an advertisement would be resent",
+        default=None)
+
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        help="The fraction by which resend intervals are randomized",
+        default=0.1)
+
+    parser.add_argument(
+        '--backoff',
+        type=float,
+        help="The factor by which the resend interval grows after every "
+             "resend",
+        default=1)
+
+    parser.add_argument(
+        '--subscriptions',
+        type=int,
+        help="The number of listeners that must subscribe to a stream",
+        default=1)
+
+    parser.add_argument(
+        '--deadline',
+        type=float,
+        help="The time in seconds after which an unsubscribed stream's "
+             "reservation fails, by default once its resends are used up",
+        default=None)
+
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help="The time in seconds the endpoints keep running after all "
+             "reservations of the talkers completed",
+        default=1)
+
+    parser.add_argument(
+        '--stats-file',
+        help="Path of a .json file to write the counters of every endpoint "
+             "to, by default only the totals are printed",
+        default=None)
+
+    parser.add_argument(
+        '--max-bundle',
+        type=int,
+        help="The maximum number of reservations sent in one frame, 1 for "
+             "controllers and endpoints without support for bundles",
+        default=MAX_BUNDLE_RESERVATIONS)
+
+    kwargs = vars(parser.parse_args())
+    main(**kwargs)
@@ -1,11 +1,50 @@
 import argparse as ap
+import signal
 import time
 from reservation_interfaces.listener import Listener
+from reservation_interfaces.subscription_policy import DEFAULT_ACK_TIMEOUT, \
+    DEFAULT_MAX_STREAMS, DEFAULT_SUBSCRIPTION_TTL, SubscriptionPolicy
 
 
-def main(iface=None, ip=None, mac=None):
-    Listener(iface, ip, mac)
-    time.sleep(1000)
+def write_outputs(listener, latency_output=None, timings_output=None,
+                  event_log=None):
+    """ Writes the latency statistics, the timings and the events of a
+    listener to the files given
+    """
+    if latency_output:
+        listener.latency.write_statistics(latency_output)
+    if timings_output:
+        listener.latency.write_timings(timings_output)
+    if event_log:
+        listener.events.write(event_log)
+
+
+def main(iface=None, ip=None, mac=None, policy_file=None, ttl=None,
+         ack_timeout=None, max_streams=None, duration=None,
+         latency_output=None, timings_output=None, event_log=None):
+    policy = None
+    if policy_file:
+        policy = SubscriptionPolicy.from_yaml(policy_file)
+    listener = Listener(iface, ip, mac, policy=policy, ttl=ttl,
+                        ack_timeout=ack_timeout, max_streams=max_streams)
+    outputs = (latency_output, timings_output, event_log)
+    # `kill -USR1` writes the outputs while the listener keeps running
+    signal.signal(
+        signal.SIGUSR1,
+        lambda signum, frame: write_outputs(listener, *outputs)
+    )
+    try:
+        time.sleep(duration)
+    except KeyboardInterrupt:
+        pass
+
+    write_outputs(listener, *outputs)
+    for (metric, summary) in listener.latency.summary().items():
+        if summary['count']:
+            print(f"{metric}: {summary['count']} streams, "
+                  f"median {summary['p50'] / 1e6:.3f} ms, "
+                  f"p99 {summary['p99'] / 1e6:.3f} ms, "
+                  f"max {summary['max'] / 1e6:.3f} ms")
 
 if __name__ == '__main__':
     parser = ap.ArgumentParser(
@@ -26,5 +65,54 @@ if __name__ == '__main__':
        '--mac',
         help="The MAC address used as the MAC source address in answers")
 
+    parser.add_argument(
+        '--policy-file',
+        help="Path to .yaml with the rules selecting the streams to "
+             "subscribe to, by default all streams are subscribed",
+        default=None)
+
+    parser.add_argument(
+        '--ttl',
+        type=float,
+        help="The time in seconds an answered stream is not answered again",
+        default=DEFAULT_SUBSCRIPTION_TTL)
+
+    parser.add_argument(
+        '--ack-timeout',
+        type=float,
+        help="The time in seconds after which a stream is answered again if "
+             "its subscription was not acknowledged",
+        default=DEFAULT_ACK_TIMEOUT)
+
+    parser.add_argument(
+        '--max-streams',
+        type=int,
+        help="The maximum number of streams remembered",
+        default=DEFAULT_MAX_STREAMS)
+
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help="The time in seconds to run the listener for",
+        default=1000)
+
+    parser.add_argument(
+        '--latency-output',
+        help="Path of a .csv or .json file to write the percentiles of the "
+             "handshake latencies to on exit and on SIGUSR1",
+        default=None)
+
+    parser.add_argument(
+        '--timings-output',
+        help="Path of a .csv or .json file to write the handshake timestamps "
+             "of every stream to on exit and on SIGUSR1",
+        default=None)
+
+    parser.add_argument(
+        '--event-log',
+        help="Path of a text file to write the most recent events to on "
+             "exit and on SIGUSR1",
+        default=None)
+
     kwargs = vars(parser.parse_args())
-    main(**kwargs)
\ No newline at end of file
+    main(**kwargs)
@@ -1,18 +1,48 @@
 import argparse
-import time
+import asyncio
+from reservation_interfaces.load_generator import ARRIVAL_PROCESSES, CONSTANT
 from reservation_interfaces.talker import Talker
+from reservation_interfaces.wire import MAX_BUNDLE_RESERVATIONS
 
 
 def main(iface=None, ip=None, broadcast_ip=None, mac=None, timeout=None,
-         stream_file=None, resends=None, load_test=None):
-    talker = Talker(iface, ip, broadcast_ip, mac, timeout, resends)
+         stream_file=None, resends=None, load_test=None, rate=None,
+         max_in_flight=None, jitter=None, backoff=None, subscriptions=None,
+         deadline=None, arrival=None, load_output=None, drain=None,
+         max_bundle=None, duration=None):
+    talker = Talker(iface, ip, broadcast_ip, mac, timeout, resends,
+                    rate=rate, max_in_flight=max_in_flight, jitter=jitter,
+                    backoff=backoff, max_bundle=max_bundle)
     if load_test:
-        talker.load_test(stream_file, load_test)
-        time.sleep(1000)
+        talker.load_test(
+            stream_file, load_test, rate=rate or 40, process=arrival,
+            output=load_output, drain=drain
+        )
     else:
-        talker.advertise_streams_from_yaml(stream_file)
-        time.sleep(5)
-        print(f"Advertised: {len(talker.advertised_streams)}\nSubscribed:{len(talker.stream_subscriptions)}")
+        (successful, unsuccessful) = talker.advertise_streams_from_yaml(
+            stream_file, subscriptions=subscriptions, deadline=deadline
+        )
+        print(f"Advertised: {len(successful) + len(unsuccessful)}\nSubscribed:{len(successful)}")
+        if successful:
+            latencies = sorted(result.latency for result in successful)
+            print(f"Reservation latency: "
+                  f"median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                  f"max {latencies[-1] * 1000:.1f} ms")
+        if not talker.stream_subscriptions:
+            return
+        # The switches expire reservations that are no longer refreshed,
+        # about 30 s after the talker exits
+        print("Refreshing the reservations" + (
+            " until interrupted" if duration is None
+            else f" for {duration} s"
+        ))
+        try:
+            if duration is None:
+                talker.loop.run_forever()
+            else:
+                talker.loop.run_until_complete(asyncio.sleep(duration))
+        except KeyboardInterrupt:
+            pass
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="An experimental implementation of a Time-Sensitive-Networking Talker.")
@@ -39,15 +69,56 @@ if __name__ == '__main__':
 
     parser.add_argument(
         '--timeout',
-        type=int,
-        help="The time in seconds until an advertisement is resent")
+        type=float,
+        help="The time in seconds until an advertisement is resent",
+        default=1)
 
     parser.add_argument(
         '--resends',
         type=int,
-        help="The number of times an advertisement would be resent",
+        help="The number of times an advertisement would be resent, by "
+             "default until it is subscribed",
         default=None)
     
+    parser.add_argument(
+        '--rate',
+        type=float,
+        help="The maximum number of new advertisements sent per second",
+        default=None)
+
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        help="The maximum number of advertised streams waiting for a "
+             "subscription at once",
+        default=None)
+
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        help="The fraction by which resend intervals are randomized",
+        default=0.1)
+
+    parser.add_argument(
+        '--backoff',
+        type=float,
+        help="The factor by which the resend interval grows after every "
+             "resend",
+        default=1)
+
+    parser.add_argument(
+        '--subscriptions',
+        type=int,
+        help="The number of listeners that must subscribe to a stream",
+        default=1)
+
+    parser.add_argument(
+        '--deadline',
+        type=float,
+        help="The time in seconds after which an unsubscribed stream's "
+             "reservation fails, by default once its resends are used up",
+        default=None)
+
     parser.add_argument(
         '--load-test',
         type=int,
@@ -56,5 +127,39 @@ if __name__ == '__main__':
         required=False
     )
 
+    parser.add_argument(
+        '--arrival',
+        choices=ARRIVAL_PROCESSES,
+        help="The arrival process of the load test's advertisements, sent "
+             "at --rate per second (default is 40)",
+        default=CONSTANT)
+
+    parser.add_argument(
+        '--load-output',
+        help="Path of a .csv or .parquet file to write the load test's "
+             "per-stream timestamps to",
+        default=None)
+
+    parser.add_argument(
+        '--drain',
+        type=float,
+        help="The time in seconds the load test waits for subscriptions "
+             "after the last advertisement",
+        default=5)
+
+    parser.add_argument(
+        '--max-bundle',
+        type=int,
+        help="The maximum number of advertisements sent in one frame, 1 for "
+             "controllers and listeners without support for bundles",
+        default=MAX_BUNDLE_RESERVATIONS)
+
+    parser.add_argument(
+        '--duration',
+        type=float,
+        help="The time in seconds to keep refreshing the subscribed "
+             "reservations for, by default until interrupted",
+        default=None)
+
     kwargs = vars(parser.parse_args())
     main(**kwargs)